@@ -0,0 +1,143 @@
+"""
+    Benchmark: what cluster_infer_ratio > 0 costs on top of a plain conversion.
+
+    Runs conversion.convert_array with the stand-in model (benchmarks/standin.py)
+    on clustered content features (every frame one of --units random "phone"
+    vectors plus noise, different for every segment) and a synthetic
+    cluster model of --codebook centroids drawn near those frames, at ratio 0, at ratio 0.5 with the exact batched lookup
+    and at ratio 0.5 with the approximate index. The lookup alone is also
+    timed three ways over the same segments: "per-segment" recomputes
+    float64 distances and norms for every segment like KMeans.predict,
+    "batched" is src.cluster_index over all frames of the file at once and
+    "approx" adds --nprobe; the approximate labels' agreement with the exact
+    ones is reported too. The stand-in generator is far cheaper than the
+    real one, so the relative overheads look worse than they are; compare
+    the absolute seconds.
+
+    python -m benchmarks.bench_cluster --minutes 4 --codebook 10000
+"""
+
+import os
+import time
+import zlib
+from contextlib import redirect_stdout
+from types import SimpleNamespace
+import numpy as np
+import typer
+
+from benchmarks.bench_slicer import synthetic_vocals
+from benchmarks.standin import StandInFeatures
+from src import cluster_index, conversion
+
+SR = 44100
+FRAMES_PER_UNIT = 4
+
+
+class ClusteredFeatures(StandInFeatures):
+    """StandInFeatures whose content has cluster structure, like HuBERT units.
+
+    The constant sinusoids of StandInFeatures are the same for every segment
+    and all close together, which makes every lookup method look alike.
+    """
+
+    def __init__(self, units=512, noise=0.25, seed=0):
+        super().__init__()
+        rng = np.random.default_rng(seed)
+        self.units = rng.standard_normal((units, self.content_dim)).astype(np.float32)
+        self.noise = noise
+
+    def key(self, data, sr, svc_model):
+        return super().key(data, sr, svc_model), zlib.crc32(np.ascontiguousarray(data).tobytes())
+
+    def get(self, key):
+        frames, seed = key
+        rng = np.random.default_rng(seed)
+        units = np.repeat(rng.integers(len(self.units), size=frames // FRAMES_PER_UNIT + 1),
+                          FRAMES_PER_UNIT)[:frames]
+        c = self.units[units] + self.noise * rng.standard_normal((frames, self.content_dim),
+                                                                 dtype=np.float32)
+        f0 = np.full(frames, 220.0, dtype=np.float32)
+        uv = np.ones(frames, dtype=np.float32)
+        return np.ascontiguousarray(c.T), f0, uv
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def per_segment_lookup(centers, contents):
+    centers = np.asarray(centers, dtype=np.float64)
+    out = []
+    for c in contents:
+        x = c.T.astype(np.float64)
+        distances = ((x ** 2).sum(1)[:, None] - 2 * x @ centers.T + (centers ** 2).sum(1))
+        out.append(distances.argmin(axis=1))
+    return out
+
+
+def main(
+    minutes: float = typer.Option(4.0, help="Length of the synthetic input."),
+    codebook: int = typer.Option(10000, help="Centroids in the synthetic cluster model."),
+    units: int = typer.Option(512, help="Distinct content vectors the frames are drawn around."),
+    nprobe: int = typer.Option(8, help="Cells searched by the approximate index."),
+    batch_size: int = typer.Option(4, help="Segments per forward pass."),
+    repeat: int = typer.Option(3, help="Repetitions per measurement; the fastest is kept."),
+    threads: int = typer.Option(1, help="torch intra-op threads."),
+):
+    import torch
+    from benchmarks.standin import StandInSvc
+
+    torch.set_num_threads(threads)
+    audio = synthetic_vocals(minutes, SR)
+    rng = np.random.default_rng(0)
+    svc_model = StandInSvc(target_sample=SR)
+    features = ClusteredFeatures(units)
+    voiced = [data for tag, data in conversion.slice_audio(audio, SR) if not tag]
+    contents = [features.get(features.key(conversion.pad_segment(data, SR), SR, svc_model))[0]
+                for data in voiced]
+    # like k-means centroids of content features: near frames that occur, not uniform noise
+    frames = np.concatenate([c.T for c in contents])
+    centers = frames[rng.integers(0, len(frames), codebook)]
+    centers = (centers + 0.05 * rng.standard_normal(centers.shape)).astype(np.float32)
+    svc_model.cluster_model = {"standin": SimpleNamespace(cluster_centers_=centers)}
+
+    def convert(ratio, cluster_nprobe=0):
+        # the per-segment progress prints would drown the report
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            with conversion.convert_array(svc_model, "standin", audio, SR, batch_size=batch_size,
+                                          cluster_infer_ratio=ratio, cluster_nprobe=cluster_nprobe,
+                                          feature_cache=features) as out:
+                return len(out.audio)
+
+    print(f"{minutes:g} min input, {codebook} centroids, batch size {batch_size}")
+    # the first run also builds the index (and the approximate cells)
+    convert(0.5)
+    convert(0.5, nprobe)
+    plain, _ = best_of(lambda: convert(0.0), repeat)
+    exact, _ = best_of(lambda: convert(0.5), repeat)
+    approx, _ = best_of(lambda: convert(0.5, nprobe), repeat)
+    print(f"convert ratio 0           {plain:8.3f} s")
+    print(f"convert ratio 0.5 exact   {exact:8.3f} s  (+{(exact - plain) / plain:.0%})")
+    print(f"convert ratio 0.5 nprobe {nprobe:<2d}{approx:8.3f} s  (+{(approx - plain) / plain:.0%})")
+
+    index = cluster_index.speaker_index(svc_model, "standin")
+    legacy, legacy_labels = best_of(lambda: per_segment_lookup(centers, contents), repeat)
+    batched, labels = best_of(lambda: index.assign(frames), repeat)
+    approx, approx_labels = best_of(lambda: index.assign(frames, nprobe), repeat)
+    agree = np.mean(np.concatenate(legacy_labels) == labels)
+    print(f"\nlookup over {len(contents)} segments, {len(frames)} frames:")
+    print(f"per-segment float64       {legacy * 1e3:8.1f} ms")
+    print(f"batched float32           {batched * 1e3:8.1f} ms  ({legacy / batched:.1f}x, "
+          f"{agree:.2%} same labels)")
+    print(f"approx nprobe {nprobe:<2d}          {approx * 1e3:8.1f} ms  ({legacy / approx:.1f}x, "
+          f"{np.mean(approx_labels == labels):.2%} same labels as exact)")
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,201 @@
+"""
+    Speed and quality harness for the CPU execution profile (src/cpu_inference.py).
+
+    Every mode starts --workers processes that convert the same input at the
+    same time, like a batch conversion with that many workers:
+
+        default    torch's own thread settings, model untouched
+        threads    cores split between the workers, one inter-op thread each
+        fold       threads + weight norm folded into the convolutions
+        int8       fold + dynamic int8 quantization of Linear layers
+        int8-conv  int8 + quantized convolutions
+
+    Reported per mode: real-time factor of one conversion, conversions per
+    core (audio seconds converted per wall second per core, over all
+    workers) and, against the output of the default mode, the log-spectral
+    distance in dB and the spectral convergence.
+
+    Without --speaker the stand-in model with a small generator of real
+    layers is used (benchmarks/standin.py) and feature extraction is
+    skipped; with --speaker the real model and pipeline are run.
+
+    python -m benchmarks.bench_cpu --workers 4
+    python -m benchmarks.bench_cpu --speaker Drake --svc-root /content/so-vits-svc --input song.wav
+"""
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from queue import Empty
+from typing import List
+import numpy as np
+import typer
+
+from benchmarks.bench_slicer import synthetic_vocals
+from src.cpu_inference import available_cores
+
+MODES = {
+    "default": None,
+    "threads": dict(fold_weight_norm=False),
+    "fold": dict(),
+    "int8": dict(quantize=True),
+    "int8-conv": dict(quantize=True, quantize_conv=True),
+}
+SR = 44100
+
+
+def spectrogram(audio, n_fft=2048, hop=512):
+    frames = np.lib.stride_tricks.sliding_window_view(audio, n_fft)[::hop]
+    return np.abs(np.fft.rfft(frames * np.hanning(n_fft).astype(np.float32), axis=1))
+
+
+def spectral_difference(reference, audio):
+    """(log-spectral distance in dB, spectral convergence) of audio against reference."""
+    n = min(len(reference), len(audio))
+    ref = spectrogram(reference[:n])
+    out = spectrogram(audio[:n])
+    eps = 1e-5
+    lsd = np.mean(np.sqrt(np.mean((20 * np.log10(ref + eps) - 20 * np.log10(out + eps)) ** 2, axis=1)))
+    convergence = np.linalg.norm(out - ref) / max(np.linalg.norm(ref), eps)
+    return float(lsd), float(convergence)
+
+
+def load_model(options, profile):
+    if options["speaker"] is None:
+        from benchmarks.standin import StandInSvc
+        svc_model = StandInSvc(target_sample=SR, conv=True)
+        speaker = "standin"
+    else:
+        from src.batch_convert import use_svc_root
+        from src.model_pool import load_svc
+        from src.speaker_index import SpeakerIndex
+        use_svc_root(options["svc_root"])
+        spk = SpeakerIndex("models").get(options["speaker"])
+        svc_model = load_svc(spk["model_path"], spk["cfg_path"], spk["cluster_path"])
+        speaker = spk["name"]
+    if profile is not None:
+        profile.prepare(svc_model)
+    return svc_model, speaker
+
+
+def run_worker(mode, index, options, audio_path, out_dir, barrier, queue):
+    """Child process: set up one worker of a mode, then convert in step with the others."""
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    try:
+        profile = None
+        if MODES[mode] is not None:
+            from src.cpu_inference import CpuProfile
+            profile = CpuProfile(workers=options["workers"], **MODES[mode])
+            profile.apply_threads()
+        import torch
+        from src import conversion
+
+        torch.manual_seed(0)
+        svc_model, speaker = load_model(options, profile)
+        audio = np.load(audio_path)
+        kwargs = dict(batch_size=options["batch_size"])
+        if options["speaker"] is None:
+            from benchmarks.standin import StandInFeatures
+            kwargs["feature_cache"] = StandInFeatures()
+        barrier.wait()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        with conversion.convert_array(svc_model, speaker, audio, SR, **kwargs) as out:
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+            if index == 0:
+                np.save(os.path.join(out_dir, f"{mode}.npy"), np.asarray(out.audio))
+        queue.put({"index": index, "wall_seconds": wall, "cpu_seconds": cpu,
+                   "threads": torch.get_num_threads()})
+    except Exception as e:
+        queue.put({"index": index, "error": f"{type(e).__name__}: {e}"})
+        barrier.abort()
+
+
+def measure(mode, options, audio_path, out_dir):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    barrier = ctx.Barrier(options["workers"])
+    procs = [ctx.Process(target=run_worker, args=(mode, i, options, audio_path, out_dir, barrier, queue))
+             for i in range(options["workers"])]
+    for proc in procs:
+        proc.start()
+    results = []
+    while len(results) < len(procs):
+        try:
+            results.append(queue.get(timeout=1))
+        except Empty:
+            # a worker killed outright (e.g. out of memory) never reports
+            if not all(proc.is_alive() for proc in procs) and queue.empty():
+                barrier.abort()
+                for proc in procs:
+                    proc.terminate()
+                return {"mode": mode, "error": "a worker exited without a result"}
+    for proc in procs:
+        proc.join()
+    errors = [r["error"] for r in results if "error" in r]
+    if errors:
+        return {"mode": mode, "error": errors[0]}
+    return {"mode": mode,
+            "wall_seconds": max(r["wall_seconds"] for r in results),
+            "cpu_seconds": sum(r["cpu_seconds"] for r in results),
+            "threads": results[0]["threads"]}
+
+
+def main(
+    modes: List[str] = typer.Option(list(MODES), help="Modes to compare (the first is the quality reference)."),
+    workers: int = typer.Option(available_cores() // 2 or 1, help="Concurrent worker processes per mode."),
+    input_file: str = typer.Option(None, "--input", help="Audio file to convert (synthetic vocals by default)."),
+    seconds: float = typer.Option(30.0, help="Length of the synthetic input."),
+    batch_size: int = typer.Option(1, help="Segments per forward pass."),
+    speaker: str = typer.Option(None, help="Real speaker to load (default: the stand-in model)."),
+    svc_root: str = typer.Option("/content/so-vits-svc", help="so-vits-svc checkout for --speaker."),
+):
+    unknown = [m for m in modes if m not in MODES]
+    if unknown:
+        raise typer.BadParameter(f"unknown modes {unknown}; choose from {list(MODES)}")
+    cores = available_cores()
+    if input_file:
+        import soundfile
+        audio, sr = soundfile.read(input_file, dtype="float32", always_2d=True)
+        audio = audio.mean(axis=1)
+        if sr != SR:
+            import librosa
+            audio = librosa.resample(audio, orig_sr=sr, target_sr=SR)
+    else:
+        audio = synthetic_vocals(seconds / 60, SR)
+    audio_seconds = len(audio) / SR
+    options = {"workers": workers, "batch_size": batch_size, "speaker": speaker,
+               "svc_root": os.path.abspath(svc_root)}
+
+    out_dir = tempfile.mkdtemp(prefix="drake_bench_cpu_")
+    try:
+        audio_path = os.path.join(out_dir, "input.npy")
+        np.save(audio_path, audio)
+        print(f"{audio_seconds:.1f}s input, {workers} workers on {cores} cores, "
+              f"{'stand-in model' if speaker is None else speaker}")
+        reference = None
+        baseline = None
+        for mode in modes:
+            result = measure(mode, options, audio_path, out_dir)
+            if "error" in result:
+                print(f"{mode:10s} failed: {result['error']}")
+                continue
+            output = np.load(os.path.join(out_dir, f"{mode}.npy"))
+            if reference is None:
+                reference = output
+            per_core = workers * audio_seconds / result["wall_seconds"] / cores
+            baseline = baseline or per_core
+            lsd, convergence = spectral_difference(reference, output)
+            print(f"{mode:10s} {result['threads']:3d} threads  rtf {result['wall_seconds'] / audio_seconds:7.3f}  "
+                  f"{per_core:7.2f} s/s per core ({per_core / baseline:4.2f}x)  "
+                  f"LSD {lsd:6.2f} dB  SC {convergence:.4f}")
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    typer.run(main)
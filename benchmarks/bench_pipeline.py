@@ -0,0 +1,225 @@
+"""
+    Benchmark suite for the conversion hot paths, with a stored baseline.
+
+    Cases: speaker discovery (SpeakerIndex over a synthetic models/ tree),
+    model load (torch.load of a generator-sized checkpoint), slicing,
+    segment conversion with the deterministic stand-in model
+    (benchmarks/standin.py), output assembly and file writes, on synthetic
+    audio from 10 s up to 30 min. Every case runs in a fresh process so its
+    peak RSS is its own. Reported per case: wall and CPU seconds, real-time
+    factor, throughput per core (audio seconds per CPU second) and peak RSS.
+
+    python -m benchmarks.bench_pipeline --save-baseline    # on the reference machine
+    python -m benchmarks.bench_pipeline --check            # later: fail on regressions
+"""
+
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import tempfile
+import time
+from typing import List
+import numpy as np
+import typer
+
+from benchmarks.bench_slicer import synthetic_vocals
+from src.profiling import peak_rss_mb
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DURATIONS = [10.0, 60.0, 600.0, 1800.0]
+SR = 44100
+
+
+def case_speakers(workdir, folders=200):
+    from src.speaker_index import SpeakerIndex
+    models = os.path.join(workdir, "models")
+    for i in range(folders):
+        folder = os.path.join(models, f"model_{i}")
+        os.makedirs(folder, exist_ok=True)
+        open(os.path.join(folder, "G_1000.pth"), "wb").close()
+        with open(os.path.join(folder, "config.json"), "w") as f:
+            json.dump({"spk": {f"speaker_{i}_{j}": j for j in range(2)}}, f)
+    start = time.perf_counter()
+    cold = len(SpeakerIndex(models).speakers())
+    cold_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    SpeakerIndex(models).speakers()
+    return {"speakers": cold, "cold_seconds": cold_seconds,
+            "warm_seconds": time.perf_counter() - start}
+
+
+def case_model_load(workdir, megabytes=200):
+    import torch
+    path = os.path.join(workdir, "G_standin.pth")
+    n = megabytes * 2**20 // 4 // 16
+    torch.save({"model": {f"layer{i}.weight": torch.zeros(n) for i in range(16)}}, path)
+    start = time.perf_counter()
+    torch.load(path, map_location="cpu")
+    return {"megabytes": megabytes, "seconds": time.perf_counter() - start}
+
+
+def case_slice(audio):
+    from src import conversion
+    return {"chunks": len(conversion.slice_audio(audio, SR))}
+
+
+def case_convert(audio, batch_size=4):
+    import torch
+    from src import conversion
+    from benchmarks.standin import StandInFeatures, StandInSvc
+    torch.manual_seed(0)
+    svc_model = StandInSvc(target_sample=SR)
+    with conversion.convert_array(svc_model, "standin", audio, SR, batch_size=batch_size,
+                                  feature_cache=StandInFeatures()) as out:
+        return {"output_samples": len(out.audio), "checksum": float(np.abs(out.audio[::997]).sum())}
+
+
+def case_assemble(audio):
+    from src import conversion
+    audio_data = conversion.slice_audio(audio, SR)
+    with conversion.AudioAssembler.for_chunks(audio_data, SR, SR) as out:
+        for index, (_, data) in enumerate(audio_data):
+            out.write(index, data)
+        return {"segments": len(audio_data)}
+
+
+def case_write(audio, workdir, fmt="wav"):
+    import soundfile
+    path = os.path.join(workdir, f"out.{fmt}")
+    soundfile.write(path, audio, SR)
+    return {"bytes": os.path.getsize(path)}
+
+
+def run_case(name, seconds, options, queue):
+    """Child process: build the input, time one case and report it."""
+    # the pipeline's progress prints would drown the report
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    workdir = tempfile.mkdtemp(prefix="drake_bench_")
+    try:
+        # imports are start-up cost (see bench_startup), not part of a case
+        from src import conversion, speaker_index  # noqa: F401
+        if name in ("model_load", "convert"):
+            import torch
+            import benchmarks.standin  # noqa: F401
+            torch.set_num_threads(options["threads"])
+        audio = synthetic_vocals(seconds / 60, SR) if seconds else None
+        cases = {
+            "speakers": lambda: case_speakers(workdir, options["folders"]),
+            "model_load": lambda: case_model_load(workdir, options["model_mb"]),
+            "slice": lambda: case_slice(audio),
+            "convert": lambda: case_convert(audio, options["batch_size"]),
+            "assemble": lambda: case_assemble(audio),
+            "write": lambda: case_write(audio, workdir),
+        }
+        start_rss = peak_rss_mb()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        info = cases[name]()
+        wall = time.perf_counter() - wall
+        cpu = time.process_time() - cpu
+        result = {"case": name, "audio_seconds": seconds, "wall_seconds": wall, "cpu_seconds": cpu,
+                  "rtf": wall / seconds if seconds else None,
+                  "per_core_x_realtime": seconds / cpu if seconds and cpu else None,
+                  "peak_rss_mb": peak_rss_mb(), "start_rss_mb": start_rss, "info": info}
+        queue.put(result)
+    except Exception as e:
+        queue.put({"case": name, "audio_seconds": seconds, "error": f"{type(e).__name__}: {e}"})
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def measure(name, seconds, options, repeat):
+    ctx = multiprocessing.get_context("spawn")
+    best = None
+    for _ in range(repeat):
+        queue = ctx.Queue()
+        proc = ctx.Process(target=run_case, args=(name, seconds, options, queue))
+        proc.start()
+        result = queue.get()
+        proc.join()
+        if "error" in result:
+            return result
+        if best is None or result["wall_seconds"] < best["wall_seconds"]:
+            best = result
+    return best
+
+
+def machine():
+    return {"platform": platform.platform(), "processor": platform.processor(),
+            "cpus": os.cpu_count(), "python": platform.python_version()}
+
+
+def case_key(result):
+    return f"{result['case']}@{result['audio_seconds']:g}s" if result["audio_seconds"] else result["case"]
+
+
+def main(
+    durations: List[float] = typer.Option(DURATIONS, help="Synthetic input lengths in seconds."),
+    cases: List[str] = typer.Option(["speakers", "model_load", "slice", "convert", "assemble", "write"],
+                                    help="Cases to run."),
+    repeat: int = typer.Option(3, help="Repetitions per case; the fastest is kept."),
+    threads: int = typer.Option(1, help="torch intra-op threads in each case."),
+    batch_size: int = typer.Option(4, help="Segments per forward pass in the convert case."),
+    folders: int = typer.Option(200, help="Model folders in the speaker discovery case."),
+    model_mb: int = typer.Option(200, help="Checkpoint size in the model load case."),
+    baseline: str = typer.Option(BASELINE_PATH, help="Baseline JSON file."),
+    save_baseline: bool = typer.Option(False, help="Store these results as the new baseline."),
+    check: bool = typer.Option(False, help="Exit non-zero if a case regressed past the tolerance."),
+    tolerance: float = typer.Option(0.15, help="Allowed slowdown against the baseline (0.15 = 15%)."),
+    output: str = typer.Option(None, help="Also write the results to this JSON file."),
+):
+    options = {"threads": threads, "batch_size": batch_size, "folders": folders, "model_mb": model_mb}
+    results = []
+    for name in cases:
+        for seconds in (durations if name not in ("speakers", "model_load") else [0]):
+            result = measure(name, seconds, options, repeat)
+            results.append(result)
+            if "error" in result:
+                print(f"{case_key(result):24s} failed: {result['error']}")
+                continue
+            line = (f"{case_key(result):24s} {result['wall_seconds'] * 1e3:10.1f} ms wall "
+                    f"{result['cpu_seconds'] * 1e3:10.1f} ms cpu {result['peak_rss_mb']:8.1f} MiB peak")
+            if result["rtf"] is not None:
+                line += f"  rtf {result['rtf']:.4f}  {result['per_core_x_realtime']:8.1f}x/core"
+            print(line)
+
+    report = {"machine": machine(), "options": options, "results": results}
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=1)
+
+    regressions = []
+    if os.path.exists(baseline) and not save_baseline:
+        with open(baseline) as f:
+            stored = json.load(f)
+        if stored["machine"] != report["machine"] or stored["options"] != options:
+            print("Note: baseline was recorded on a different machine or with different options")
+        previous = {case_key(r): r for r in stored["results"] if "error" not in r}
+        print(f"\nAgainst baseline {baseline}:")
+        for result in results:
+            old = previous.get(case_key(result))
+            if old is None or "error" in result:
+                continue
+            ratio = result["wall_seconds"] / old["wall_seconds"]
+            flag = ""
+            if ratio > 1 + tolerance:
+                flag = "  REGRESSION"
+                regressions.append(case_key(result))
+            elif ratio < 1 - tolerance:
+                flag = "  faster"
+            print(f"{case_key(result):24s} {ratio:6.2f}x baseline time, "
+                  f"peak RSS {result['peak_rss_mb'] - old['peak_rss_mb']:+8.1f} MiB{flag}")
+
+    if save_baseline:
+        with open(baseline, "w") as f:
+            json.dump(report, f, indent=1)
+        print(f"Saved baseline to {baseline}")
+    if check and (regressions or any("error" in r for r in results)):
+        raise typer.Exit(1)
+
+
+if __name__ == "__main__":
+    typer.run(main)
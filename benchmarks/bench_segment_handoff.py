@@ -0,0 +1,58 @@
+"""
+    Micro-benchmark: per-segment hand-off cost before the model sees audio.
+
+    "wav" is the old path: pad with float64 zeros, encode to an in-memory WAV
+    and decode it again (what Svc.infer's librosa.load does). "array" is
+    conversion.pad_segment, which hands infer_array a float32 array directly.
+
+    python -m benchmarks.bench_segment_handoff --segments 200
+"""
+
+import io
+import time
+import numpy as np
+import soundfile
+import typer
+
+from src.conversion import PAD_SECONDS, pad_segment
+
+
+def wav_roundtrip(data, sr):
+    pad_len = int(sr * PAD_SECONDS)
+    data = np.concatenate([np.zeros([pad_len]), data, np.zeros([pad_len])])
+    raw_path = io.BytesIO()
+    soundfile.write(raw_path, data, sr, format="wav")
+    raw_path.seek(0)
+    wav, _ = soundfile.read(raw_path, dtype="float32")
+    return wav
+
+
+def time_per_segment(fn, segments, sr, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for segment in segments:
+            fn(segment, sr)
+        best = min(best, time.perf_counter() - start)
+    return best / len(segments)
+
+
+def main(
+    segments: int = typer.Option(100, help="Number of synthetic segments."),
+    seconds: float = typer.Option(8.0, help="Mean segment length in seconds."),
+    sr: int = typer.Option(44100, help="Input sample rate."),
+    repeat: int = typer.Option(5, help="Repetitions; the best run is reported."),
+):
+    rng = np.random.default_rng(0)
+    lengths = rng.uniform(0.5, 1.5, segments) * seconds * sr
+    data = [rng.standard_normal(int(n)).astype(np.float32) * 0.1 for n in lengths]
+
+    wav = time_per_segment(wav_roundtrip, data, sr, repeat)
+    array = time_per_segment(pad_segment, data, sr, repeat)
+    print(f"wav round trip: {wav * 1e3:8.3f} ms/segment")
+    print(f"array hand-off: {array * 1e3:8.3f} ms/segment")
+    print(f"saved:          {(wav - array) * 1e3:8.3f} ms/segment ({wav / array:.1f}x)")
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,73 @@
+"""
+    Benchmark: so-vits-svc's Slicer versus src.fast_slicer on long synthetic audio.
+
+    The reference slicer needs the so-vits-svc checkout (and librosa); the
+    chunk boundaries of both are compared before timings are reported.
+
+    python -m benchmarks.bench_slicer --minutes 1 --minutes 5 --minutes 20
+"""
+
+import os
+import sys
+import time
+from typing import List
+import numpy as np
+import typer
+
+from src.fast_slicer import FastSlicer
+
+
+def synthetic_vocals(minutes, sr, seed=0):
+    """Alternating phrases of noise and near-silent gaps."""
+    rng = np.random.default_rng(seed)
+    parts = []
+    total = int(minutes * 60 * sr)
+    n = 0
+    while n < total:
+        loud = rng.random() < 0.6
+        length = int(rng.uniform(0.2, 8.0 if loud else 2.0) * sr)
+        parts.append((rng.standard_normal(length) * (0.2 if loud else 0.001)).astype(np.float32))
+        n += length
+    return np.concatenate(parts)[:total]
+
+
+def best_time(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(
+    minutes: List[float] = typer.Option([1.0, 5.0], help="Lengths of the synthetic inputs."),
+    sr: int = typer.Option(44100, help="Sample rate."),
+    db_thresh: int = typer.Option(-40, help="Silence threshold in dB."),
+    repeat: int = typer.Option(3, help="Repetitions; the best run is reported."),
+    svc_root: str = typer.Option("/content/so-vits-svc", help="so-vits-svc checkout for the reference slicer."),
+):
+    sys.path.insert(0, os.path.abspath(svc_root))
+    try:
+        from inference import slicer
+    except ImportError:
+        slicer = None
+        print(f"inference.slicer not importable from {svc_root}; timing the fast slicer only")
+
+    for length in minutes:
+        audio = synthetic_vocals(length, sr)
+        fast = FastSlicer(sr=sr, threshold=db_thresh)
+        fast_time, bounds = best_time(lambda: fast.bounds(audio), repeat)
+        line = f"{length:6.1f} min: fast {fast_time * 1e3:9.1f} ms, {len(bounds[0])} chunks"
+        if slicer is not None:
+            ref = slicer.Slicer(sr=sr, threshold=db_thresh)
+            ref_time, chunks = best_time(lambda: ref.slice(audio), repeat)
+            ref_bounds = [tuple(int(t) for t in v["split_time"].split(",")) for v in chunks.values()]
+            same = ref_bounds == list(zip(bounds[0].tolist(), bounds[1].tolist()))
+            line += (f" | reference {ref_time * 1e3:9.1f} ms ({ref_time / fast_time:.1f}x slower)"
+                     f" | boundaries {'match' if same else 'DIFFER'}")
+        print(line)
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,82 @@
+"""
+    Benchmark: start-up cost of the CLI and of the modules worker processes import.
+
+    Every module is imported in a fresh interpreter with -X importtime; the
+    slowest imports under it are listed, and the script exits non-zero when
+    a module's wall-clock start-up exceeds the budget, so it can guard CI.
+
+    python -m benchmarks.bench_startup --budget 0.5
+"""
+
+import os
+import subprocess
+import sys
+import time
+from typing import List
+import typer
+
+MODULES = [
+    "voice_conversion_cli",
+    "src.batch_convert",
+    "src.job_server",
+    "src.conversion",
+    "src.streaming",
+    "src.download_utils",
+    "src.ui",
+    "src.drakeai",
+]
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_profile(module):
+    """(wall seconds, [(cumulative us, name)]) for importing module in a new interpreter."""
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=ROOT, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if proc.returncode:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    imports = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        imports.append((int(cumulative), name.strip()))
+    return wall, imports
+
+
+def main(
+    modules: List[str] = typer.Option(MODULES, help="Modules to import."),
+    budget: float = typer.Option(0.5, help="Maximum wall-clock start-up per module in seconds."),
+    repeat: int = typer.Option(3, help="Repetitions; the best run is reported."),
+    top: int = typer.Option(5, help="Slowest imports to list per module."),
+):
+    baseline, startup_imports = min(import_profile("sys") for _ in range(repeat))
+    startup_imports = {name for _, name in startup_imports}
+    print(f"bare interpreter: {baseline * 1e3:.0f} ms")
+    over = []
+    for module in modules:
+        try:
+            runs = [import_profile(module) for _ in range(repeat)]
+        except RuntimeError as e:
+            print(f"{module}: import failed ({e})")
+            over.append(module)
+            continue
+        wall, imports = min(runs)
+        status = "ok" if wall <= budget else "OVER BUDGET"
+        print(f"{module}: {wall * 1e3:.0f} ms wall, "
+              f"{imports[-1][0] / 1e3:.0f} ms importing ({status})")
+        own = [(us, name) for us, name in imports
+               if name != module and name not in startup_imports]
+        for us, name in sorted(own, reverse=True)[:top]:
+            print(f"    {us / 1e3:8.1f} ms  {name}")
+        if wall > budget:
+            over.append(module)
+
+    if over:
+        print(f"Start-up budget of {budget:.2f}s exceeded by: {', '.join(over)}")
+        raise typer.Exit(1)
+
+
+if __name__ == "__main__":
+    typer.run(main)
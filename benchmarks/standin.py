@@ -0,0 +1,104 @@
+"""
+    Deterministic stand-ins for a loaded Svc, for benchmarks without weights.
+
+    StandInSvc has the attributes conversion.py reads and a generator whose
+    cost grows with the number of frames like the real one (a fixed random
+    projection from content features to hop-sized frames). StandInFeatures
+    is passed as feature_cache and replaces HuBERT/f0 extraction with cheap
+    deterministic arrays of the right shape, so everything around the model
+    (slicing, padding, batching, tensor hand-off, assembly) runs for real.
+    With conv=True the generator is a small network of real layers instead,
+    for the CPU threading and quantization benchmark.
+"""
+
+from types import SimpleNamespace
+import numpy as np
+
+from src.conversion import estimate_frames
+
+CONTENT_DIM = 256
+
+
+class StandInGenerator:
+    def __init__(self, hop_size, content_dim=CONTENT_DIM, seed=0):
+        import torch
+        g = torch.Generator().manual_seed(seed)
+        self.weight = torch.randn(hop_size, content_dim, generator=g) / content_dim ** 0.5
+
+    def infer(self, c, f0, g, uv, predict_f0=False, noice_scale=0.4):
+        import torch
+        # [B, C, T] -> [B, hop, T] -> [B, 1, T * hop]
+        frames = torch.tanh(torch.einsum("hc,bct->bht", self.weight.to(c.dtype), c))
+        frames = frames * (1 + 0 * f0.unsqueeze(1)) * (1 - 0.5 * uv.unsqueeze(1))
+        return frames.transpose(1, 2).reshape(c.shape[0], 1, -1)
+
+
+def conv_generator(hop_size=512, content_dim=CONTENT_DIM, channels=256, seed=0):
+    """A small HiFi-GAN-shaped generator (Linear pre-net, weight-normed
+    transposed-convolution upsampling and residual convolutions), for
+    benchmarks of CPU threading and quantization on real layer types."""
+    import torch
+    from torch import nn
+    from torch.nn.utils import weight_norm
+
+    factors = [8, 8, 4, 2]
+    if int(np.prod(factors)) != hop_size:
+        raise ValueError(f"the conv stand-in upsamples by {int(np.prod(factors))}, not {hop_size}")
+
+    class ConvGenerator(nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.pre = nn.Linear(content_dim, channels)
+            self.ups = nn.ModuleList()
+            self.res = nn.ModuleList()
+            ch = channels
+            for f in factors:
+                self.ups.append(weight_norm(nn.ConvTranspose1d(ch, ch // 2, 2 * f, f, padding=f // 2)))
+                ch //= 2
+                self.res.append(nn.ModuleList([weight_norm(nn.Conv1d(ch, ch, k, padding=k // 2))
+                                               for k in (3, 7, 11)]))
+            self.post = weight_norm(nn.Conv1d(ch, 1, 7, padding=3))
+
+        def infer(self, c, f0, g, uv, predict_f0=False, noice_scale=0.4):
+            x = self.pre(c.transpose(1, 2)).transpose(1, 2)
+            for up, blocks in zip(self.ups, self.res):
+                x = up(nn.functional.leaky_relu(x, 0.1))
+                x = x + sum(block(nn.functional.leaky_relu(x, 0.1)) for block in blocks) / len(blocks)
+            return torch.tanh(self.post(nn.functional.leaky_relu(x)))
+
+    torch.manual_seed(seed)
+    return ConvGenerator().eval()
+
+
+class StandInSvc:
+    def __init__(self, target_sample=44100, hop_size=512, speakers=("standin",), seed=0, conv=False):
+        self.target_sample = target_sample
+        self.hop_size = hop_size
+        self.dev = "cpu"
+        self.net_g_path = "G_standin.pth"
+        self.spk2id = SimpleNamespace(**{name: i for i, name in enumerate(speakers)})
+        if conv:
+            self.net_g_ms = conv_generator(hop_size, seed=seed)
+        else:
+            self.net_g_ms = StandInGenerator(hop_size, seed=seed)
+        self.cluster_model = None
+
+
+class StandInFeatures:
+    """Duck-typed FeatureCache that synthesizes (c, f0, uv) instead of caching them."""
+
+    def __init__(self, content_dim=CONTENT_DIM):
+        self.content_dim = content_dim
+
+    def key(self, data, sr, svc_model):
+        return estimate_frames(svc_model, len(data), sr)
+
+    def get(self, frames):
+        t = np.arange(frames, dtype=np.float32)
+        c = np.sin(np.outer(np.arange(1, self.content_dim + 1, dtype=np.float32), t) * 1e-2)
+        f0 = np.full(frames, 220.0, dtype=np.float32)
+        uv = np.ones(frames, dtype=np.float32)
+        return c.astype(np.float32), f0, uv
+
+    def put(self, key, c, f0, uv):
+        pass
@@ -0,0 +1,160 @@
+"""
+    Decoded and resampled input audio, cached by content and prefetched.
+
+    prepare_input() turns an input file (mp3, flac, ogg, opus, wav...) into
+    mono float32 audio at the model's sample rate. The result is stored in
+    an AudioCache as a float32 WAV named after a hash of the input's bytes
+    and the sample rate, so re-runs skip decoding and nothing is written
+    next to the inputs; the least recently used entries are deleted once
+    the cache grows past max_bytes (src.file_cache). Cached WAVs can be
+    read in windows by src.streaming as well, and for streaming runs the
+    input is decoded into the cache block by block instead of into memory.
+
+    prefetch() runs prepare_input() for the next files in a thread pool
+    while the current one converts. Decoding and resampling happen in
+    libsndfile/libmpg123 and soxr, which release the GIL, and threads hand
+    the arrays over without pickling them.
+"""
+
+import hashlib
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from src.file_cache import FileCache
+
+CACHE_DIR = "audio_cache"
+# samples per block when decoding into the cache for streaming
+DECODE_BLOCK = 2 ** 18
+PREFETCH_WORKERS = 2
+PREFETCH_AHEAD = 2
+
+
+def file_hash(path, chunk=2**20):
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class AudioCache(FileCache):
+    suffix = ".wav"
+
+    def __init__(self, root=CACHE_DIR, max_bytes=4 * 2**30):
+        super().__init__(root, max_bytes)
+
+    def key(self, in_path, sr):
+        return f"{file_hash(in_path)}_{sr}"
+
+    def get(self, key, pin=False):
+        """Path of the cached WAV, or None on a miss."""
+        return self.path(key) if self.touch(key, pin) else None
+
+    def put(self, key, audio, sr, pin=False):
+        return self.put_blocks(key, [audio], sr, pin)
+
+    def put_blocks(self, key, blocks, sr, pin=False):
+        """Write mono float32 blocks as one entry, without holding them all."""
+        import soundfile
+
+        tmp_path = self.tmp_path(key)
+        try:
+            with soundfile.SoundFile(tmp_path, "w", sr, 1, subtype="FLOAT", format="WAV") as f:
+                for block in blocks:
+                    f.write(block)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return self.add(key, tmp_path, pin)
+
+
+def decode(in_path, sr=None):
+    """Mono float32 audio of in_path, resampled to sr if given."""
+    import librosa
+    import numpy as np
+
+    audio, sr = librosa.load(in_path, sr=sr, mono=True)
+    return np.ascontiguousarray(audio, dtype=np.float32), sr
+
+
+def decode_blocks(in_path, sr, blocksize=DECODE_BLOCK):
+    """decode() as a generator of blocks, holding one block at a time.
+
+    Needs a format libsndfile reads and, unless the file is already at sr,
+    soxr (what librosa resamples with); otherwise the file is decoded whole
+    and handed out in blocks.
+    """
+    import numpy as np
+    import soundfile
+
+    try:
+        info = soundfile.info(in_path)
+    except RuntimeError:
+        info = None
+    resampler = None
+    if info is not None and info.samplerate != sr:
+        try:
+            import soxr
+            resampler = soxr.ResampleStream(info.samplerate, sr, 1, dtype="float32")
+        except ImportError:
+            info = None
+    if info is None:
+        audio, _ = decode(in_path, sr)
+        for start in range(0, len(audio), blocksize):
+            yield audio[start:start + blocksize]
+        return
+    for block in soundfile.blocks(in_path, blocksize=blocksize, dtype="float32", always_2d=True):
+        block = block.mean(axis=1)
+        yield block if resampler is None else resampler.resample_chunk(block)
+    if resampler is not None:
+        yield resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+
+
+def prepare_input(in_path, sr, cache=None, load_audio=True):
+    """{"input", "path", "sr", "audio", "release"} for in_path at sample rate sr.
+
+    "path" is the cached WAV (None without a cache) and "audio" the samples.
+    With a cache and load_audio false, "audio" is None and the input is
+    decoded into the cache block by block, so its length does not matter.
+    The cache entry is pinned against eviction until release() is called.
+    """
+    import soundfile
+
+    prepared = {"input": in_path, "path": None, "sr": sr, "audio": None, "release": lambda: None}
+    if cache is None:
+        prepared["audio"], _ = decode(in_path, sr)
+        return prepared
+    key = cache.key(in_path, sr)
+    cached = cache.get(key, pin=True)
+    if cached is not None:
+        prepared["release"] = lambda: cache.unpin(key)
+        prepared["path"] = cached
+        if load_audio:
+            prepared["audio"], _ = soundfile.read(cached, dtype="float32")
+        return prepared
+    if load_audio:
+        prepared["audio"], _ = decode(in_path, sr)
+        prepared["path"] = cache.put(key, prepared["audio"], sr, pin=True)
+    else:
+        prepared["path"] = cache.put_blocks(key, decode_blocks(in_path, sr), sr, pin=True)
+    prepared["release"] = lambda: cache.unpin(key)
+    return prepared
+
+
+def prefetch(fn, items, workers=PREFETCH_WORKERS, ahead=PREFETCH_AHEAD):
+    """Yield (item, future of fn(item)) in order, keeping `ahead` items in flight.
+
+    Only `ahead` results are held at a time, so memory stays bounded on
+    long lists. Call future.result() to wait for (or re-raise from) fn.
+    """
+    items = list(items)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        submitted = 0
+        while submitted < len(items) or pending:
+            while submitted < len(items) and len(pending) <= ahead:
+                pending.append((items[submitted], executor.submit(fn, items[submitted])))
+                submitted += 1
+            yield pending.popleft()
@@ -0,0 +1,121 @@
+"""
+    Batch conversion of many files across worker processes.
+
+    Each worker loads the speaker model once (in its initializer) and then
+    converts whole files handed to it by the pool; results are yielded as
+    they complete with per-file timing.
+"""
+
+import glob
+import os
+import sys
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+AUDIO_EXTENSIONS = ('.wav', '.flac', '.mp3', '.ogg', '.opus')
+
+_worker = {}
+
+
+def use_svc_root(svc_root):
+    """Make the so-vits-svc checkout importable and its models/ folder current."""
+    svc_root = os.path.abspath(svc_root)
+    if svc_root not in sys.path:
+        sys.path.insert(0, svc_root)
+    os.chdir(svc_root)
+
+
+def is_audio(path):
+    return path.lower().endswith(AUDIO_EXTENSIONS)
+
+
+def collect_inputs(patterns):
+    """Expand files, directories (recursively) and glob patterns to absolute audio paths."""
+    files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, _, names in os.walk(pattern):
+                files.extend(os.path.join(root, n) for n in sorted(names))
+        elif glob.has_magic(pattern):
+            files.extend(sorted(glob.glob(pattern, recursive=True)))
+        else:
+            files.append(pattern)
+    seen = set()
+    result = []
+    for f in files:
+        f = os.path.abspath(f)
+        if f not in seen and os.path.isfile(f) and is_audio(f):
+            seen.add(f)
+            result.append(f)
+    return result
+
+
+def output_path(in_path, output_dir, speaker_name, tran, ext="wav"):
+    stem = os.path.splitext(os.path.basename(in_path))[0]
+    return os.path.join(output_dir, f"{stem}_{tran}_key_{speaker_name}.{ext}")
+
+
+def init_worker(svc_root, speaker, cpu_profile=None):
+    use_svc_root(svc_root)
+    from src.model_pool import default_pool
+    pool_options = {}
+    if cpu_profile is not None:
+        cpu_profile.apply_threads()
+        pool_options["loader"] = cpu_profile.load
+    _worker["speaker"] = speaker
+    _worker["model"] = default_pool(**pool_options).get_speaker(speaker)
+
+
+def convert_file(in_path, out_path, params):
+    from src import conversion
+
+    start = time.perf_counter()
+    result = {"input": in_path, "output": out_path, "pid": os.getpid()}
+    try:
+        result["audio_seconds"] = conversion.convert_file(
+            _worker["model"], _worker["speaker"]["name"], in_path, out_path, **params)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def run_batch(files, speaker, output_dir, params, workers=1, svc_root=".", cpu_profile=None):
+    """Convert files with `workers` processes; yields one result dict per file.
+
+    cpu_profile (a src.cpu_inference.CpuProfile) sizes each worker's
+    thread pools and prepares its model for CPU inference.
+    """
+    output_dir = os.path.abspath(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = [(f, output_path(f, output_dir, speaker["name"], params.get("tran", 0)))
+            for f in files]
+
+    if workers <= 1:
+        init_worker(svc_root, speaker, cpu_profile)
+        for in_path, out_path in jobs:
+            yield convert_file(in_path, out_path, params)
+        return
+
+    # spawn, not fork: torch and its thread pools do not survive forking
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                             initializer=init_worker,
+                             initargs=(svc_root, speaker, cpu_profile)) as pool:
+        futures = [pool.submit(convert_file, in_path, out_path, params)
+                   for in_path, out_path in jobs]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def summarize(results, wall_seconds, workers):
+    ok = [r for r in results if "error" not in r]
+    audio_seconds = sum(r["audio_seconds"] for r in ok)
+    return {"files": len(results),
+            "failed": len(results) - len(ok),
+            "audio_seconds": audio_seconds,
+            "wall_seconds": wall_seconds,
+            "x_realtime": audio_seconds / wall_seconds if wall_seconds else 0.0,
+            "files_per_minute": 60 * len(ok) / wall_seconds if wall_seconds else 0.0,
+            "workers": workers}
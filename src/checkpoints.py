@@ -0,0 +1,245 @@
+"""
+    Inference-only generator checkpoints that load by memory-mapping.
+
+    Downloaded G_*.pth files are training checkpoints: a pickle with the
+    generator weights plus optimizer state, deserialized fully into RAM on
+    every load. prepare_model() keeps only the generator weights (optionally
+    as fp16 or bf16), folds weight norm into plain weights, and writes them
+    next to the original in the safetensors layout: an 8-byte header length,
+    a JSON header, then the raw tensors. load_slim() maps that file
+    copy-on-write, so tensors are views of the page cache and worker
+    processes loading the same speaker share pages. Weight norm is folded
+    in the file because folding a loaded model writes new private weights
+    in every process.
+
+    load_svc() in src.model_pool picks the prepared file up automatically
+    while it still matches the .pth it was made from, and falls back to the
+    .pth if the prepared file cannot be loaded.
+"""
+
+import json
+import os
+import struct
+import threading
+from contextlib import contextmanager
+import numpy as np
+
+SLIM_SUFFIXES = {"fp32": ".slim.safetensors", "fp16": ".half.safetensors", "bf16": ".bf16.safetensors"}
+# numpy has no bfloat16: those tensors are stored and mapped as uint16
+DTYPES = {"F32": np.float32, "F16": np.float16, "BF16": np.uint16, "F64": np.float64,
+          "I64": np.int64, "I32": np.int32, "I16": np.int16, "I8": np.int8, "U8": np.uint8,
+          "BOOL": np.bool_}
+
+_patch_lock = threading.Lock()
+
+
+def _torch_dtypes():
+    import torch
+    return {torch.float32: "F32", torch.float16: "F16", torch.bfloat16: "BF16",
+            torch.float64: "F64", torch.int64: "I64", torch.int32: "I32", torch.int16: "I16",
+            torch.int8: "I8", torch.uint8: "U8", torch.bool: "BOOL"}
+
+
+def slim_path(model_path, dtype="fp32"):
+    return os.path.splitext(model_path)[0] + SLIM_SUFFIXES[dtype]
+
+
+def source_stamp(model_path):
+    st = os.stat(model_path)
+    return {"source_size": str(st.st_size), "source_mtime_ns": str(st.st_mtime_ns)}
+
+
+def find_slim(model_path):
+    """The prepared artifact for model_path, if it was made from the current file."""
+    try:
+        stamp = source_stamp(model_path)
+    except OSError:
+        stamp = None
+    for dtype in SLIM_SUFFIXES:
+        path = slim_path(model_path, dtype)
+        if not os.path.exists(path):
+            continue
+        if stamp is None:
+            return path
+        try:
+            metadata = slim_metadata(path)
+        except (OSError, ValueError, struct.error):
+            continue
+        if "source_size" in metadata:
+            if all(metadata.get(k) == v for k, v in stamp.items()):
+                return path
+        elif os.path.getmtime(path) * 1e9 >= int(stamp["source_mtime_ns"]):
+            return path  # prepared before the source was stamped into the header
+    return None
+
+
+def generator_state(model_path):
+    """The generator state dict of a so-vits-svc training checkpoint."""
+    import torch
+    checkpoint = torch.load(model_path, map_location="cpu")
+    state = checkpoint.get("model", checkpoint)
+    return {k: v for k, v in state.items() if hasattr(v, "dtype")}
+
+
+def fold_weight_norm(module):
+    """Remove weight norm from every submodule that has it; returns how many."""
+    import torch
+    folded = 0
+    for m in module.modules():
+        if hasattr(m, "weight_g") and hasattr(m, "weight_v"):
+            try:
+                torch.nn.utils.remove_weight_norm(m)
+            except ValueError:
+                continue
+            folded += 1
+    return folded
+
+
+def fold_weight_norm_state(state):
+    """state with every weight_g/weight_v pair replaced by the weight it stands for."""
+    import torch
+    state = dict(state)
+    for name in [n for n in state if n.endswith(".weight_g")]:
+        prefix = name[:-len("weight_g")]
+        if prefix + "weight_v" not in state:
+            continue
+        g = state.pop(name).float()
+        v = state.pop(prefix + "weight_v")
+        # g keeps the size of the weight-norm dim (0 in so-vits-svc) and is 1 elsewhere
+        dims = [d for d in range(v.dim()) if g.dim() == v.dim() and g.shape[d] == v.shape[d] != 1]
+        keep = dims[0] if dims else None
+        others = [d for d in range(v.dim()) if d != keep]
+        norm = torch.linalg.vector_norm(v.float(), dim=others, keepdim=True) if others else v.float().abs()
+        state[prefix + "weight"] = (g * v.float() / norm).to(v.dtype)
+    return state
+
+
+def save_slim(state, path, dtype="fp32", metadata=None):
+    import torch
+    names = _torch_dtypes()
+    cast = {"fp32": torch.float32, "fp16": torch.float16, "bf16": torch.bfloat16}[dtype]
+    tensors = {}
+    for name, tensor in state.items():
+        tensor = tensor.detach().cpu()
+        if tensor.is_floating_point():
+            tensor = tensor.to(cast)
+        tensors[name] = tensor.contiguous()
+
+    # widest dtypes first keeps every tensor aligned to its element size
+    order = sorted(tensors, key=lambda n: (-tensors[n].element_size(), n))
+    header = {"__metadata__": dict(metadata or {}, format="pt")}
+    offset = 0
+    for name in order:
+        tensor = tensors[name]
+        nbytes = tensor.numel() * tensor.element_size()
+        header[name] = {"dtype": names[tensor.dtype], "shape": list(tensor.shape),
+                        "data_offsets": [offset, offset + nbytes]}
+        offset += nbytes
+    header_bytes = json.dumps(header, separators=(",", ":")).encode()
+    header_bytes += b" " * (-len(header_bytes) % 64)
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        for name in order:
+            tensor = tensors[name]
+            if tensor.dtype == torch.bfloat16:
+                tensor = tensor.view(torch.int16)
+            f.write(tensor.numpy().tobytes())
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_header(path):
+    with open(path, "rb") as f:
+        (header_len,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(header_len))
+    header["__header_len__"] = header_len
+    return header
+
+
+def slim_metadata(path):
+    return read_header(path).get("__metadata__", {})
+
+
+def load_slim(path):
+    """{name: tensor} backed by a copy-on-write memory map of path."""
+    import torch
+    header = read_header(path)
+    header_len = header.pop("__header_len__")
+    header.pop("__metadata__", None)
+    data = np.memmap(path, dtype=np.uint8, mode="c", offset=8 + header_len)
+    state = {}
+    for name, info in header.items():
+        start, end = info["data_offsets"]
+        array = data[start:end].view(DTYPES[info["dtype"]]).reshape(info["shape"])
+        tensor = torch.from_numpy(array)
+        if info["dtype"] == "BF16":
+            tensor = tensor.view(torch.bfloat16)
+        state[name] = tensor
+    return state
+
+
+def assign_state(module, state):
+    """Make module's parameters and buffers the given tensors, without copying.
+
+    Tensors whose dtype differs from the module's (fp16/bf16 files on a
+    float32 model) are converted, which does copy them. Like so-vits-svc's
+    load_checkpoint, names missing from the checkpoint keep the model's
+    initial values and names the model does not have are ignored.
+    """
+    own = dict(module.named_parameters())
+    own.update(module.named_buffers())
+    missing = sorted(set(own) - set(state))
+    unexpected = sorted(set(state) - set(own))
+    if missing:
+        print(f"{len(missing)} weights not in the checkpoint, keeping initial values: {missing[:5]}")
+    if unexpected:
+        print(f"Ignoring {len(unexpected)} checkpoint weights the model does not have: {unexpected[:5]}")
+    for name, tensor in state.items():
+        target = own.get(name)
+        if target is None:
+            continue
+        if tuple(target.shape) != tuple(tensor.shape):
+            raise ValueError(f"{name}: checkpoint shape {tuple(tensor.shape)}, "
+                             f"model shape {tuple(target.shape)}")
+        target.data = tensor if tensor.dtype == target.dtype else tensor.to(target.dtype)
+
+
+@contextmanager
+def slim_checkpoint_loader():
+    """Let so-vits-svc's utils.load_checkpoint read prepared files (used by load_svc)."""
+    import utils as svc_utils
+    with _patch_lock:
+        original = svc_utils.load_checkpoint
+
+        def load_checkpoint(checkpoint_path, model, optimizer=None, *args, **kwargs):
+            if not checkpoint_path.endswith(".safetensors"):
+                return original(checkpoint_path, model, optimizer, *args, **kwargs)
+            target = model.module if hasattr(model, "module") else model
+            if slim_metadata(checkpoint_path).get("weight_norm") == "folded":
+                fold_weight_norm(target)  # the initial weights, replaced below
+            assign_state(target, load_slim(checkpoint_path))
+            return model, optimizer, None, 0
+
+        svc_utils.load_checkpoint = load_checkpoint
+        try:
+            yield
+        finally:
+            svc_utils.load_checkpoint = original
+
+
+def prepare_model(model_path, dtype="fp32", fold=True):
+    """Write the inference-only artifact for model_path; returns (path, old bytes, new bytes)."""
+    state = generator_state(model_path)
+    metadata = dict(source_stamp(model_path), source=os.path.basename(model_path), dtype=dtype)
+    if fold:
+        state = fold_weight_norm_state(state)
+        metadata["weight_norm"] = "folded"
+    path = save_slim(state, slim_path(model_path, dtype), dtype, metadata=metadata)
+    for other in SLIM_SUFFIXES:
+        stale = slim_path(model_path, other)
+        if other != dtype and os.path.exists(stale):
+            os.remove(stale)
+    return path, os.path.getsize(model_path), os.path.getsize(path)
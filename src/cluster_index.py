@@ -0,0 +1,145 @@
+"""
+    Nearest-centroid lookup for cluster_infer_ratio.
+
+    so-vits-svc's cluster models are per-speaker sklearn KMeans objects, and
+    cluster.get_cluster_center_result() calls KMeans.predict once per
+    segment, re-validating the input and the centroids every time.
+    CentroidIndex keeps a speaker's centroids as one contiguous float32
+    matrix with precomputed squared norms; assignment is then
+    argmin(|c|^2 - 2 x.c) as a blocked matrix product over all frames of a
+    file at once.
+
+    For large codebooks, nprobe > 0 switches to an approximate search: the
+    centroids are grouped into about sqrt(k) cells by a small k-means over
+    the centroids themselves, and each frame is only compared with the
+    centroids of its nprobe nearest cells.
+"""
+
+import weakref
+import numpy as np
+
+# rows per distance block: bounds the [rows, k] distance matrix
+BLOCK_ELEMENTS = 2 ** 22
+COARSE_ITERATIONS = 10
+
+_indexes = weakref.WeakKeyDictionary()  # svc_model -> {speaker: CentroidIndex}
+
+
+def _blocks(n, k):
+    step = max(1, BLOCK_ELEMENTS // max(k, 1))
+    for start in range(0, n, step):
+        yield start, min(n, start + step)
+
+
+class CentroidIndex:
+    def __init__(self, centers, seed=0):
+        self.centers = np.ascontiguousarray(centers, dtype=np.float32)
+        self.norms = np.einsum("kd,kd->k", self.centers, self.centers)
+        self.seed = seed
+        self._cells = None
+
+    def __len__(self):
+        return len(self.centers)
+
+    def assign(self, x, nprobe=0):
+        """Index of the nearest centroid for every row of x [N, D]."""
+        x = np.asarray(x, dtype=np.float32)
+        if nprobe and nprobe < self.n_cells():
+            return self._assign_approximate(x, nprobe)
+        labels = np.empty(len(x), dtype=np.int64)
+        for start, end in _blocks(len(x), len(self.centers)):
+            scores = x[start:end] @ self.centers.T
+            scores *= -2
+            scores += self.norms
+            labels[start:end] = scores.argmin(axis=1)
+        return labels
+
+    def lookup(self, x, nprobe=0):
+        """Nearest centroid of every row of x, as an [N, D] float32 array."""
+        return self.centers[self.assign(x, nprobe)]
+
+    def n_cells(self):
+        return max(1, int(round(np.sqrt(len(self.centers)))))
+
+    def _train_cells(self):
+        """Coarse k-means over the centroids: (cell centers, members of each cell)."""
+        rng = np.random.default_rng(self.seed)
+        n_cells = self.n_cells()
+        # k-means++ seeding, so dense regions do not end up in one huge cell
+        picks = [rng.integers(len(self.centers))]
+        nearest = np.full(len(self.centers), np.inf, dtype=np.float32)
+        for _ in range(n_cells - 1):
+            diff = self.centers - self.centers[picks[-1]]
+            nearest = np.minimum(nearest, np.einsum("kd,kd->k", diff, diff))
+            total = nearest.sum()
+            if not total > 0:
+                break  # every centroid duplicates a pick: no more distinct cells
+            picks.append(rng.choice(len(self.centers), p=nearest / total))
+        n_cells = len(picks)
+        coarse = CentroidIndex(self.centers[picks])
+        for _ in range(COARSE_ITERATIONS):
+            owner = coarse.assign(self.centers)
+            sums = np.zeros_like(coarse.centers)
+            np.add.at(sums, owner, self.centers)
+            counts = np.bincount(owner, minlength=n_cells)
+            filled = counts > 0
+            sums[filled] /= counts[filled, None]
+            sums[~filled] = coarse.centers[~filled]
+            coarse = CentroidIndex(sums)
+        owner = coarse.assign(self.centers)
+        members = [np.flatnonzero(owner == cell) for cell in range(n_cells)]
+        return coarse, members
+
+    def _assign_approximate(self, x, nprobe):
+        if self._cells is None:
+            self._cells = self._train_cells()
+        coarse, members = self._cells
+        if nprobe >= len(coarse.centers):
+            return self.assign(x)  # fewer distinct cells than probes: search everything
+        # nprobe nearest cells per frame
+        probes = np.empty((len(x), nprobe), dtype=np.int64)
+        for start, end in _blocks(len(x), len(coarse)):
+            scores = coarse.norms - 2 * (x[start:end] @ coarse.centers.T)
+            probes[start:end] = np.argpartition(scores, nprobe - 1, axis=1)[:, :nprobe]
+
+        best = np.full(len(x), np.inf, dtype=np.float32)
+        labels = np.zeros(len(x), dtype=np.int64)
+        # one dense product per cell over the frames that probe it
+        for cell, ids in enumerate(members):
+            rows = np.flatnonzero((probes == cell).any(axis=1))
+            if not len(rows) or not len(ids):
+                continue
+            for start, end in _blocks(len(rows), len(ids)):
+                block = rows[start:end]
+                scores = self.norms[ids] - 2 * (x[block] @ self.centers[ids].T)
+                nearest = scores.argmin(axis=1)
+                score = scores[np.arange(len(block)), nearest]
+                better = score < best[block]
+                best[block[better]] = score[better]
+                labels[block[better]] = ids[nearest[better]]
+        # frames whose probed cells were all empty
+        missed = np.flatnonzero(np.isinf(best))
+        if len(missed):
+            labels[missed] = self.assign(x[missed])
+        return labels
+
+
+def speaker_index(svc_model, speaker):
+    """The CentroidIndex for speaker's cluster model, built once per loaded model."""
+    per_model = _indexes.setdefault(svc_model, {})
+    index = per_model.get(speaker)
+    if index is None:
+        index = per_model[speaker] = CentroidIndex(svc_model.cluster_model[speaker].cluster_centers_)
+    return index
+
+
+def cluster_centers(svc_model, speaker, contents, nprobe=0):
+    """Nearest cluster centers for a list of content features [C, T_i].
+
+    All frames are matched in one batch; returns [C, T_i] float32 arrays.
+    """
+    index = speaker_index(svc_model, speaker)
+    frames = np.concatenate([np.asarray(c).T for c in contents]) if contents else np.zeros((0, 0))
+    centers = index.lookup(frames, nprobe) if len(frames) else frames
+    bounds = np.cumsum([0] + [np.shape(c)[1] for c in contents])
+    return [np.ascontiguousarray(centers[start:end].T) for start, end in zip(bounds[:-1], bounds[1:])]
@@ -0,0 +1,334 @@
+"""
+    Segment-level conversion shared by the notebook UI and the CLI.
+
+    A song is cut by the slicer into (slice_tag, data) chunks; silent chunks
+    become zeros and voiced chunks are padded with half a second of silence,
+    converted and un-padded again. With batch_size > 1 voiced chunks of
+    similar length are zero-padded to a common length and sent through the
+    generator in a single forward pass.
+
+    Segments are handed to the model as float32 arrays; Svc.infer only takes
+    a path or file object, so infer_array() reimplements its feature
+    extraction on in-memory audio instead of round-tripping through WAV.
+"""
+
+import os
+import tempfile
+import time
+import numpy as np
+
+from src import cluster_index, fast_slicer
+from src.profiling import NULL_PROFILER
+
+PAD_SECONDS = 0.5
+# Outputs longer than this many samples are assembled in a memory-mapped
+# temp file instead of RAM (about 30 minutes at 44.1 kHz).
+MEMMAP_SAMPLES = 44100 * 60 * 30
+# Longest/shortest frame ratio allowed inside one batch. Padding frames are
+# seen by the encoder's attention, so batches only group similar lengths.
+MAX_BATCH_PAD_RATIO = 1.25
+
+
+def speaker_id(svc_model, speaker):
+    sid = svc_model.spk2id.__dict__.get(speaker)
+    if sid is None and type(speaker) is int and len(svc_model.spk2id.__dict__) >= speaker:
+        sid = speaker
+    if sid is None:
+        raise KeyError(f"Speaker {speaker} not found in model config")
+    return int(sid)
+
+
+def output_length(n_samples, sr, target_sample):
+    return int(np.ceil(n_samples / sr * target_sample))
+
+
+class AudioAssembler:
+    """Preallocated float32 output track, filled one converted segment at a time.
+
+    Each segment gets exactly the slot computed from the slicer chunks: short
+    outputs are centred and zero padded (like infer_tool.pad_array), long
+    ones are cut at the end of their slot.
+    """
+
+    def __init__(self, lengths, memmap_dir=None, memmap_samples=MEMMAP_SAMPLES):
+        self.offsets = np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)])
+        total = int(self.offsets[-1])
+        self.memmap_path = None
+        if total > memmap_samples:
+            fd, self.memmap_path = tempfile.mkstemp(suffix=".f32", dir=memmap_dir)
+            os.close(fd)
+            self.audio = np.memmap(self.memmap_path, dtype=np.float32, mode="w+", shape=(total,))
+        else:
+            self.audio = np.zeros(total, dtype=np.float32)
+
+    @classmethod
+    def for_chunks(cls, audio_data, audio_sr, target_sample, **kwargs):
+        return cls([output_length(len(data), audio_sr, target_sample) for _, data in audio_data], **kwargs)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def write(self, index, segment):
+        start, end = int(self.offsets[index]), int(self.offsets[index + 1])
+        length = end - start
+        segment = segment[:length]
+        left = (length - len(segment)) // 2
+        self.audio[start:start + left] = 0
+        self.audio[start + left:start + left + len(segment)] = segment
+        self.audio[start + left + len(segment):end] = 0
+
+    def close(self):
+        """Release the memory-mapped file, if one was used."""
+        if self.memmap_path is not None:
+            del self.audio
+            os.remove(self.memmap_path)
+            self.memmap_path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def as_float32(data):
+    """View raw sample buffers as a float32 array, copying only if needed."""
+    if isinstance(data, (memoryview, bytes, bytearray)):
+        return np.frombuffer(data, dtype=np.float32)
+    return np.asarray(data, dtype=np.float32)
+
+
+def pad_segment(data, sr):
+    pad_len = int(sr * PAD_SECONDS)
+    data = as_float32(data)
+    padded = np.zeros(len(data) + 2 * pad_len, dtype=np.float32)
+    padded[pad_len:pad_len + len(data)] = data
+    return padded
+
+
+def unpad_segment(audio, target_sample):
+    pad_len = int(target_sample * PAD_SECONDS)
+    return audio[pad_len:-pad_len]
+
+
+def extract_features(svc_model, data, sr):
+    """Speaker- and transpose-independent features of one padded segment.
+
+    Returns numpy arrays (c [C, T], f0 [T], uv [T]); mirrors Svc.get_unit_f0
+    minus the librosa.load of a file.
+    """
+    import librosa
+    import torch
+    import utils as svc_utils
+
+    wav = as_float32(data)
+    if sr != svc_model.target_sample:
+        wav = librosa.resample(wav, orig_sr=sr, target_sr=svc_model.target_sample)
+
+    f0 = svc_utils.compute_f0_parselmouth(wav, sampling_rate=svc_model.target_sample,
+                                          hop_length=svc_model.hop_size)
+    f0, uv = svc_utils.interpolate_f0(f0)
+
+    wav16k = librosa.resample(wav, orig_sr=svc_model.target_sample, target_sr=16000)
+    wav16k = torch.from_numpy(wav16k).to(svc_model.dev)
+    c = svc_utils.get_hubert_content(svc_model.hubert_model, wav_16k_tensor=wav16k)
+    c = svc_utils.repeat_expand_2d(c.squeeze(0), len(f0))
+    return c.cpu().numpy(), np.asarray(f0, dtype=np.float32), np.asarray(uv, dtype=np.float32)
+
+
+def cached_features(svc_model, data, sr, feature_cache=None):
+    """extract_features(), skipped for segments already in feature_cache."""
+    if feature_cache is None:
+        return extract_features(svc_model, data, sr)
+    key = feature_cache.key(data, sr, svc_model)
+    features = feature_cache.get(key)
+    if features is None:
+        features = extract_features(svc_model, data, sr)
+        feature_cache.put(key, *features)
+    return features
+
+
+def model_inputs(svc_model, features, tran, cluster_c=None, cluster_infer_ratio=0.0):
+    """Tensors for infer_batch from (c, f0, uv), transposed and mixed with cluster centers."""
+    import torch
+
+    c, f0, uv = features
+    if cluster_infer_ratio != 0:
+        c = cluster_infer_ratio * cluster_c + (1 - cluster_infer_ratio) * c
+    f0 = torch.from_numpy(f0 * 2 ** (tran / 12)).unsqueeze(0).to(svc_model.dev)
+    uv = torch.from_numpy(uv).unsqueeze(0).to(svc_model.dev)
+    c = torch.from_numpy(np.ascontiguousarray(c)).to(svc_model.dev)
+    return c.unsqueeze(0), f0, uv
+
+
+def segment_features(svc_model, speaker, tran, data, sr, cluster_infer_ratio=0.0,
+                     feature_cache=None, cluster_nprobe=0):
+    """Model inputs (c, f0, uv) for one padded segment.
+
+    With a FeatureCache, extraction is skipped for segments seen before;
+    transpose and cluster mixing are applied afterwards.
+    """
+    features = cached_features(svc_model, data, sr, feature_cache)
+    cluster_c = None
+    if cluster_infer_ratio != 0:
+        cluster_c = cluster_index.cluster_centers(svc_model, speaker, [features[0]], cluster_nprobe)[0]
+    return model_inputs(svc_model, features, tran, cluster_c, cluster_infer_ratio)
+
+
+def estimate_frames(svc_model, n_samples, sr):
+    return output_length(n_samples, sr, svc_model.target_sample) // svc_model.hop_size
+
+
+def plan_batches(frame_counts, batch_size, max_pad_ratio=MAX_BATCH_PAD_RATIO):
+    """Group segment indices into batches of similar length, longest first."""
+    order = sorted(range(len(frame_counts)), key=lambda i: frame_counts[i], reverse=True)
+    batches = []
+    current = []
+    for i in order:
+        if current and (len(current) >= batch_size or
+                        frame_counts[current[0]] > frame_counts[i] * max_pad_ratio):
+            batches.append(current)
+            current = []
+        current.append(i)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def infer_batch(svc_model, speaker, features, auto_predict_f0=False, noice_scale=0.4,
+                profiler=NULL_PROFILER):
+    """Run one generator forward pass over a list of (c, f0, uv) features.
+
+    Returns one 1-D numpy array per input, trimmed to its own frame count.
+    """
+    import torch
+
+    frames = [f0.shape[-1] for _, f0, _ in features]
+    n_frames = max(frames)
+    c = torch.cat([torch.nn.functional.pad(c, (0, n_frames - c.shape[-1])) for c, _, _ in features])
+    f0 = torch.cat([torch.nn.functional.pad(f0, (0, n_frames - f0.shape[-1])) for _, f0, _ in features])
+    uv = torch.cat([torch.nn.functional.pad(uv, (0, n_frames - uv.shape[-1])) for _, _, uv in features])
+    sid = torch.LongTensor([speaker_id(svc_model, speaker)] * len(features)).to(svc_model.dev).unsqueeze(1)
+    if "half" in svc_model.net_g_path and torch.cuda.is_available():
+        c = c.half()
+
+    with profiler.stage("infer"), torch.no_grad():
+        out = svc_model.net_g_ms.infer(c, f0=f0, g=sid, uv=uv,
+                                       predict_f0=auto_predict_f0,
+                                       noice_scale=noice_scale)[:, 0].data.float()
+    with profiler.stage("to_numpy"):
+        out = out.cpu().numpy()
+    hop = out.shape[-1] // n_frames
+    return [out[i, :frames[i] * hop] for i in range(len(features))]
+
+
+def slice_audio(audio, sr, db_thresh=-40, min_len=5000):
+    """In-memory equivalent of slicer.cut + slicer.chunks2audio; chunks are views."""
+    return fast_slicer.chunks(audio, fast_slicer.slice_bounds(audio, sr, db_thresh, min_len))
+
+
+def infer_array(svc_model, speaker, tran, data, sr, cluster_infer_ratio=0.0,
+                auto_predict_f0=False, noice_scale=0.4, feature_cache=None, cluster_nprobe=0):
+    """Like Svc.infer, but takes a float32 array (or buffer) and sample rate.
+
+    Returns the converted audio as a numpy array at svc_model.target_sample.
+    """
+    features = segment_features(svc_model, speaker, tran, data, sr, cluster_infer_ratio,
+                                feature_cache=feature_cache, cluster_nprobe=cluster_nprobe)
+    return infer_batch(svc_model, speaker, [features],
+                       auto_predict_f0=auto_predict_f0,
+                       noice_scale=noice_scale)[0]
+
+
+def convert_chunks(svc_model, speaker, audio_data, audio_sr, tran=0,
+                   cluster_infer_ratio=0.0, auto_predict_f0=False,
+                   noice_scale=0.4, batch_size=1, out=None, feature_cache=None,
+                   progress=None, profiler=None, cluster_nprobe=0):
+    """Convert slicer chunks into an AudioAssembler (created if out is None).
+
+    progress, if given, is called with (segments_done, segments_total);
+    profiler, if given, times the stages and every batch (see src.profiling).
+    With cluster_infer_ratio, the features of all voiced chunks are
+    extracted first and matched to the cluster centers in one batch;
+    cluster_nprobe > 0 makes that match approximate (see src.cluster_index).
+    """
+    profiler = profiler or NULL_PROFILER
+    target_sample = svc_model.target_sample
+    if out is None:
+        out = AudioAssembler.for_chunks(audio_data, audio_sr, target_sample)
+    voiced = []
+    for index, (slice_tag, data) in enumerate(audio_data):
+        print(f'#=====segment start, 'f'{round(len(data) / audio_sr, 3)}s======')
+        if slice_tag:
+            print('jump empty segment')
+        else:
+            voiced.append(index)
+
+    done = len(audio_data) - len(voiced)
+    if progress is not None:
+        progress(done, len(audio_data))
+    pad_len = int(audio_sr * PAD_SECONDS)
+    frame_counts = [estimate_frames(svc_model, len(audio_data[i][1]) + 2 * pad_len, audio_sr)
+                    for i in voiced]
+    raw = {}
+    cluster_c = {}
+    if cluster_infer_ratio != 0:
+        for i in voiced:
+            with profiler.stage("pad"):
+                data = pad_segment(audio_data[i][1], audio_sr)
+            with profiler.stage("features"):
+                raw[i] = cached_features(svc_model, data, audio_sr, feature_cache)
+        with profiler.stage("cluster"):
+            centers = cluster_index.cluster_centers(svc_model, speaker, [raw[i][0] for i in voiced],
+                                                    cluster_nprobe)
+        cluster_c = dict(zip(voiced, centers))
+
+    for batch in plan_batches(frame_counts, max(batch_size, 1)):
+        start = time.perf_counter()
+        features = []
+        for b in batch:
+            i = voiced[b]
+            if i not in raw:
+                with profiler.stage("pad"):
+                    data = pad_segment(audio_data[i][1], audio_sr)
+                with profiler.stage("features"):
+                    raw[i] = cached_features(svc_model, data, audio_sr, feature_cache)
+            with profiler.stage("features"):
+                features.append(model_inputs(svc_model, raw.pop(i), tran, cluster_c.pop(i, None),
+                                             cluster_infer_ratio))
+        outputs = infer_batch(svc_model, speaker, features,
+                              auto_predict_f0=auto_predict_f0,
+                              noice_scale=noice_scale, profiler=profiler)
+        with profiler.stage("assemble"):
+            for b, segment in zip(batch, outputs):
+                out.write(voiced[b], unpad_segment(segment, target_sample))
+        profiler.batch([voiced[b] for b in batch],
+                       sum(len(audio_data[voiced[b]][1]) for b in batch) / audio_sr,
+                       time.perf_counter() - start)
+        if progress is not None:
+            done += len(batch)
+            progress(done, len(audio_data))
+    return out
+
+
+def convert_array(svc_model, speaker, audio, sr, slice_db=-40, profiler=None, **kwargs):
+    """Slice and convert a mono float32 array; returns an AudioAssembler."""
+    with (profiler or NULL_PROFILER).stage("slice"):
+        audio_data = slice_audio(as_float32(audio), sr, db_thresh=slice_db)
+    return convert_chunks(svc_model, speaker, audio_data, sr, profiler=profiler, **kwargs)
+
+
+def convert_file(svc_model, speaker, in_path, out_path, profiler=None, **kwargs):
+    """Decode, convert and write one file; returns the input length in seconds."""
+    import librosa
+    import soundfile
+
+    profiler = profiler or NULL_PROFILER
+    with profiler.file(in_path) as record:
+        with profiler.stage("decode"):
+            audio, sr = librosa.load(in_path, sr=None, mono=True)
+        record["audio_seconds"] = len(audio) / sr
+        with convert_array(svc_model, speaker, audio, sr, profiler=profiler, **kwargs) as out:
+            with profiler.stage("write"):
+                soundfile.write(out_path, out.audio, svc_model.target_sample)
+    return len(audio) / sr
@@ -0,0 +1,120 @@
+"""
+    CPU execution profile for the Svc pipeline.
+
+    By default torch gives every process one intra-op thread per core, so N
+    worker processes run N x cores threads that mostly wait on each other.
+    CpuProfile splits the cores between the workers (with one inter-op
+    thread each) and prepares loaded models for CPU inference:
+
+    - fold_weight_norm replaces the weight-norm reparametrisation of the
+      generator's convolutions with plain weights: the same output without
+      recomputing every weight on every forward pass. Models loaded from a
+      slim checkpoint are left alone: folding would replace their shared,
+      memory-mapped weights with private copies in every worker, and
+      `prepare` has already folded them in the file.
+    - quantize applies dynamic int8 quantization to the Linear layers of the
+      content encoder (the HuBERT/ContentVec feed-forward blocks) and of the
+      generator. Attention projections and narrow layers such as the NSF
+      source's harmonic mixer are left in float32. The encoder's precision
+      is recorded on the model (content_precision), so cached features of
+      the int8 and float32 encoders are kept apart.
+    - quantize_conv also quantizes the generator's convolutions. That is
+      lossy and not faster on every CPU; check it with
+      benchmarks/bench_cpu.py first.
+
+    Models on a GPU are left as they are.
+"""
+
+import os
+
+from src.checkpoints import fold_weight_norm
+
+# narrower Linear layers gain nothing from int8 and their activations
+# (e.g. the NSF harmonic sources) lose too much precision
+MIN_QUANT_FEATURES = 64
+
+
+def available_cores():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def threads_per_worker(workers, cores=None):
+    return max(1, (cores or available_cores()) // max(1, workers))
+
+
+def quantize_int8(module, conv=False):
+    """Dynamically quantized copy of module (see the module docstring for what is skipped)."""
+    import torch
+    from torch import nn
+    from torch.ao.nn.quantized import dynamic as nnqd
+    from torch.ao.quantization import default_dynamic_qconfig, quantize_dynamic
+    from torch.ao.quantization.quantization_mappings import get_default_dynamic_quant_module_mappings
+
+    # attention modules read their projections' .weight directly
+    skip = set()
+    for m in module.modules():
+        if "Attention" in type(m).__name__:
+            skip.update(id(c) for c in m.modules() if c is not m)
+
+    spec = {}
+    for name, m in module.named_modules():
+        if id(m) in skip:
+            continue
+        if isinstance(m, nn.Linear) and min(m.in_features, m.out_features) >= MIN_QUANT_FEATURES:
+            spec[name] = default_dynamic_qconfig
+        elif conv and type(m) in (nn.Conv1d, nn.ConvTranspose1d):
+            spec[name] = default_dynamic_qconfig
+    mapping = dict(get_default_dynamic_quant_module_mappings())
+    if conv:
+        mapping.update({nn.Conv1d: nnqd.Conv1d, nn.ConvTranspose1d: nnqd.ConvTranspose1d})
+    return quantize_dynamic(module, spec, dtype=torch.qint8, mapping=mapping)
+
+
+class CpuProfile:
+    def __init__(self, workers=1, threads=None, interop_threads=1, fold_weight_norm=True,
+                 quantize=False, quantize_conv=False):
+        self.workers = workers
+        self.threads = threads or threads_per_worker(workers)
+        self.interop_threads = interop_threads
+        self.fold_weight_norm = fold_weight_norm
+        self.quantize = quantize
+        self.quantize_conv = quantize_conv
+
+    def apply_threads(self):
+        """Size this process's thread pools; call before the first model runs."""
+        for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+            os.environ[var] = str(self.threads)
+        import torch
+        torch.set_num_threads(self.threads)
+        try:
+            torch.set_num_interop_threads(self.interop_threads)
+        except RuntimeError:
+            pass  # fixed for good once inter-op work has run in this process
+
+    def prepare(self, svc_model):
+        """Apply the model options to a loaded Svc (once; CPU models only)."""
+        if str(svc_model.dev) != "cpu" or getattr(svc_model, "cpu_profile", None) is not None:
+            return svc_model
+        if self.fold_weight_norm and getattr(svc_model, "slim_checkpoint", None) is None:
+            fold_weight_norm(svc_model.net_g_ms)
+        if self.quantize:
+            svc_model.net_g_ms = quantize_int8(svc_model.net_g_ms, conv=self.quantize_conv)
+            if getattr(svc_model, "hubert_model", None) is not None:
+                svc_model.hubert_model = quantize_int8(svc_model.hubert_model)
+                svc_model.content_precision = "int8"
+        svc_model.cpu_profile = self.describe()
+        return svc_model
+
+    def load(self, model_path, cfg_path, cluster_path=""):
+        """ModelPool loader: load_svc() followed by prepare()."""
+        from src.model_pool import load_svc
+        return self.prepare(load_svc(model_path, cfg_path, cluster_path))
+
+    def describe(self):
+        return {"workers": self.workers, "threads": self.threads,
+                "interop_threads": self.interop_threads,
+                "fold_weight_norm": self.fold_weight_norm,
+                "quantize": self.quantize, "quantize_conv": self.quantize_conv}
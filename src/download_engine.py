@@ -0,0 +1,176 @@
+"""
+    Resumable, verified HTTP downloads on a bounded thread pool.
+
+    Files are streamed into "<path>.part" and renamed into place once
+    complete. An interrupted download resumes from the size of the .part
+    file with an HTTP Range request (falling back to a full download if the
+    server ignores it). When a sha256 is known the data is hashed while it is
+    written, verified before the rename, and an existing file whose hash
+    already matches is not downloaded again.
+"""
+
+import hashlib
+import http.client
+import os
+import socket
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+CHUNK_SIZE = 1 << 20
+
+
+class IntegrityError(Exception):
+    pass
+
+
+class DownloadJob:
+    def __init__(self, url, path, sha256=None, size=None):
+        self.url = url
+        self.path = path
+        self.sha256 = sha256.lower() if sha256 else None
+        self.size = size
+
+    def __repr__(self):
+        return f"DownloadJob({self.url!r}, {self.path!r})"
+
+
+def sha256_file(path, chunk_size=CHUNK_SIZE):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def lfs_pointer_sha256(path):
+    """sha256 recorded in a git-lfs pointer file, or None if path is not one."""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(512)
+    except OSError:
+        return None
+    if not head.startswith(b"version https://git-lfs"):
+        return None
+    for line in head.decode("utf-8", "replace").splitlines():
+        if line.startswith("oid sha256:"):
+            return line.split(":", 1)[1].strip()
+    return None
+
+
+def fetch(job, force=False, progress=None, timeout=60):
+    """Download one job. Returns "skipped", "downloaded" or "resumed".
+
+    progress, if given, is called with (bytes_done, bytes_total or None).
+    """
+    if os.path.exists(job.path) and not force:
+        if job.sha256 is None or sha256_file(job.path) == job.sha256:
+            return "skipped"
+        print(f"{job.path} does not match its sha256, downloading again")
+
+    os.makedirs(os.path.dirname(job.path) or ".", exist_ok=True)
+    part_path = job.path + ".part"
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+
+    request = urllib.request.Request(job.url)
+    if offset:
+        request.add_header("Range", f"bytes={offset}-")
+    try:
+        response = urllib.request.urlopen(request, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        if e.code != 416 or not offset:
+            raise
+        complete = _complete_size(e.headers.get("Content-Range"), job.size)
+        e.close()
+        if complete != offset:
+            # a stale .part that does not match the file on the server
+            print(f"{part_path} does not match the file on the server, downloading again")
+            os.remove(part_path)
+            return fetch(job, force=force, progress=progress, timeout=timeout)
+        # the .part file already holds the whole file
+        response = None
+
+    hasher = hashlib.sha256() if job.sha256 else None
+    status = "downloaded"
+    if response is not None:
+        with response:
+            if offset and response.status != 206:
+                offset = 0
+            total = response.headers.get("Content-Length")
+            total = int(total) + offset if total is not None else job.size
+            if offset:
+                status = "resumed"
+                if hasher is not None:
+                    _hash_prefix(hasher, part_path, offset)
+            done = offset
+            with open(part_path, "r+b" if offset else "wb") as f:
+                f.seek(offset)
+                f.truncate()
+                for chunk in iter(lambda: response.read(CHUNK_SIZE), b""):
+                    f.write(chunk)
+                    if hasher is not None:
+                        hasher.update(chunk)
+                    done += len(chunk)
+                    if progress is not None:
+                        progress(done, total)
+    else:
+        status = "resumed"
+        if hasher is not None:
+            _hash_prefix(hasher, part_path, offset)
+
+    if hasher is not None and hasher.hexdigest() != job.sha256:
+        os.remove(part_path)
+        raise IntegrityError(f"sha256 mismatch for {job.url}: expected {job.sha256}, got {hasher.hexdigest()}")
+    os.replace(part_path, job.path)
+    return status
+
+
+def _complete_size(content_range, size=None):
+    """Full size from a 416's "Content-Range: bytes */N", else the expected size."""
+    if content_range and "/" in content_range:
+        total = content_range.rsplit("/", 1)[1].strip()
+        if total.isdigit():
+            return int(total)
+    return size
+
+
+def _hash_prefix(hasher, path, length):
+    with open(path, "rb") as f:
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            hasher.update(chunk)
+            length -= len(chunk)
+
+
+class DownloadEngine:
+    def __init__(self, max_workers=4, timeout=60, retries=2, progress_factory=None):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.retries = retries
+        # progress_factory(job) -> (callback, close); used for progress bars
+        self.progress_factory = progress_factory
+
+    def fetch(self, job, force=False):
+        callback, close = self.progress_factory(job) if self.progress_factory else (None, None)
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    return fetch(job, force=force, progress=callback, timeout=self.timeout)
+                except (urllib.error.URLError, ConnectionError, TimeoutError, socket.timeout,
+                        http.client.IncompleteRead) as e:
+                    # keep the .part file so the next attempt resumes
+                    if attempt == self.retries:
+                        raise
+                    print(f"Retrying {job.url} after error: {e}")
+        finally:
+            if close is not None:
+                close()
+
+    def run(self, jobs, force=False):
+        """Download jobs concurrently; returns {path: status} and raises the first error."""
+        jobs = list(jobs)
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(jobs) or 1))) as pool:
+            futures = [(job, pool.submit(self.fetch, job, force)) for job in jobs]
+            return {job.path: future.result() for job, future in futures}
@@ -12,51 +12,67 @@
 """
 
 from genericpath import exists
-import glob
 import os
 import re
 import tarfile
+import tempfile
 import urllib.request
 import subprocess
 from zipfile import ZipFile
 from time import sleep
 from sys import platform
-from tqdm import tqdm
-import gdown
-import huggingface_hub
 import shutil
+import fnmatch
+from concurrent.futures import ThreadPoolExecutor
 
+from src.download_engine import DownloadEngine, DownloadJob
+from src.model_catalog import CATALOG_TTL, ModelCatalog
+
+MODELS_ROOT = '/content/so-vits-svc/models'
+ARCHIVE_EXTENSIONS = (".zip", ".tar.bz2", ".tar.gz", ".tar", ".7z")
+# archive members needed for inference; everything else is left packed
+MODEL_MEMBER_PATTERNS = ("G_*.pth", "*.pt", "config.json")
+
+
+def archive_stem(path):
+    for ext in ARCHIVE_EXTENSIONS:
+        if path.endswith(ext):
+            return path[:-len(ext)]
+    return os.path.splitext(path)[0]
 
-class Downloader:
-    class DownloadProgressBar(tqdm):
-        def update_to(self, b=1, bsize=1, tsize=None):
-            if tsize is not None:
-                self.total = tsize
-            self.update(b * bsize - self.n)
 
+class Downloader:
     class HFModels:
-        def __init__(self, repo="therealvul/so-vits-svc-4.0", model_dir="hf_vul_models"):
-            self.model_repo = huggingface_hub.Repository(local_dir=model_dir,clone_from=repo, skip_lfs_files=True)
+        def __init__(self, repo="therealvul/so-vits-svc-4.0", model_dir="hf_vul_models", engine=None, store=None, ttl=CATALOG_TTL):
+            # the catalog is only fetched (or read from model_dir) on first use
+            self.catalog = ModelCatalog(repo, cache_dir=model_dir, ttl=ttl)
             self.repo = repo
             self.model_dir = model_dir
+            self.engine = engine or DownloadEngine()
+            self.store = store
 
-            self.model_folders = os.listdir(model_dir)
-            self.model_folders.remove('.git')
-            self.model_folders.remove('.gitattributes')
+        @property
+        def model_folders(self):
+            return self.catalog.list_models()
 
         def list_models(self):
-            return self.model_folders
+            return self.catalog.list_models()
 
-        def download_model(self, model_name, target_dir):
-            if model_name not in self.model_folders:
+        def model_jobs(self, model_name, target_dir):
+            """Download jobs for one model.
+
+            Returns (jobs, links, files): with a model store, jobs download into the
+            store and links are the (sha256, path) pairs to link once they finish.
+            """
+            model_files = self.catalog.model_files(model_name)
+            if not model_files:
                 raise Exception(f"{model_name} not found")
-            model_dir = self.model_dir
-            charpath = os.path.join(model_dir,model_name)
+            names = sorted(model_files)
 
-            gen_pt = next(x for x in os.listdir(charpath) if x.startswith("G_"))
-            cfg = next(x for x in os.listdir(charpath) if x.endswith("json"))
+            gen_pt = next(x for x in names if x.startswith("G_"))
+            cfg = next(x for x in names if x.endswith("json"))
             try:
-                clust = next(x for x in os.listdir(charpath) if x.endswith("pt"))
+                clust = next(x for x in names if x.endswith("pt"))
             except StopIteration as e:
                 print(f"Note - no cluster model for {model_name}")
                 clust = None
@@ -64,34 +80,64 @@ class Downloader:
             if not os.path.exists(target_dir):
                 os.makedirs(target_dir, exist_ok=True)
 
-            gen_dir = huggingface_hub.hf_hub_download(
-                repo_id=self.repo, filename=f"{model_name}/{gen_pt}"
-            )
-
+            jobs = []
+            links = []
+            self._add_job(jobs, links, model_name, gen_pt, target_dir, model_files[gen_pt])
             if clust is not None:
-                clust_dir = huggingface_hub.hf_hub_download(
-                    repo_id=self.repo, filename=f"{model_name}/{clust}"
-                )
-                shutil.move(os.path.realpath(clust_dir), os.path.join(target_dir, clust))
+                self._add_job(jobs, links, model_name, clust, target_dir, model_files[clust])
                 clust_out = os.path.join(target_dir, clust)
             else:
                 clust_out = None
+            self._add_job(jobs, links, model_name, cfg, target_dir, model_files[cfg])
 
-            shutil.copy(os.path.join(charpath,cfg),os.path.join(target_dir, cfg))
-            shutil.move(os.path.realpath(gen_dir), os.path.join(target_dir, gen_pt))
-
-            return {"config_path": os.path.join(target_dir,cfg),
+            return jobs, links, {"config_path": os.path.join(target_dir,cfg),
                 "generator_path": os.path.join(target_dir,gen_pt),
                 "cluster_path": clust_out}
 
-    def __init__(self):
-        self.hf_models = self.HFModels()
+        def _add_job(self, jobs, links, model_name, filename, target_dir, meta):
+            import huggingface_hub
+            url = huggingface_hub.hf_hub_url(self.repo, f"{model_name}/{filename}")
+            target = os.path.join(target_dir, filename)
+            # only LFS files (the checkpoints) come with a sha256
+            sha256 = meta.get("sha256")
+            if self.store is None or sha256 is None:
+                jobs.append(DownloadJob(url, target, sha256=sha256))
+                return
+            if not self.store.has(sha256):
+                jobs.append(DownloadJob(url, self.store.staging_path(sha256), sha256=sha256))
+            links.append((sha256, target))
+
+        def finish_links(self, links):
+            for sha256, target in links:
+                if not self.store.has(sha256):
+                    self.store.add_file(self.store.staging_path(sha256), sha256)
+                self.store.link(sha256, target)
+
+        def download_model(self, model_name, target_dir):
+            jobs, links, files = self.model_jobs(model_name, target_dir)
+            self.engine.run(jobs)
+            self.finish_links(links)
+            return files
+
+    def __init__(self, repo="therealvul/so-vits-svc-4.0", model_dir="hf_vul_models", max_workers=4, store=None):
+        self.engine = DownloadEngine(max_workers=max_workers, progress_factory=self._progress_bar)
+        self.store = store
+        self.hf_models = self.HFModels(repo, model_dir, engine=self.engine, store=store)
+
+    def _progress_bar(self, job):
+        from tqdm import tqdm
+        t = tqdm(unit='B', unit_scale=True, miniters=1, desc=job.url.split('/')[-1])
+        def update(done, total):
+            if total is not None:
+                t.total = total
+            t.update(done - t.n)
+        return update, t.close
 
     def extract(self, path):
         """Extracts a file to the same directory."""
         if path.endswith(".zip"):
             with ZipFile(path, 'r') as zipObj:
-            zipObj.extractall(os.path.split(path)[0])
+                zipObj.extractall(os.path.split(path)[0])
         elif path.endswith(".tar.bz2"):
             tar = tarfile.open(path, "r:bz2")
             tar.extractall(os.path.split(path)[0])
@@ -161,35 +207,38 @@ class Downloader:
         os.chdir(wd_old)
         return filename
 
-    def download_url(self, url, filename):
-        with self.DownloadProgressBar(unit='B', unit_scale=True, miniters=1, desc=url.split('/')[-1]) as t:
-            filename, headers = urllib.request.urlretrieve(url, filename=filename, reporthook=t.update_to)
-            print(f"Downloaded to {filename}")
+    def download_url(self, url, filename, sha256=None):
+        filename = filename or url.split('/')[-1]
+        self.engine.fetch(DownloadJob(url, filename, sha256=sha256), force=True)
+        print(f"Downloaded to {filename}")
 
     def request_url_with_progress_bar(self, url, filename):
         self.download_url(url, filename)
 
-    def download(self, urls, dataset='', filenames=None, force_dl=False, username='', password='', auth_needed=False):
+    def download(self, urls, dataset='', filenames=None, force_dl=False, username='', password='', auth_needed=False, sha256s=None):
         assert filenames is None or len(urls) == len(filenames), f"number of urls does not match filenames. Expected {len(filenames)} urls, containing the files listed below.\n{filenames}"
         assert not auth_needed or (len(username) and len(password)), f"username and password needed for {dataset} Dataset"
         if filenames is None:
             filenames = [None,]*len(urls)
-        for i, (url, filename) in enumerate(zip(urls, filenames)):
+        if sha256s is None:
+            sha256s = [None,]*len(urls)
+        jobs = []
+        for i, (url, filename, sha256) in enumerate(zip(urls, filenames, sha256s)):
             print(f"Downloading File from {url}")
-            #if filename is None:
-            #    filename = url.split("/")[-1]
-            if filename and (not force_dl) and exists(filename):
+            if filename and (not force_dl) and exists(filename) and sha256 is None:
                 print(f"{filename} Already Exists, Skipping.")
                 continue
             if 'drive.google.com' in url:
                 assert 'https://drive.google.com/uc?id=' in url, 'Google Drive links should follow the format "https://drive.google.com/uc?id=1eQAnaoDBGQZldPVk-nzgYzRbcPSmnpv6".\nWhere id=XXXXXXXXXXXXXXXXX is the Google Drive Share ID.'
+                import gdown
                 gdown.download(url, filename, quiet=False)
             elif 'mega.nz' in url:
                 self.megadown(url, filename)
             else:
-                #urllib.request.urlretrieve(url, filename=filename) # no progress bar
-                self.request_url_with_progress_bar(url, filename) # with progress bar
-
+                jobs.append(DownloadJob(url, filename or url.split('/')[-1], sha256=sha256))
+        # plain HTTP(S) files go through the engine together, in parallel
+        for path, status in self.engine.run(jobs, force=force_dl).items():
+            print(f"{path}: {status}")
 
     def get_next_model(self, model_name):
         models = self.hf_models.list_models()
@@ -205,8 +254,23 @@ class Downloader:
         return self.hf_models.download_model(model_name, target_dir)
 
     def download_models(self, model_names, target_dir):
+        """Downloads each model into target_dir/<model name>, all files in parallel."""
+        jobs = []
+        links = []
+        results = {}
         for model_name in model_names:
-            self.download_model(model_name, target_dir)
+            if model_name not in self.hf_models.list_models():
+                print(f"{model_name} not found, skipping")
+                continue
+            model_jobs, model_links, results[model_name] = self.hf_models.model_jobs(
+                model_name, os.path.join(target_dir, model_name))
+            jobs.extend(model_jobs)
+            links.extend(model_links)
+        # models sharing a checkpoint only download it once
+        unique = {job.path: job for job in jobs}
+        self.engine.run(unique.values())
+        self.hf_models.finish_links(links)
+        return results
 
     def download_all_models(self, target_dir):
         self.download_models(self.hf_models.list_models(), target_dir)
@@ -214,42 +278,103 @@ class Downloader:
     def download_contentVec(self, target_dir):
         self.download(["https://huggingface.co/therealvul/so-vits-svc-4.0-init/resolve/main/checkpoint_best_legacy_500.pt"], filenames=["hubert/checkpoint_best_legacy_500.pt"])
 
-    def download_and_extract_zip(self, model_url):
-        if "huggingface.co" in model_url.lower():
-            self.download([re.sub(r"/blob/", "/resolve/", model_url)], 
-                          filenames=[os.path.join(os.getcwd(), model_url.split("/")[-1])])
-        else:
-            self.download([model_url])
+    def extract_members(self, path, output_dir, patterns=MODEL_MEMBER_PATTERNS):
+        """Streams only the archive members whose file name matches patterns into output_dir.
 
-        os.makedirs('models', exist_ok=True)
-        model_zip_paths = glob.glob('/content/**/*.zip', recursive=True)
+        Directory structure inside the archive is dropped. Returns the written paths.
+        """
+        def wanted(name):
+            base = os.path.basename(name)
+            return not base.startswith('.') and any(fnmatch.fnmatch(base, p) for p in patterns)
 
-        for model_zip_path in model_zip_paths:
-            print("extracting zip", model_zip_path)
-            output_dir = os.path.join('/content/so-vits-svc/models', os.path.basename(os.path.splitext(model_zip_path)[0]).replace(" ", "_"))
+        def write(name, fileobj):
+            out_path = os.path.join(output_dir, os.path.basename(name))
+            with open(out_path + ".part", 'wb') as out:
+                shutil.copyfileobj(fileobj, out, 1 << 20)
+            os.replace(out_path + ".part", out_path)
+            return out_path
 
-            # clean and create output dir
+        os.makedirs(output_dir, exist_ok=True)
+        written = []
+        if path.endswith(".zip"):
+            with ZipFile(path, 'r') as zipObj:
+                for info in zipObj.infolist():
+                    if not info.is_dir() and wanted(info.filename):
+                        with zipObj.open(info) as member:
+                            written.append(write(info.filename, member))
+        elif path.endswith((".tar.bz2", ".tar.gz", ".tar")):
+            # "r|*" reads the archive as a stream, no seeking back and forth
+            with tarfile.open(path, "r|*") as tar:
+                for member in tar:
+                    if member.isfile() and wanted(member.name):
+                        written.append(write(member.name, tar.extractfile(member)))
+        elif path.endswith(".7z"):
+            import py7zr
+            # py7zr's read() holds members in memory; extract to disk and move instead
+            tmp_dir = tempfile.mkdtemp(prefix=".extract_", dir=output_dir)
+            try:
+                with py7zr.SevenZipFile(path, mode='r') as archive:
+                    names = [n for n in archive.getnames() if wanted(n)]
+                    archive.extract(path=tmp_dir, targets=names)
+                for name in names:
+                    extracted = os.path.join(tmp_dir, name)
+                    if os.path.isfile(extracted):
+                        out_path = os.path.join(output_dir, os.path.basename(name))
+                        os.replace(extracted, out_path)
+                        written.append(out_path)
+            finally:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        else:
+            raise NotImplementedError(f"{path} extension not implemented.")
+        return written
+
+    def extract_models(self, archive_paths, models_root=MODELS_ROOT, max_workers=4):
+        """Extracts each model archive into models_root/<archive name>, in parallel.
+
+        Archives with the same name (e.g. x.zip and x.7z) share an output
+        directory and are extracted one after the other.
+        """
+        groups = {}
+        for archive_path in archive_paths:
+            output_dir = os.path.join(models_root, os.path.basename(archive_stem(archive_path)).replace(" ", "_"))
+            groups.setdefault(output_dir, []).append(archive_path)
+
+        def extract_group(item):
+            output_dir, paths = item
+            # clean output dir
             if os.path.exists(output_dir):
                 shutil.rmtree(output_dir)
-            os.mkdir(output_dir)
-            input_base = os.path.dirname(model_zip_path)
-
-            # clean input dir (if user stopped an earlier extract and we have dirty files)
-            ckpts_pre = glob.glob(os.path.join(input_base, '**/*.pth'), recursive=True)
-            jsons_pre = glob.glob(os.path.join(input_base, '**/config.json'), recursive=True)
-            for cpkt in ckpts_pre:
-                os.remove(cpkt)
-            for json in jsons_pre:
-                os.remove(json)
-
-            # do the extract
-            self.extract(model_zip_path)
-            ckpts = glob.glob(os.path.join(input_base, '**/*.pth'), recursive=True)
-            jsons = glob.glob(os.path.join(input_base, '**/config.json'), recursive=True)
-            for ckpt in ckpts:
-                shutil.move(ckpt, os.path.join(output_dir, os.path.basename(ckpt)))
-            for json in jsons:
-                shutil.move(json, os.path.join(output_dir, os.path.basename(json)))
+            written = []
+            for archive_path in paths:
+                print("extracting", archive_path)
+                written += self.extract_members(archive_path, output_dir)
+            return output_dir, written
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(groups)))) as pool:
+            return dict(pool.map(extract_group, groups.items()))
+
+    def download_archives(self, model_url, dl_dir=None):
+        """Downloads model_url into dl_dir and returns the archive paths it produced."""
+        dl_dir = os.path.abspath(dl_dir or os.getcwd())
+        if "huggingface.co" in model_url.lower():
+            model_url = re.sub(r"/blob/", "/resolve/", model_url)
+        if 'mega.nz' not in model_url and 'drive.google.com' not in model_url:
+            path = os.path.join(dl_dir, model_url.split("/")[-1])
+            self.download([model_url], filenames=[path])
+            return [path]
+
+        # MEGA and Drive pick their own file names; look for what appeared
+        before = set(os.listdir(dl_dir))
+        if 'mega.nz' in model_url:
+            self.megadown(model_url, dl_dir)
+        else:
+            import gdown
+            gdown.download(model_url, dl_dir + os.sep, quiet=False)
+        return [os.path.join(dl_dir, f) for f in sorted(set(os.listdir(dl_dir)) - before)
+                if f.endswith(ARCHIVE_EXTENSIONS)]
+
+    def download_and_extract_zip(self, model_url, models_root=MODELS_ROOT):
+        return self.extract_models(self.download_archives(model_url), models_root)
 
 
 if __name__ == "__main__":
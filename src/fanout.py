@@ -0,0 +1,120 @@
+"""
+    Render one input in several voices, preprocessing it only once.
+
+    The input is decoded and sliced once, and the speaker-independent
+    features (content vectors, f0, uv) of every voiced segment are extracted
+    once into a MemoryFeatureCache. Each target then only runs its own
+    transpose, cluster mixing and generator. Targets run in threads, as many
+    at a time as the model pool holds (its capacity and memory budget);
+    every output is written as soon as its target finishes.
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src import conversion
+from src.feature_cache import MemoryFeatureCache
+from src.profiling import NULL_PROFILER
+
+
+def parse_target(text):
+    """'Drake' or 'Drake:-2' -> (name, transpose)."""
+    name, sep, tran = text.rpartition(":")
+    if sep and tran.lstrip("+-").isdigit():
+        return name, int(tran)
+    return text, None
+
+
+def fanout_workers(pool, n_targets, model_bytes=0):
+    workers = min(n_targets, pool.capacity)
+    if pool.max_bytes is not None and model_bytes:
+        workers = min(workers, max(1, pool.max_bytes // model_bytes))
+    return max(1, workers)
+
+
+def precompute_features(svc_model, audio_data, sr, feature_cache, profiler=NULL_PROFILER):
+    """Extract the features of every voiced chunk into feature_cache."""
+    for slice_tag, data in audio_data:
+        if slice_tag:
+            continue
+        with profiler.stage("pad"):
+            data = conversion.pad_segment(data, sr)
+        with profiler.stage("features"):
+            key = feature_cache.key(data, sr, svc_model)
+            if feature_cache.get(key) is None:
+                feature_cache.put(key, *conversion.extract_features(svc_model, data, sr))
+
+
+def fan_out(audio, sr, targets, pool, write, slice_db=-40, tran=0,
+            cluster_infer_ratio=0.0, feature_cache=None, workers=None,
+            profiler=None, **kwargs):
+    """Convert a mono array for every target speaker.
+
+    targets are speaker dicts, optionally with a "tran" key overriding tran.
+    write(speaker, audio, target_sample) is called from the worker thread
+    that finished the target. Other keyword arguments go to
+    conversion.convert_chunks. Returns one result dict per target.
+    """
+    profiler = profiler or NULL_PROFILER
+    with profiler.stage("slice"):
+        audio_data = conversion.slice_audio(conversion.as_float32(audio), sr, db_thresh=slice_db)
+    shared = MemoryFeatureCache(backing=feature_cache)
+
+    first = pool.get_speaker(targets[0])
+    precompute_features(first, audio_data, sr, shared, profiler)
+    if workers is None:
+        workers = fanout_workers(pool, len(targets), pool.size_of(first) if pool.size_of else 0)
+
+    def render(speaker):
+        start = time.perf_counter()
+        result = {"speaker": speaker["name"], "tran": speaker.get("tran", tran)}
+        try:
+            svc_model = pool.get_speaker(speaker)
+            ratio = cluster_infer_ratio if speaker["cluster_path"] else 0.0
+            with conversion.convert_chunks(svc_model, speaker["name"], audio_data, sr,
+                                           tran=result["tran"], cluster_infer_ratio=ratio,
+                                           feature_cache=shared, profiler=profiler,
+                                           **kwargs) as out:
+                with profiler.stage("write"):
+                    write(speaker, out.audio, svc_model.target_sample)
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+        result["seconds"] = time.perf_counter() - start
+        return result
+
+    if workers <= 1:
+        results = [render(speaker) for speaker in targets]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(render, targets))
+    print(f"Fan-out: {len(targets)} voices, {workers} at a time, shared features {shared.stats()}")
+    return results
+
+
+def fan_out_file(in_path, targets, output_dir, pool, out_format="wav", profiler=None, **kwargs):
+    """Decode in_path once and write one output per target into output_dir."""
+    import librosa
+    import soundfile
+    from src.batch_convert import output_path
+
+    profiler = profiler or NULL_PROFILER
+    os.makedirs(output_dir, exist_ok=True)
+    tran = kwargs.get("tran", 0)
+    outputs = {}
+
+    def write(speaker, audio, target_sample):
+        path = output_path(in_path, output_dir, speaker["name"], speaker.get("tran", tran), out_format)
+        soundfile.write(path, audio, target_sample)
+        outputs[speaker["name"], speaker.get("tran", tran)] = path
+
+    with profiler.file(in_path) as record:
+        with profiler.stage("decode"):
+            audio, sr = librosa.load(in_path, sr=None, mono=True)
+        record["audio_seconds"] = len(audio) / sr
+        results = fan_out(audio, sr, targets, pool, write, profiler=profiler, **kwargs)
+    for result in results:
+        result["input"] = in_path
+        result["audio_seconds"] = len(audio) / sr
+        result["output"] = outputs.get((result["speaker"], result["tran"]))
+    return results
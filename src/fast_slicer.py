@@ -0,0 +1,127 @@
+"""
+    Vectorized silence slicer for in-memory audio.
+
+    Produces the same chunk boundaries as so-vits-svc's inference.slicer.Slicer
+    (with librosa's zero-padded, centred RMS), but computes the RMS envelope
+    in one NumPy pass over a cumulative sum of squares and only loops in
+    Python over runs of silent frames, not over every frame. Boundaries are
+    returned as index arrays; chunks are views into the input array.
+"""
+
+import numpy as np
+
+
+class FastSlicer:
+    def __init__(self, sr, threshold=-40., min_length=5000, min_interval=300,
+                 hop_size=20, max_sil_kept=5000):
+        if not min_length >= min_interval >= hop_size:
+            raise ValueError('The following condition must be satisfied: min_length >= min_interval >= hop_size')
+        if not max_sil_kept >= hop_size:
+            raise ValueError('The following condition must be satisfied: max_sil_kept >= hop_size')
+        min_interval = sr * min_interval / 1000
+        self.threshold = 10 ** (threshold / 20.)
+        self.hop_size = round(sr * hop_size / 1000)
+        self.win_size = min(round(min_interval), 4 * self.hop_size)
+        self.min_length = round(sr * min_length / 1000 / self.hop_size)
+        self.min_interval = round(min_interval / self.hop_size)
+        self.max_sil_kept = round(sr * max_sil_kept / 1000 / self.hop_size)
+
+    def rms(self, samples):
+        """Centred, zero-padded frame RMS (librosa.feature.rms with pad_mode="constant")."""
+        pad = self.win_size // 2
+        n_frames = 1 + (len(samples) + 2 * pad - self.win_size) // self.hop_size
+        squares = np.zeros(len(samples) + 2 * pad + 1)
+        np.cumsum(np.square(samples, dtype=np.float64), out=squares[pad + 1:pad + 1 + len(samples)])
+        squares[pad + 1 + len(samples):] = squares[pad + len(samples)]
+        starts = np.arange(n_frames) * self.hop_size
+        power = (squares[starts + self.win_size] - squares[starts]) / self.win_size
+        return np.sqrt(np.maximum(power, 0.0))
+
+    def silence_tags(self, rms_list):
+        """(start_frame, end_frame) silence ranges to cut, as in Slicer.slice."""
+        silent = rms_list < self.threshold
+        edges = np.diff(silent.astype(np.int8), prepend=0, append=0)
+        run_starts = np.flatnonzero(edges == 1)
+        run_ends = np.flatnonzero(edges == -1)  # first loud frame after each run
+        total_frames = len(rms_list)
+        max_sil_kept = self.max_sil_kept
+
+        sil_tags = []
+        clip_start = 0
+        for silence_start, i in zip(run_starts.tolist(), run_ends.tolist()):
+            if i == total_frames:
+                # trailing silence
+                if total_frames - silence_start >= self.min_interval:
+                    silence_end = min(total_frames, silence_start + max_sil_kept)
+                    pos = rms_list[silence_start: silence_end + 1].argmin() + silence_start
+                    sil_tags.append((pos, total_frames + 1))
+                break
+            is_leading_silence = silence_start == 0 and i > max_sil_kept
+            need_slice_middle = i - silence_start >= self.min_interval and i - clip_start >= self.min_length
+            if not is_leading_silence and not need_slice_middle:
+                continue
+            if i - silence_start <= max_sil_kept:
+                pos = rms_list[silence_start: i + 1].argmin() + silence_start
+                if silence_start == 0:
+                    sil_tags.append((0, pos))
+                else:
+                    sil_tags.append((pos, pos))
+                clip_start = pos
+            elif i - silence_start <= max_sil_kept * 2:
+                pos = rms_list[i - max_sil_kept: silence_start + max_sil_kept + 1].argmin()
+                pos += i - max_sil_kept
+                pos_l = rms_list[silence_start: silence_start + max_sil_kept + 1].argmin() + silence_start
+                pos_r = rms_list[i - max_sil_kept: i + 1].argmin() + i - max_sil_kept
+                if silence_start == 0:
+                    sil_tags.append((0, pos_r))
+                    clip_start = pos_r
+                else:
+                    sil_tags.append((min(pos_l, pos), max(pos_r, pos)))
+                    clip_start = max(pos_r, pos)
+            else:
+                pos_l = rms_list[silence_start: silence_start + max_sil_kept + 1].argmin() + silence_start
+                pos_r = rms_list[i - max_sil_kept: i + 1].argmin() + i - max_sil_kept
+                if silence_start == 0:
+                    sil_tags.append((0, pos_r))
+                else:
+                    sil_tags.append((pos_l, pos_r))
+                clip_start = pos_r
+        return sil_tags
+
+    def bounds(self, samples):
+        """Chunk boundaries as (starts, ends, silent) arrays in samples."""
+        n = len(samples)
+        if n <= self.min_length:
+            return np.array([0]), np.array([n]), np.array([False])
+        sil_tags = self.silence_tags(self.rms(samples))
+        if not sil_tags:
+            return np.array([0]), np.array([n]), np.array([False])
+
+        tags = np.asarray(sil_tags, dtype=np.int64) * self.hop_size
+        sil_start = np.minimum(tags[:, 0], n)
+        sil_end = np.minimum(tags[:, 1], n)
+        # silence i, then the voiced chunk up to silence i + 1, interleaved
+        starts = tags.ravel()[:-1]
+        ends = np.column_stack([sil_end, np.append(sil_start[1:], 0)]).ravel()[:-1]
+        silent = np.tile([True, False], len(tags))[:-1]
+        if sil_tags[0][0]:
+            starts = np.concatenate([[0], starts])
+            ends = np.concatenate([sil_start[:1], ends])
+            silent = np.concatenate([[False], silent])
+        if tags[-1, 1] < n:
+            starts = np.append(starts, tags[-1, 1])
+            ends = np.append(ends, n)
+            silent = np.append(silent, False)
+        return starts, ends, silent
+
+
+def slice_bounds(audio, sr, db_thresh=-40, min_len=5000):
+    return FastSlicer(sr=sr, threshold=db_thresh, min_length=min_len).bounds(audio)
+
+
+def chunks(audio, bounds):
+    """(slice_tag, view) pairs like slicer.chunks2audio, skipping empty chunks."""
+    starts, ends, silent = bounds
+    return [(bool(tag), audio[start:end])
+            for start, end, tag in zip(starts.tolist(), ends.tolist(), silent.tolist())
+            if start != end]
@@ -0,0 +1,100 @@
+"""
+    On-disk cache of per-segment content features and f0.
+
+    Content features (ContentVec/HuBERT) and the f0 track of a segment only
+    depend on its samples, so they are cached before transpose and cluster
+    mixing are applied. Entries are .npz files named after a hash of the
+    segment samples, sample rate, feature model and the feature model's
+    precision (int8 when quantized); the least recently used ones are
+    deleted once the cache grows past max_bytes (src.file_cache).
+"""
+
+import hashlib
+import threading
+import numpy as np
+
+from src.file_cache import FileCache
+
+CACHE_DIR = "feature_cache"
+FEATURE_MODEL = "checkpoint_best_legacy_500"
+
+
+class FeatureCache(FileCache):
+    suffix = ".npz"
+
+    def __init__(self, root=CACHE_DIR, max_bytes=2 * 2**30, feature_model=FEATURE_MODEL):
+        super().__init__(root, max_bytes)
+        self.feature_model = feature_model
+
+    def key(self, data, sr, svc_model):
+        h = hashlib.blake2b(digest_size=20)
+        h.update(np.ascontiguousarray(data, dtype=np.float32).tobytes())
+        h.update(f"{sr}:{svc_model.target_sample}:{svc_model.hop_size}:{self.feature_model}".encode())
+        # set by src.cpu_inference when the content encoder is quantized
+        precision = getattr(svc_model, "content_precision", "fp32")
+        if precision != "fp32":
+            h.update(f":{precision}".encode())
+        return h.hexdigest()
+
+    def get(self, key):
+        """(c, f0, uv) numpy arrays, or None on a miss."""
+        try:
+            with np.load(self.path(key)) as f:
+                features = f["c"], f["f0"], f["uv"]
+        except (OSError, KeyError, ValueError):
+            self.miss(key)
+            return None
+        self.touch(key)
+        return features
+
+    def put(self, key, c, f0, uv):
+        tmp_path = self.tmp_path(key)
+        with open(tmp_path, "wb") as f:
+            np.savez(f, c=c, f0=f0, uv=uv)
+        self.add(key, tmp_path)
+
+
+class MemoryFeatureCache:
+    """In-memory FeatureCache for one job, e.g. one input rendered in several voices.
+
+    Keys are the same as FeatureCache's, so models that disagree on sample
+    rate or hop size do not share entries. With a backing FeatureCache,
+    misses fall through to disk and new entries are written there too.
+    """
+
+    def __init__(self, backing=None, feature_model=FEATURE_MODEL):
+        self.backing = backing
+        self.feature_model = backing.feature_model if backing is not None else feature_model
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    key = FeatureCache.key
+
+    def get(self, key):
+        with self._lock:
+            features = self._entries.get(key)
+            if features is not None:
+                self.hits += 1
+                return features
+            self.misses += 1
+        if self.backing is not None:
+            features = self.backing.get(key)
+            if features is not None:
+                with self._lock:
+                    self._entries[key] = features
+        return features
+
+    def put(self, key, c, f0, uv):
+        with self._lock:
+            self._entries[key] = (c, f0, uv)
+        if self.backing is not None:
+            self.backing.put(key, c, f0, uv)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
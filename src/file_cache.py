@@ -0,0 +1,122 @@
+"""
+    A directory of cache files with a size limit, shared by the feature and
+    audio caches.
+
+    Entries are files named <key><suffix>. Each file's mtime records when it
+    was last used, so the order survives restarts. Once the directory grows
+    past max_bytes, the least recently used files are deleted. New entries
+    are written to a temp name unique to the process and thread and then
+    renamed into place, so concurrent writers and readers never see a
+    partial file. Entries pinned by a reader (touch/add with pin=True,
+    until unpin) are never evicted, even past max_bytes.
+"""
+
+import os
+import threading
+import time
+
+
+class FileCache:
+    suffix = ""
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self._entries = {}  # key -> (last use, bytes)
+        self._pins = {}  # key -> readers still using the file
+        for entry in os.scandir(root):
+            if entry.name.endswith(self.suffix):
+                st = entry.stat()
+                self._entries[entry.name[:len(entry.name) - len(self.suffix)]] = (st.st_mtime, st.st_size)
+
+    def __getstate__(self):
+        # picklable for worker processes; each process keeps its own view
+        state = self.__dict__.copy()
+        del state["_lock"]
+        state["_pins"] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def path(self, key):
+        return os.path.join(self.root, key + self.suffix)
+
+    def tmp_path(self, key):
+        return f"{self.path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    def touch(self, key, pin=False):
+        """Count a hit and mark key as just used; False (a miss) if its file is gone."""
+        path = self.path(key)
+        # under the lock, so an eviction cannot slip in between the check and the pin
+        with self._lock:
+            try:
+                os.utime(path)
+                size = os.path.getsize(path)
+            except OSError:
+                self.misses += 1
+                self._entries.pop(key, None)
+                return False
+            self.hits += 1
+            self._entries[key] = (time.time(), size)
+            if pin:
+                self._pins[key] = self._pins.get(key, 0) + 1
+        return True
+
+    def miss(self, key):
+        with self._lock:
+            self.misses += 1
+            self._entries.pop(key, None)
+
+    def add(self, key, tmp_path, pin=False):
+        """Move a finished tmp_path(key) into place; returns the entry's path."""
+        path = self.path(key)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._entries[key] = (time.time(), os.path.getsize(path))
+            if pin:
+                self._pins[key] = self._pins.get(key, 0) + 1
+            self._evict(keep=key)
+        return path
+
+    def unpin(self, key):
+        with self._lock:
+            count = self._pins.pop(key, 0) - 1
+            if count > 0:
+                self._pins[key] = count
+
+    def _evict(self, keep=None):
+        total = sum(size for _, size in self._entries.values())
+        for key, (_, size) in sorted(self._entries.items(), key=lambda x: x[1][0]):
+            if total <= self.max_bytes:
+                break
+            if key == keep or key in self._pins:
+                continue
+            try:
+                os.remove(self.path(key))
+            except OSError:
+                pass
+            del self._entries[key]
+            total -= size
+
+    def size_bytes(self):
+        with self._lock:
+            return sum(size for _, size in self._entries.values())
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                try:
+                    os.remove(self.path(key))
+                except OSError:
+                    pass
+            self._entries.clear()
+
+    def stats(self):
+        return {"entries": len(self._entries), "bytes": self.size_bytes(),
+                "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,194 @@
+"""
+    Incremental discovery of input audio files.
+
+    InputScanner walks the configured input directories once and then only
+    relists directories whose mtime changed (a file was added, removed or
+    renamed in them), keeping the result as a set. With inotify_simple
+    installed it can also be told to wait for filesystem events instead of
+    stat-ing the directories.
+
+    ConversionRecord remembers which inputs were converted with which
+    parameters, keyed by the input's size and mtime, so unchanged files are
+    skipped on re-runs and earlier outputs are not mistaken for new inputs.
+    It is written every save_every conversions; call flush() when done.
+"""
+
+import hashlib
+import json
+import os
+
+from src.batch_convert import is_audio
+
+INPUT_DIRS = ["/content"]
+EXCLUDE_DIRS = {"so-vits-svc", "models", "hf_vul_models", "model_store", "feature_cache",
+                "audio_cache", "sample_data"}
+# the mounted Google Drive; scanned unless added to the excluded names
+DRIVE_DIR = "drive"
+RECORD_FILENAME = ".conversions.json"
+SAVE_EVERY = 50
+
+
+class InputScanner:
+    def __init__(self, input_dirs=INPUT_DIRS, exclude=EXCLUDE_DIRS, watch=False):
+        self.input_dirs = [os.path.abspath(d) for d in input_dirs]
+        self.exclude = set(exclude)
+        self.dirs = {}  # directory -> (mtime_ns, audio files, subdirectories)
+        self.files = set()
+        self._inotify = None
+        self._wds = {}
+        if watch:
+            self._start_watch()
+
+    def _start_watch(self):
+        try:
+            from inotify_simple import INotify, flags
+        except ImportError:
+            print("inotify_simple not installed; scanning by mtime")
+            return
+        self._inotify = INotify()
+        self._flags = (flags.CREATE | flags.DELETE | flags.MOVED_FROM | flags.MOVED_TO
+                       | flags.CLOSE_WRITE | flags.DELETE_SELF)
+
+    def _excluded(self, name):
+        return name.startswith(".") or name in self.exclude
+
+    def _list(self, path):
+        files = set()
+        subdirs = set()
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not self._excluded(entry.name):
+                            subdirs.add(entry.path)
+                    elif is_audio(entry.name) and entry.is_file():
+                        files.add(entry.path)
+        except OSError:
+            return None
+        return files, subdirs
+
+    def _forget(self, path):
+        entry = self.dirs.pop(path, None)
+        if entry is None:
+            return
+        self.files -= entry[1]
+        for sub in entry[2]:
+            self._forget(sub)
+
+    def _scan_dir(self, path, force=False):
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            self._forget(path)
+            return
+        entry = self.dirs.get(path)
+        if entry is not None and entry[0] == mtime and not force:
+            subdirs = entry[2]
+        else:
+            listing = self._list(path)
+            if listing is None:
+                self._forget(path)
+                return
+            files, subdirs = listing
+            if entry is not None:
+                self.files -= entry[1] - files
+                for gone in entry[2] - subdirs:
+                    self._forget(gone)
+            self.files |= files
+            self.dirs[path] = (mtime, files, subdirs)
+            if self._inotify is not None and entry is None:
+                self._wds[self._inotify.add_watch(path, self._flags)] = path
+        for sub in subdirs:
+            # watched directories report their own changes
+            if self._inotify is None or sub not in self.dirs:
+                self._scan_dir(sub)
+
+    def scan(self):
+        """Current set of input audio files (absolute paths)."""
+        if self._inotify is not None and self.dirs:
+            # only directories with events since the last scan are relisted
+            for event in self._inotify.read(timeout=0):
+                path = self._wds.get(event.wd)
+                if path is not None:
+                    self._scan_dir(path, force=True)
+        else:
+            for path in self.input_dirs:
+                self._scan_dir(path)
+        return set(self.files)
+
+    def wait(self, timeout=None):
+        """Block until something changes (inotify) and return the new scan."""
+        if self._inotify is not None:
+            self._inotify.read(timeout=None if timeout is None else int(timeout * 1000), read_delay=100)
+        return self.scan()
+
+
+def params_key(speaker, params):
+    """Stable hash of everything that changes a conversion's output."""
+    relevant = {k: v for k, v in params.items()
+                if isinstance(v, (str, int, float, bool, type(None)))}
+    blob = json.dumps([speaker.get("model_path"), speaker.get("name"), relevant], sort_keys=True)
+    return hashlib.sha1(blob.encode()).hexdigest()[:16]
+
+
+class ConversionRecord:
+    def __init__(self, path=RECORD_FILENAME, save_every=SAVE_EVERY):
+        self.path = path
+        self.save_every = save_every
+        self._unsaved = 0
+        try:
+            with open(path) as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}  # input -> {"mtime_ns", "size", "runs": {params_key: output}}
+
+    def _stamp(self, in_path):
+        st = os.stat(in_path)
+        return st.st_mtime_ns, st.st_size
+
+    def is_done(self, in_path, speaker, params):
+        entry = self.entries.get(in_path)
+        if entry is None:
+            return False
+        try:
+            if self._stamp(in_path) != (entry["mtime_ns"], entry["size"]):
+                return False
+        except OSError:
+            return False
+        output = entry["runs"].get(params_key(speaker, params))
+        return output is not None and os.path.exists(output)
+
+    def mark_done(self, in_path, speaker, params, out_path, derived=(), save=True):
+        """Record a conversion; derived files (e.g. a re-encoded WAV) are never inputs."""
+        mtime_ns, size = self._stamp(in_path)
+        entry = self.entries.get(in_path)
+        if entry is None or (entry["mtime_ns"], entry["size"]) != (mtime_ns, size):
+            entry = self.entries[in_path] = {"mtime_ns": mtime_ns, "size": size, "runs": {}}
+        entry["runs"][params_key(speaker, params)] = out_path
+        entry["derived"] = sorted(set(entry.get("derived", [])) | set(derived))
+        self._unsaved += 1
+        if save and self._unsaved >= self.save_every:
+            self.save()
+
+    def outputs(self):
+        return {out for entry in self.entries.values()
+                for out in list(entry["runs"].values()) + entry.get("derived", [])}
+
+    def pending(self, inputs, speaker, params):
+        """Inputs that are neither earlier outputs nor converted with these parameters."""
+        outputs = self.outputs()
+        return sorted(f for f in inputs
+                      if f not in outputs and not self.is_done(f, speaker, params))
+
+    def flush(self):
+        """Write conversions recorded since the last save."""
+        if self._unsaved:
+            self.save()
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
+        self._unsaved = 0
@@ -0,0 +1,430 @@
+"""
+    Local asyncio HTTP service that queues and schedules conversion jobs.
+
+    Every worker is a single process with its own model pool. When a worker
+    becomes idle it takes the oldest queued job for a speaker it already has
+    loaded (preferring the speaker with the most queued jobs), so jobs for
+    the same speaker run back to back instead of thrashing models; a job that
+    has waited longer than max_wait is taken first regardless. Finished jobs
+    and their outputs are dropped after result_ttl seconds, or once more than
+    max_finished of them are kept.
+
+    HTTP API (JSON):
+        POST /jobs              {"speaker", "input" (path) or "audio" (base64),
+                                 "params": {...}, "format": "wav"}
+        GET  /jobs/<id>         job status
+        GET  /jobs/<id>/events  progress as chunked JSON lines until the job ends
+        GET  /jobs/<id>/result  converted audio
+        GET  /metrics           queue depth, latency percentiles, per-speaker throughput
+"""
+
+import asyncio
+import base64
+import itertools
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from src.batch_convert import AUDIO_EXTENSIONS
+from src.output_writer import OUTPUT_FORMATS
+
+MAX_WAIT = 30.0
+WORKER_MODELS = 2  # default_pool() capacity inside each worker
+RESULT_TTL = 3600.0
+MAX_FINISHED = 1000
+
+_server_worker = {}
+
+
+def init_server_worker(svc_root, progress_queue, cpu_profile=None):
+    if svc_root:
+        from src.batch_convert import use_svc_root
+        use_svc_root(svc_root)
+    if cpu_profile is not None:
+        from src.model_pool import default_pool
+        cpu_profile.apply_threads()
+        default_pool(capacity=WORKER_MODELS, loader=cpu_profile.load)
+    _server_worker["progress"] = progress_queue
+
+
+def convert_job(speaker, in_path, out_path, params, progress):
+    """Default job runner: the regular conversion pipeline with the worker's model pool."""
+    from src import conversion
+    from src.model_pool import default_pool
+
+    svc_model = default_pool(capacity=WORKER_MODELS).get_speaker(speaker)
+    if not speaker["cluster_path"]:
+        params = dict(params, cluster_infer_ratio=0.0)
+    return conversion.convert_file(svc_model, speaker["name"], in_path, out_path,
+                                   progress=progress, **params)
+
+
+def run_job(runner, job_id, speaker, in_path, out_path, params):
+    queue = _server_worker["progress"]
+
+    def progress(done, total):
+        queue.put((job_id, done, total))
+
+    start = time.perf_counter()
+    audio_seconds = runner(speaker, in_path, out_path, params, progress)
+    return {"audio_seconds": audio_seconds, "seconds": time.perf_counter() - start,
+            "pid": os.getpid()}
+
+
+def percentiles(values, points=(50, 90, 99)):
+    if not values:
+        return {f"p{p}": None for p in points}
+    ordered = sorted(values)
+    return {f"p{p}": ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] for p in points}
+
+
+class Job:
+    def __init__(self, job_id, speaker, in_path, out_path, params, temp_input=False):
+        self.id = job_id
+        self.speaker = speaker
+        self.in_path = in_path
+        self.out_path = out_path
+        self.params = params
+        self.temp_input = temp_input  # in_path is an upload to delete once the job ends
+        self.status = "queued"
+        self.progress = (0, 0)
+        self.error = None
+        self.worker = None
+        self.result = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.events = []
+        self._changed = None
+
+    def changed(self):
+        """Event set by the next emit(); only call it on the server's loop."""
+        if self._changed is None:
+            # created here rather than in __init__: jobs can be submitted
+            # before the loop runs, and before 3.10 an Event binds to a loop
+            self._changed = asyncio.Event()
+        return self._changed
+
+    def emit(self, **event):
+        event.update(job=self.id, status=self.status, time=time.time())
+        self.events.append(event)
+        if self._changed is not None:
+            self._changed.set()
+            self._changed = None
+
+    def to_dict(self):
+        return {"id": self.id, "speaker": self.speaker["name"], "status": self.status,
+                "progress": list(self.progress), "error": self.error, "worker": self.worker,
+                "submitted": self.submitted, "started": self.started, "finished": self.finished,
+                "result": self.result}
+
+
+class Worker:
+    def __init__(self, index, executor, capacity=WORKER_MODELS):
+        self.index = index
+        self.executor = executor
+        self.capacity = capacity
+        self.busy = False
+        self.loaded = OrderedDict()  # mirrors the LRU model pool inside the process
+
+    def touch(self, speaker_name):
+        self.loaded[speaker_name] = True
+        self.loaded.move_to_end(speaker_name)
+        while len(self.loaded) > self.capacity:
+            self.loaded.popitem(last=False)
+
+
+class JobScheduler:
+    def __init__(self, speakers, workers=1, runner=convert_job, svc_root=None,
+                 output_dir=None, max_wait=MAX_WAIT, history=1000, cpu_profile=None,
+                 result_ttl=RESULT_TTL, max_finished=MAX_FINISHED):
+        self.speakers = speakers  # name -> speaker dict (e.g. a SpeakerIndex)
+        self.runner = runner
+        self.svc_root = svc_root
+        self.cpu_profile = cpu_profile
+        self.output_dir = output_dir or tempfile.mkdtemp(prefix="drake_jobs_")
+        self.max_wait = max_wait
+        self.result_ttl = result_ttl
+        self.max_finished = max_finished
+        self.n_workers = workers
+        self.jobs = {}
+        self.pending = OrderedDict()
+        self.finished = OrderedDict()  # job id -> job, in the order they ended
+        self._running = set()  # executor futures, cancelled by stop()
+        self.workers = []
+        self._ids = itertools.count(1)
+        self._wakeup = None
+        self._latency = deque(maxlen=history)
+        self._wait = deque(maxlen=history)
+        self.per_speaker = {}
+        self.completed = 0
+        self.failed = 0
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        if self.pending:
+            self._wakeup.set()
+        ctx = multiprocessing.get_context("spawn")
+        self._progress_queue = ctx.Queue()
+        for i in range(self.n_workers):
+            executor = ProcessPoolExecutor(max_workers=1, mp_context=ctx,
+                                           initializer=init_server_worker,
+                                           initargs=(self.svc_root, self._progress_queue,
+                                                     self.cpu_profile))
+            self.workers.append(Worker(i, executor))
+        threading.Thread(target=self._pump_progress, daemon=True).start()
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def stop(self):
+        self._dispatcher.cancel()
+        self._progress_queue.put(None)
+        for future in list(self._running):
+            future.cancel()
+        for worker in self.workers:
+            worker.executor.shutdown(wait=False)
+
+    def _pump_progress(self):
+        while True:
+            message = self._progress_queue.get()
+            if message is None:
+                return
+            self.loop.call_soon_threadsafe(self._on_progress, *message)
+
+    def _on_progress(self, job_id, done, total):
+        job = self.jobs.get(job_id)
+        if job is not None and job.status == "running":
+            job.progress = (done, total)
+            job.emit(done=done, total=total)
+
+    def submit(self, speaker_name, in_path, params=None, fmt="wav", temp_input=False):
+        if speaker_name not in self.speakers:
+            raise KeyError(f"Unknown speaker {speaker_name}")
+        if fmt not in OUTPUT_FORMATS:
+            raise ValueError(f"Unsupported output format {fmt!r} (use {', '.join(OUTPUT_FORMATS)})")
+        self._prune()
+        job_id = str(next(self._ids))
+        out_path = os.path.join(self.output_dir, f"{job_id}.{fmt}")
+        job = Job(job_id, self.speakers.get(speaker_name), in_path, out_path, params or {},
+                  temp_input=temp_input)
+        self.jobs[job_id] = job
+        self.pending[job_id] = job
+        job.emit()
+        if self._wakeup is not None:  # jobs submitted before start() run once it is called
+            self._wakeup.set()
+        return job
+
+    def next_job(self, worker):
+        if not self.pending:
+            return None
+        oldest = next(iter(self.pending.values()))
+        if time.time() - oldest.submitted > self.max_wait:
+            return oldest
+        counts = {}
+        for job in self.pending.values():
+            name = job.speaker["name"]
+            if name in worker.loaded:
+                counts[name] = counts.get(name, 0) + 1
+        if counts:
+            name = max(counts, key=counts.get)
+            return next(j for j in self.pending.values() if j.speaker["name"] == name)
+        # nothing loaded here: leave jobs of speakers loaded elsewhere to those workers
+        loaded_elsewhere = {n for w in self.workers if w is not worker for n in w.loaded}
+        for job in self.pending.values():
+            if job.speaker["name"] not in loaded_elsewhere:
+                return job
+        return oldest
+
+    async def _dispatch(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            for worker in self.workers:
+                if worker.busy:
+                    continue
+                job = self.next_job(worker)
+                if job is None:
+                    break
+                del self.pending[job.id]
+                worker.busy = True
+                asyncio.create_task(self._run(worker, job))
+
+    async def _run(self, worker, job):
+        job.status = "running"
+        job.worker = worker.index
+        job.started = time.time()
+        job.emit(worker=worker.index)
+        future = worker.executor.submit(run_job, self.runner, job.id, job.speaker,
+                                        job.in_path, job.out_path, job.params)
+        self._running.add(future)
+        try:
+            job.result = await asyncio.wrap_future(future)
+            job.status = "done"
+            self.completed += 1
+            stats = self.per_speaker.setdefault(job.speaker["name"], {"jobs": 0, "audio_seconds": 0.0, "busy_seconds": 0.0})
+            stats["jobs"] += 1
+            stats["audio_seconds"] += job.result["audio_seconds"] or 0.0
+            stats["busy_seconds"] += job.result["seconds"]
+        except Exception as e:
+            job.status = "failed"
+            job.error = f"{type(e).__name__}: {e}"
+            self.failed += 1
+        finally:
+            self._running.discard(future)
+        if job.temp_input:
+            try:
+                os.remove(job.in_path)
+            except OSError:
+                pass
+        job.finished = time.time()
+        worker.touch(job.speaker["name"])
+        worker.busy = False
+        self._wait.append(job.started - job.submitted)
+        self._latency.append(job.finished - job.submitted)
+        job.emit(error=job.error)
+        self.finished[job.id] = job
+        self._prune()
+        self._wakeup.set()
+
+    def _prune(self):
+        """Forget finished jobs past result_ttl or max_finished, deleting their outputs."""
+        now = time.time()
+        while self.finished:
+            job = next(iter(self.finished.values()))
+            if len(self.finished) <= self.max_finished and now - job.finished <= self.result_ttl:
+                break
+            del self.finished[job.id]
+            del self.jobs[job.id]
+            try:
+                os.remove(job.out_path)
+            except OSError:
+                pass
+
+    def metrics(self):
+        per_speaker = {name: dict(stats, x_realtime=stats["audio_seconds"] / stats["busy_seconds"]
+                                  if stats["busy_seconds"] else 0.0)
+                       for name, stats in self.per_speaker.items()}
+        return {"queue_depth": len(self.pending),
+                "running": sum(w.busy for w in self.workers),
+                "workers": [{"index": w.index, "busy": w.busy, "loaded": list(w.loaded)}
+                            for w in self.workers],
+                "completed": self.completed,
+                "failed": self.failed,
+                "latency": percentiles(self._latency),
+                "queue_wait": percentiles(self._wait),
+                "per_speaker": per_speaker}
+
+
+class JobServer:
+    def __init__(self, scheduler, host="127.0.0.1", port=8765):
+        self.scheduler = scheduler
+        self.host = host
+        self.port = port
+
+    async def serve_forever(self):
+        await self.scheduler.start()
+        server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = server.sockets[0].getsockname()[1]
+        print(f"Job server listening on http://{self.host}:{self.port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.scheduler.stop()
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode("latin-1").strip()
+            if not request_line:
+                return
+            method, path, _ = request_line.split(" ", 2)
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                key, _, value = line.partition(":")
+                headers[key.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+            await self._route(method, path.split("?", 1)[0], body, writer)
+        except Exception as e:
+            await self._send_json(writer, 500, {"error": f"{type(e).__name__}: {e}"})
+        finally:
+            writer.close()
+
+    async def _route(self, method, path, body, writer):
+        parts = [p for p in path.split("/") if p]
+        if method == "POST" and parts == ["jobs"]:
+            return await self._submit(json.loads(body or b"{}"), writer)
+        if method == "GET" and parts == ["metrics"]:
+            return await self._send_json(writer, 200, self.scheduler.metrics())
+        if method == "GET" and len(parts) >= 2 and parts[0] == "jobs":
+            job = self.scheduler.jobs.get(parts[1])
+            if job is None:
+                return await self._send_json(writer, 404, {"error": "no such job"})
+            if len(parts) == 2:
+                return await self._send_json(writer, 200, job.to_dict())
+            if parts[2] == "events":
+                return await self._stream_events(job, writer)
+            if parts[2] == "result":
+                if job.status != "done":
+                    return await self._send_json(writer, 409, job.to_dict())
+                with open(job.out_path, "rb") as f:
+                    data = f.read()
+                return await self._send(writer, 200, data, "application/octet-stream")
+        await self._send_json(writer, 404, {"error": "not found"})
+
+    async def _submit(self, request, writer):
+        in_path = request.get("input") and os.path.abspath(request["input"])
+        temp_input = "audio" in request
+        if temp_input:
+            # the extension becomes part of a path: only known audio types
+            suffix = "." + str(request.get("input_format", "wav")).lower()
+            if suffix not in AUDIO_EXTENSIONS:
+                return await self._send_json(writer, 400, {"error": f"unsupported input_format {suffix[1:]!r}"})
+            fd, in_path = tempfile.mkstemp(suffix=suffix, dir=self.scheduler.output_dir)
+            with os.fdopen(fd, "wb") as f:
+                f.write(base64.b64decode(request["audio"]))
+        if not in_path or not os.path.exists(in_path):
+            return await self._send_json(writer, 400, {"error": "missing input"})
+        try:
+            job = self.scheduler.submit(request.get("speaker"), in_path,
+                                        request.get("params"), request.get("format", "wav"),
+                                        temp_input=temp_input)
+        except (KeyError, ValueError) as e:
+            if temp_input:
+                os.remove(in_path)
+            return await self._send_json(writer, 400, {"error": str(e)})
+        await self._send_json(writer, 202, job.to_dict())
+
+    async def _stream_events(self, job, writer):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n"
+                     b"Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n")
+        sent = 0
+        while True:
+            changed = job.changed()
+            for event in job.events[sent:]:
+                line = json.dumps(event).encode() + b"\n"
+                writer.write(b"%x\r\n%s\r\n" % (len(line), line))
+            sent = len(job.events)
+            await writer.drain()
+            if job.status in ("done", "failed"):
+                break
+            await changed.wait()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def _send_json(self, writer, status, obj):
+        await self._send(writer, status, json.dumps(obj).encode(), "application/json")
+
+    async def _send(self, writer, status, data, content_type):
+        reason = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found",
+                  409: "Conflict", 500: "Internal Server Error"}[status]
+        writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}\r\n"
+                     f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode() + data)
+        await writer.drain()
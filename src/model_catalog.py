@@ -0,0 +1,92 @@
+"""
+    Cached listing of the models in a Hugging Face repo.
+
+    Replaces cloning the repo just to read its folder names. The file listing
+    (with sizes and LFS sha256s) is fetched from the Hub API on first use,
+    saved as JSON and reused until it is older than the TTL. If the Hub cannot
+    be reached the last saved listing is used, however old it is.
+"""
+
+import json
+import os
+import time
+
+CATALOG_TTL = 24 * 60 * 60
+
+
+def fetch_listing(repo):
+    """{path: {"size": int, "sha256": str or None}} for every file in repo."""
+    import huggingface_hub
+    info = huggingface_hub.HfApi().model_info(repo, files_metadata=True)
+    files = {}
+    for sibling in info.siblings:
+        lfs = sibling.lfs
+        if isinstance(lfs, dict):
+            sha256 = lfs.get("sha256")
+        else:
+            sha256 = getattr(lfs, "sha256", None)
+        files[sibling.rfilename] = {"size": sibling.size, "sha256": sha256}
+    return files
+
+
+class ModelCatalog:
+    def __init__(self, repo="therealvul/so-vits-svc-4.0", cache_dir="hf_vul_models",
+                 ttl=CATALOG_TTL, fetch=fetch_listing):
+        self.repo = repo
+        self.cache_path = os.path.join(cache_dir, "catalog_" + repo.replace("/", "__") + ".json")
+        self.ttl = ttl
+        self.fetch = fetch
+        self._files = None
+
+    def _read_cache(self):
+        try:
+            with open(self.cache_path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return data if data.get("repo") == self.repo else None
+
+    def _write_cache(self, files):
+        os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+        tmp_path = self.cache_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"repo": self.repo, "fetched_at": time.time(), "files": files}, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def refresh(self):
+        """Fetch the listing now, falling back to the saved snapshot when offline."""
+        try:
+            files = self.fetch(self.repo)
+        except Exception as e:
+            cached = self._read_cache()
+            if cached is None:
+                raise
+            print(f"Could not refresh model list for {self.repo} ({e}); using snapshot "
+                  f"from {time.ctime(cached['fetched_at'])}")
+            self._files = cached["files"]
+            return self._files
+        self._write_cache(files)
+        self._files = files
+        return files
+
+    def files(self):
+        if self._files is None:
+            cached = self._read_cache()
+            if cached is not None and time.time() - cached["fetched_at"] < self.ttl:
+                self._files = cached["files"]
+            else:
+                self.refresh()
+        return self._files
+
+    def list_models(self):
+        folders = {path.split("/", 1)[0] for path in self.files() if "/" in path}
+        return sorted(f for f in folders if not f.startswith("."))
+
+    def model_files(self, model_name):
+        """{filename: metadata} for the files directly inside a model folder."""
+        prefix = model_name + "/"
+        return {path[len(prefix):]: meta for path, meta in self.files().items()
+                if path.startswith(prefix) and "/" not in path[len(prefix):]}
+
+    def __contains__(self, model_name):
+        return bool(self.model_files(model_name))
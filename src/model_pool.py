@@ -0,0 +1,137 @@
+"""
+    Process-wide pool of loaded Svc models.
+
+    Loading a speaker means unpickling the generator checkpoint (or mapping
+    the prepared one, see src.checkpoints), parsing the config and loading
+    the cluster model, which takes seconds. The pool keeps
+    recently used models alive keyed by (model_path, cfg_path, cluster_path)
+    and evicts the least recently used one once the capacity or memory budget
+    is exceeded.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+def load_svc(model_path, cfg_path, cluster_path=""):
+    from inference.infer_tool import Svc
+    from src import checkpoints
+
+    slim_path = checkpoints.find_slim(model_path)
+    if slim_path is None:
+        return Svc(model_path, cfg_path, cluster_model_path=cluster_path)
+    # a prepared inference-only checkpoint maps instead of unpickling
+    try:
+        with checkpoints.slim_checkpoint_loader():
+            svc_model = Svc(slim_path, cfg_path, cluster_model_path=cluster_path)
+        svc_model.slim_checkpoint = slim_path
+        return svc_model
+    except Exception as e:
+        print(f"Could not load {slim_path} ({type(e).__name__}: {e}); loading {model_path}")
+        return Svc(model_path, cfg_path, cluster_model_path=cluster_path)
+
+
+def estimate_model_bytes(model):
+    """Rough resident size of a loaded Svc: the tensors of its torch modules."""
+    total = 0
+    for attr in ("net_g_ms", "hubert_model"):
+        module = getattr(model, attr, None)
+        if module is None or not hasattr(module, "parameters"):
+            continue
+        for tensor in list(module.parameters()) + list(module.buffers()):
+            total += tensor.numel() * tensor.element_size()
+    return total
+
+
+class ModelPool:
+    def __init__(self, loader=load_svc, capacity=2, max_bytes=None, size_of=estimate_model_bytes):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.loader = loader
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self.size_of = size_of
+
+        self._models = OrderedDict()  # key -> (model, nbytes)
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_time = 0.0
+
+    @staticmethod
+    def make_key(model_path, cfg_path, cluster_path=""):
+        return (model_path, cfg_path, cluster_path or "")
+
+    def get(self, model_path, cfg_path, cluster_path=""):
+        key = self.make_key(model_path, cfg_path, cluster_path)
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                self.hits += 1
+                return self._models[key][0]
+
+            self.misses += 1
+            start = time.perf_counter()
+            model = self.loader(*key)
+            self.load_time += time.perf_counter() - start
+
+            self._models[key] = (model, self.size_of(model) if self.size_of else 0)
+            self._evict(keep=key)
+            return model
+
+    def get_speaker(self, speaker):
+        """Shortcut for the speaker dicts produced by get_speakers()."""
+        return self.get(speaker["model_path"], speaker["cfg_path"], speaker.get("cluster_path", ""))
+
+    def _evict(self, keep):
+        while len(self._models) > 1 and (len(self._models) > self.capacity or self._over_budget()):
+            key = next(iter(self._models))
+            if key == keep:
+                break
+            del self._models[key]
+            self.evictions += 1
+
+    def _over_budget(self):
+        return self.max_bytes is not None and self.resident_bytes() > self.max_bytes
+
+    def resident_bytes(self):
+        return sum(nbytes for _, nbytes in self._models.values())
+
+    def discard(self, model_path, cfg_path, cluster_path=""):
+        with self._lock:
+            self._models.pop(self.make_key(model_path, cfg_path, cluster_path), None)
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+    def __contains__(self, key):
+        return self.make_key(*key) in self._models
+
+    def __len__(self):
+        return len(self._models)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"models": len(self._models),
+                "capacity": self.capacity,
+                "resident_bytes": self.resident_bytes(),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "load_time": self.load_time}
+
+
+_default_pool = None
+
+
+def default_pool(**kwargs):
+    """The process-wide pool; keyword arguments only apply on first use."""
+    global _default_pool
+    if _default_pool is None:
+        _default_pool = ModelPool(**kwargs)
+    return _default_pool
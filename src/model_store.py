@@ -0,0 +1,154 @@
+"""
+    Content-addressed store for model checkpoints.
+
+    Every file is kept once under blobs/<sha256[:2]>/<sha256>; model folders
+    get hardlinks to the blob (or symlinks when the store is on another
+    filesystem). refs.json remembers which paths were linked to which blob so
+    unreferenced blobs can be garbage collected.
+"""
+
+import json
+import os
+import shutil
+import threading
+
+from src.download_engine import sha256_file
+
+STORE_DIR = "model_store"
+
+
+class ModelStore:
+    def __init__(self, root=STORE_DIR, link_mode="hardlink"):
+        if link_mode not in ("hardlink", "symlink"):
+            raise ValueError(f"Unknown link mode {link_mode}")
+        self.root = os.path.abspath(root)
+        self.link_mode = link_mode
+        self.blob_dir = os.path.join(self.root, "blobs")
+        self.refs_path = os.path.join(self.root, "refs.json")
+        self._lock = threading.Lock()
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self.refs = self._load_refs()
+
+    def _load_refs(self):
+        try:
+            with open(self.refs_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_refs(self):
+        tmp_path = self.refs_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.refs, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.refs_path)
+
+    def blob_path(self, sha256):
+        return os.path.join(self.blob_dir, sha256[:2], sha256)
+
+    def staging_path(self, sha256):
+        """Where a download of this blob is written before add_file() moves it in."""
+        return os.path.join(self.root, "incoming", sha256)
+
+    def has(self, sha256):
+        return sha256 is not None and os.path.exists(self.blob_path(sha256))
+
+    def add_file(self, path, sha256=None):
+        """Move a file into the store (if not already there); returns its sha256."""
+        sha256 = sha256 or sha256_file(path)
+        blob = self.blob_path(sha256)
+        if os.path.exists(blob):
+            if not os.path.samefile(path, blob):
+                os.remove(path)
+            return sha256
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        shutil.move(path, blob)
+        os.chmod(blob, 0o444)  # shared by every link; must not be edited in place
+        return sha256
+
+    def link(self, sha256, target_path):
+        """Point target_path at the blob, replacing whatever file is there."""
+        blob = self.blob_path(sha256)
+        target_path = os.path.abspath(target_path)
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        if os.path.lexists(target_path):
+            if os.path.exists(target_path) and os.path.samefile(target_path, blob):
+                self._add_ref(target_path, sha256)
+                return target_path
+            os.remove(target_path)
+
+        if self.link_mode == "hardlink":
+            try:
+                os.link(blob, target_path)
+            except OSError:
+                # different filesystem (or no hardlink support)
+                os.symlink(blob, target_path)
+        else:
+            os.symlink(blob, target_path)
+        self._add_ref(target_path, sha256)
+        return target_path
+
+    def adopt(self, path, sha256=None):
+        """Move an existing file into the store and leave a link in its place."""
+        path = os.path.abspath(path)
+        sha256 = self.add_file(path, sha256)
+        return self.link(sha256, path)
+
+    def _add_ref(self, target_path, sha256):
+        with self._lock:
+            self.refs[target_path] = sha256
+            self._save_refs()
+
+    def _is_linked(self, target_path, sha256):
+        return os.path.exists(target_path) and os.path.samefile(target_path, self.blob_path(sha256))
+
+    def blobs(self):
+        for prefix in os.scandir(self.blob_dir):
+            if prefix.is_dir():
+                for entry in os.scandir(prefix.path):
+                    if entry.is_file() and not entry.name.endswith(".part"):
+                        yield entry.name, entry.stat()
+
+    def gc(self, dry_run=False):
+        """Drop refs whose target is gone or replaced, then delete unreferenced blobs.
+
+        Returns (removed sha256 list, bytes freed).
+        """
+        with self._lock:
+            live = {}
+            for target, sha256 in self.refs.items():
+                if self._is_linked(target, sha256):
+                    live[target] = sha256
+            referenced = set(live.values())
+
+            removed = []
+            freed = 0
+            for sha256, st in list(self.blobs()):
+                # hardlinks made outside refs.json still count as users
+                if sha256 in referenced or st.st_nlink > 1:
+                    continue
+                removed.append(sha256)
+                freed += st.st_size
+                if not dry_run:
+                    os.remove(self.blob_path(sha256))
+            if not dry_run:
+                self.refs = live
+                self._save_refs()
+        return removed, freed
+
+    def du(self):
+        """Disk usage report: physical blob bytes versus bytes seen through links."""
+        sizes = {sha256: st.st_size for sha256, st in self.blobs()}
+        links = {}
+        for target, sha256 in self.refs.items():
+            if sha256 in sizes and self._is_linked(target, sha256):
+                links.setdefault(sha256, []).append(target)
+        stored = sum(sizes.values())
+        linked = sum(sizes[sha256] * len(targets) for sha256, targets in links.items())
+        return {"blobs": len(sizes),
+                "stored_bytes": stored,
+                "links": sum(len(t) for t in links.values()),
+                "linked_bytes": linked,
+                "saved_bytes": max(linked - stored, 0),
+                "unreferenced": sorted(set(sizes) - set(links)),
+                "by_blob": {sha256: {"bytes": sizes[sha256], "targets": links.get(sha256, [])}
+                            for sha256 in sizes}}
@@ -0,0 +1,155 @@
+"""
+    Background writer for converted audio.
+
+    Encoding a finished track (FLAC and Vorbis especially) and writing it to
+    disk can take as long as converting a short file. OutputWriter takes
+    finished tracks from a bounded queue on a background thread, so the next
+    file converts while the previous one is written. Every track can be
+    written in several formats; each file is written to a temp name in the
+    same directory and renamed into place, so a reader never sees a partial
+    output.
+
+    When the queue is full, submit() blocks until the writer catches up;
+    that time is counted as back-pressure in stats().
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+OUTPUT_FORMATS = {"wav": "WAV", "flac": "FLAC", "ogg": "OGG"}
+QUEUE_SIZE = 2
+# libsndfile's Vorbis encoder crashes on very large single writes
+WRITE_BLOCK = 2 ** 16
+# blocked submits longer than this are reported as they happen
+BACKPRESSURE_REPORT = 1.0
+
+
+def output_format(path):
+    ext = os.path.splitext(path)[1].lstrip(".").lower()
+    if ext not in OUTPUT_FORMATS:
+        raise ValueError(f"Unsupported output format '{ext}' (use {', '.join(OUTPUT_FORMATS)})")
+    return OUTPUT_FORMATS[ext]
+
+
+def write_atomic(path, audio, sr):
+    channels = 1 if audio.ndim == 1 else audio.shape[1]
+    blocks = (audio[start:start + WRITE_BLOCK] for start in range(0, len(audio), WRITE_BLOCK))
+    return write_blocks_atomic(path, blocks, sr, channels)
+
+
+def reencode_atomic(path, source):
+    """Write the audio file source to path in path's format, a block at a time."""
+    import soundfile
+
+    with soundfile.SoundFile(source) as f:
+        return write_blocks_atomic(path, f.blocks(WRITE_BLOCK, dtype="float32"),
+                                   f.samplerate, f.channels)
+
+
+def write_blocks_atomic(path, blocks, sr, channels):
+    import soundfile
+
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with soundfile.SoundFile(tmp_path, "w", sr, channels, format=output_format(path)) as f:
+            for block in blocks:
+                f.write(block)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return os.path.getsize(path)
+
+
+class OutputWriter:
+    def __init__(self, queue_size=QUEUE_SIZE, workers=1):
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self.jobs = 0
+        self.files = 0
+        self.bytes = 0
+        self.write_seconds = 0.0
+        self.blocked_submits = 0
+        self.blocked_seconds = 0.0
+        self.max_depth = 0
+        self._threads = [threading.Thread(target=self._run, daemon=True) for _ in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, audio, sr, paths, release=None):
+        """Queue audio to be written to every path (the extension picks the format).
+
+        audio is an array, or the path of a file to re-encode from block by
+        block (that path itself is not rewritten, and is never read if it is
+        the only path). release() is called once the audio is no longer
+        needed. Returns a Future of the written paths.
+        """
+        for path in paths:
+            output_format(path)
+        future = Future()
+        start = time.perf_counter()
+        self._queue.put((audio, sr, list(paths), release, future))
+        waited = time.perf_counter() - start
+        with self._lock:
+            self.max_depth = max(self.max_depth, self._queue.qsize())
+            if waited > 1e-3:
+                self.blocked_submits += 1
+                self.blocked_seconds += waited
+        if waited > BACKPRESSURE_REPORT:
+            print(f"Output writer is behind: waited {waited:.1f}s to queue {os.path.basename(paths[0])}")
+        return future
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                self._queue.task_done()
+                return
+            audio, sr, paths, release, future = job
+            start = time.perf_counter()
+            try:
+                source = os.path.abspath(audio) if isinstance(audio, str) else None
+                written = 0
+                for path in paths:
+                    if source is None:
+                        written += write_atomic(path, audio, sr)
+                    elif os.path.abspath(path) != source:
+                        written += reencode_atomic(path, source)
+                with self._lock:
+                    self.jobs += 1
+                    self.files += len(paths)
+                    self.bytes += written
+                    self.write_seconds += time.perf_counter() - start
+                future.set_result(paths)
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                # job holds the audio too; drop both before release()
+                del audio, job
+                if release is not None:
+                    release()
+                self._queue.task_done()
+
+    def close(self):
+        """Write everything still queued and stop the threads."""
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def stats(self):
+        with self._lock:
+            return {"jobs": self.jobs, "files": self.files, "bytes": self.bytes,
+                    "write_seconds": self.write_seconds, "queued": self._queue.qsize(),
+                    "max_depth": self.max_depth, "blocked_submits": self.blocked_submits,
+                    "blocked_seconds": self.blocked_seconds}
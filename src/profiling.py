@@ -0,0 +1,188 @@
+"""
+    Per-stage timing of the conversion pipeline, written as JSON lines.
+
+    A Profiler times named stages (decode, slice, features, infer, to_numpy,
+    assemble, write) with wall and CPU clocks and appends one JSON object per
+    batch and per file to a log, with the real-time factor (processing
+    seconds per audio second) and memory high-water marks. On Linux the
+    RSS high-water mark is reset before every file, so peak_rss_mb is that
+    file's own peak even in a long-lived kernel or pool worker; elsewhere
+    only peak_rss_growth_mb (how far the process peak rose) is per file.
+    Optionally every file is also run under cProfile, and stages are
+    appended to a Chrome trace (chrome://tracing, Perfetto). Files are opened in append mode per
+    record, so worker processes can share one log.
+
+    Pass NULL_PROFILER (or nothing) to turn instrumentation off.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb():
+    """RSS high-water mark of this process since start or the last reset_peak_rss()."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 2**10
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def reset_peak_rss():
+    """Reset the high-water mark to the current RSS; False where that is not supported."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _cuda():
+    torch = sys.modules.get("torch")  # never import torch just to profile
+    if torch is not None and torch.cuda.is_available():
+        return torch.cuda
+    return None
+
+
+class Profiler:
+    def __init__(self, path="profile.jsonl", cprofile_dir=None, trace_path=None,
+                 cuda_sync=True):
+        self.path = path
+        self.cprofile_dir = cprofile_dir
+        self.trace_path = trace_path
+        self.cuda_sync = cuda_sync
+        self._current = None  # record of the file being profiled
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def emit(self, event, **fields):
+        if self.path is None:
+            return
+        record = dict(event=event, time=time.time(), pid=os.getpid(), **fields)
+        line = json.dumps(record) + "\n"
+        if self.path == "-":
+            sys.stderr.write(line)
+        else:
+            with open(self.path, "a") as f:
+                f.write(line)
+
+    def _trace(self, name, start, seconds):
+        if self.trace_path is None:
+            return
+        event = {"name": name, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+                 "ts": start * 1e6, "dur": seconds * 1e6}
+        # the JSON array format may omit the closing bracket, which lets
+        # several processes append to one file
+        new = not os.path.exists(self.trace_path)
+        with open(self.trace_path, "a") as f:
+            f.write(("[\n" if new else "") + json.dumps(event) + ",\n")
+
+    @contextmanager
+    def stage(self, name):
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            cuda = _cuda() if self.cuda_sync else None
+            if cuda is not None:
+                cuda.synchronize()
+            wall_end = time.perf_counter()
+            wall = wall_end - wall
+            cpu = time.process_time() - cpu
+            current = self._current
+            if current is not None:
+                with self._lock:
+                    totals = current["stages"].setdefault(name, {"wall": 0.0, "cpu": 0.0, "calls": 0})
+                    totals["wall"] += wall
+                    totals["cpu"] += cpu
+                    totals["calls"] += 1
+            self._trace(name, wall_end - wall, wall)
+
+    def batch(self, segments, audio_seconds, seconds):
+        current = self._current
+        self.emit("batch", file=current["file"] if current else None, segments=segments,
+                  audio_seconds=audio_seconds, seconds=seconds,
+                  rtf=seconds / audio_seconds if audio_seconds else None)
+
+    @contextmanager
+    def file(self, path):
+        """Profile one file; the caller sets record["audio_seconds"]."""
+        record = {"file": path, "audio_seconds": None, "stages": {}}
+        self._current = record
+        cuda = _cuda()
+        if cuda is not None:
+            cuda.reset_peak_memory_stats()
+        rss_reset = reset_peak_rss()
+        start_rss = peak_rss_mb()
+        profile = None
+        if self.cprofile_dir is not None:
+            import cProfile
+            profile = cProfile.Profile()
+            profile.enable()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        error = None
+        try:
+            yield record
+        except BaseException as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+            self._current = None
+            if profile is not None:
+                profile.disable()
+                os.makedirs(self.cprofile_dir, exist_ok=True)
+                stem = os.path.splitext(os.path.basename(path))[0]
+                profile.dump_stats(os.path.join(self.cprofile_dir, f"{stem}.{os.getpid()}.prof"))
+            audio_seconds = record["audio_seconds"]
+            end_rss = peak_rss_mb()
+            self.emit("file", file=path, audio_seconds=audio_seconds, seconds=wall, cpu_seconds=cpu,
+                      rtf=wall / audio_seconds if audio_seconds else None,
+                      stages=record["stages"], peak_rss_mb=end_rss if rss_reset else None,
+                      peak_rss_growth_mb=end_rss - start_rss if end_rss is not None else None,
+                      cuda_peak_mb=cuda.max_memory_allocated() / 2**20 if cuda is not None else None,
+                      error=error)
+
+
+class NullProfiler:
+    @contextmanager
+    def stage(self, name):
+        yield
+
+    def batch(self, segments, audio_seconds, seconds):
+        pass
+
+    @contextmanager
+    def file(self, path):
+        yield {"file": path, "audio_seconds": None, "stages": {}}
+
+
+NULL_PROFILER = NullProfiler()
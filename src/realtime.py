@@ -0,0 +1,283 @@
+"""
+    Low-latency conversion of a live audio stream, block by block.
+
+    Input arrives as mono float32 chunks from a source (raw PCM on stdin or a
+    socket, or a WAV file that is still being written). Every block of
+    block_seconds is converted together with context_seconds of audio before
+    it and lookahead_seconds after it instead of half-second zero pads; the
+    lookahead part of each output is crossfaded into the start of the next
+    block. Blocks that are silent are not sent to the model.
+
+    Latency is measured per block as the time from the arrival of the
+    block's first sample until its converted audio is handed to the sink.
+    The sink is treated as a player that starts latency_budget seconds after
+    the first sample arrived; a block that is ready after its playback
+    deadline counts as an underrun.
+"""
+
+import os
+import queue
+import socket
+import struct
+import sys
+import threading
+import time
+import numpy as np
+
+from src import conversion
+from src.streaming import crossfade
+
+BLOCK_SECONDS = 0.5
+CONTEXT_SECONDS = 1.0
+LOOKAHEAD_SECONDS = 0.05
+LATENCY_BUDGET = 1.0
+PCM_FORMATS = {"s16le": ("<i2", 32768.0), "f32le": ("<f4", 1.0)}
+
+
+def pcm_source(fileobj, channels=1, pcm_format="s16le", chunk_frames=1024):
+    """Raw interleaved PCM from a binary file object, e.g. sys.stdin.buffer."""
+    dtype, scale = PCM_FORMATS[pcm_format]
+    frame_bytes = np.dtype(dtype).itemsize * channels
+    pending = b""
+    while True:
+        data = fileobj.read(chunk_frames * frame_bytes - len(pending))
+        if not data:
+            return
+        data = pending + data
+        usable = len(data) - len(data) % frame_bytes
+        pending = data[usable:]
+        samples = np.frombuffer(data[:usable], dtype=dtype).astype(np.float32) / scale
+        yield samples.reshape(-1, channels).mean(axis=1) if channels > 1 else samples
+
+
+def socket_source(host, port, **kwargs):
+    """Accept one TCP connection and read raw PCM from it until it closes."""
+    # socket.create_server() needs Python 3.8
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind((host, port))
+        server.listen(1)
+        print(f"Waiting for a PCM stream on {host}:{port}", file=sys.stderr)
+        conn, addr = server.accept()
+        with conn, conn.makefile("rb") as f:
+            yield from pcm_source(f, **kwargs)
+
+
+def wav_layout(f):
+    """(sample rate, channels, dtype, scale, data offset) of a PCM16 or float32 WAV."""
+    riff, _, wave = struct.unpack("<4sI4s", f.read(12))
+    if riff != b"RIFF" or wave != b"WAVE":
+        raise ValueError("not a WAV file")
+    fmt = None
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            raise ValueError("no data chunk yet")
+        chunk_id, size = struct.unpack("<4sI", header)
+        if chunk_id == b"fmt ":
+            fmt = struct.unpack("<HHIIHH", f.read(16))
+            f.seek(size - 16 + size % 2, os.SEEK_CUR)
+        elif chunk_id == b"data":
+            break
+        else:
+            f.seek(size + size % 2, os.SEEK_CUR)
+    tag, channels, sr, _, _, bits = fmt
+    if tag == 1 and bits == 16:
+        return sr, channels, "<i2", 32768.0, f.tell()
+    if tag == 3 and bits == 32:
+        return sr, channels, "<f4", 1.0, f.tell()
+    raise ValueError(f"unsupported WAV encoding (format {tag}, {bits} bits)")
+
+
+def growing_wav_source(path, chunk_frames=1024, poll=0.01, idle_timeout=2.0):
+    """Follow a WAV that is being appended to (the header's sizes are ignored).
+
+    Ends once the file has not grown for idle_timeout seconds.
+    """
+    with open(path, "rb") as f:
+        sr, channels, dtype, scale, offset = wav_layout(f)
+        frame_bytes = np.dtype(dtype).itemsize * channels
+        f.seek(offset)
+        idle_since = time.monotonic()
+        while True:
+            data = f.read(chunk_frames * frame_bytes)
+            usable = len(data) - len(data) % frame_bytes
+            f.seek(usable - len(data), os.SEEK_CUR)  # keep a partial frame for later
+            if not usable:
+                if time.monotonic() - idle_since > idle_timeout:
+                    return
+                time.sleep(poll)
+                continue
+            idle_since = time.monotonic()
+            samples = np.frombuffer(data[:usable], dtype=dtype).astype(np.float32) / scale
+            yield samples.reshape(-1, channels).mean(axis=1) if channels > 1 else samples
+
+
+def paced(source, sr):
+    """Release chunks no faster than real time, as a live input would."""
+    start = time.monotonic()
+    sent = 0
+    for chunk in source:
+        sent += len(chunk)
+        delay = start + sent / sr - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        yield chunk
+
+
+def file_source(path, chunk_frames=1024):
+    import soundfile
+    for block in soundfile.blocks(path, blocksize=chunk_frames, dtype="float32", always_2d=True):
+        yield block.mean(axis=1)
+
+
+def _reader(source, chunks):
+    try:
+        for chunk in source:
+            chunks.put((chunk, time.monotonic()))
+    finally:
+        chunks.put(None)
+
+
+class RealtimeConverter:
+    def __init__(self, svc_model, speaker, sr, block_seconds=BLOCK_SECONDS,
+                 context_seconds=CONTEXT_SECONDS, lookahead_seconds=LOOKAHEAD_SECONDS,
+                 latency_budget=LATENCY_BUDGET, silence_db=-40, convert=None, **kwargs):
+        if block_seconds + lookahead_seconds >= latency_budget:
+            raise ValueError(f"block ({block_seconds}s) plus lookahead ({lookahead_seconds}s) "
+                             f"must fit in the latency budget ({latency_budget}s)")
+        self.sr = sr
+        self.target_sample = svc_model.target_sample
+        self.block = int(block_seconds * sr)
+        self.context = int(context_seconds * sr)
+        self.lookahead = int(lookahead_seconds * sr)
+        self.latency_budget = latency_budget
+        self.silence = 10 ** (silence_db / 20)
+        # convert(window) -> audio at target_sample; kwargs go to infer_array
+        self.convert = convert or (lambda window: conversion.infer_array(
+            svc_model, speaker, kwargs.get("tran", 0), window, sr,
+            cluster_infer_ratio=kwargs.get("cluster_infer_ratio", 0.0),
+            auto_predict_f0=kwargs.get("auto_predict_f0", False),
+            noice_scale=kwargs.get("noice_scale", 0.4)))
+
+        self.buffer = np.zeros(self.context, dtype=np.float32)  # zeros before the start
+        self.arrivals = []  # (input sample index, arrival time) per received chunk
+        self.received = 0
+        self.emitted_in = 0  # input samples converted and emitted
+        self.emitted_out = 0
+        self.tail = None
+        self.t0 = None
+        self.latencies = []
+        self.process_times = []
+        self.underruns = 0
+        self.late_seconds = 0.0
+        self.silent_blocks = 0
+
+    def out_pos(self, n):
+        return int(round(n * self.target_sample / self.sr))
+
+    def _arrival(self, index):
+        for end, t in self.arrivals:
+            if end > index:
+                return t
+        return self.arrivals[-1][1]
+
+    def feed(self, chunk, arrival):
+        """Add input; returns the converted blocks that became ready."""
+        if self.t0 is None:
+            self.t0 = arrival
+        self.buffer = np.concatenate([self.buffer, chunk])
+        self.received += len(chunk)
+        self.arrivals.append((self.received, arrival))
+        out = []
+        while self.received - self.emitted_in >= self.block + self.lookahead:
+            out.append(self._process(self.block))
+        return out
+
+    def flush(self):
+        """Convert what is left at the end of the stream."""
+        out = []
+        while self.received > self.emitted_in:
+            left = self.received - self.emitted_in
+            pad = self.block + self.lookahead - left
+            if pad > 0:
+                self.buffer = np.concatenate([self.buffer, np.zeros(pad, dtype=np.float32)])
+            out.append(self._process(min(self.block, left), last=left <= self.block))
+        return out
+
+    def _process(self, n, last=False):
+        start = time.monotonic()
+        window = self.buffer[:self.context + self.block + self.lookahead]
+        target_len = self.out_pos(self.emitted_in + n) - self.emitted_out
+        if np.sqrt(np.mean(np.square(window[self.context:]))) < self.silence:
+            self.silent_blocks += 1
+            converted = np.zeros(self.out_pos(len(window)), dtype=np.float32)
+        else:
+            converted = np.asarray(self.convert(window), dtype=np.float32)
+        scale = len(converted) / len(window)
+        head = int(round(self.context * scale))
+        block = converted[head:head + int(round(self.block * scale))].copy()
+        tail = converted[head + len(block):head + len(block) + int(round(self.lookahead * scale))]
+        block = np.pad(block, (0, max(0, target_len - len(block))))[:target_len]
+        if self.tail is not None:
+            crossfade(self.tail, block)
+        self.tail = None if last else tail.copy()
+
+        now = time.monotonic()
+        self.process_times.append(now - start)
+        first_arrival = self._arrival(self.emitted_in)
+        self.latencies.append(now - first_arrival)
+        deadline = self.t0 + self.latency_budget + self.emitted_in / self.sr
+        if now > deadline:
+            self.underruns += 1
+            self.late_seconds += now - deadline
+
+        self.emitted_in += n
+        self.emitted_out += len(block)
+        self.buffer = self.buffer[n:]
+        self.arrivals = [(end, t) for end, t in self.arrivals if end > self.emitted_in] or self.arrivals[-1:]
+        return block
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+
+        def pick(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))] if latencies else None
+
+        block_seconds = self.block / self.sr
+        return {"blocks": len(self.latencies),
+                "silent_blocks": self.silent_blocks,
+                "audio_seconds": self.emitted_in / self.sr,
+                "latency_p50": pick(50), "latency_p90": pick(90), "latency_p99": pick(99),
+                "latency_max": latencies[-1] if latencies else None,
+                "latency_budget": self.latency_budget,
+                "underruns": self.underruns,
+                "late_seconds": self.late_seconds,
+                "rtf": (sum(self.process_times) / (len(self.process_times) * block_seconds)
+                        if self.process_times else None)}
+
+
+def run(converter, source, sink, report_every=5.0):
+    """Pump source through converter into sink(block); returns converter.stats().
+
+    The source is read on its own thread so arrival times are taken when the
+    audio arrives, not when the converter gets round to it.
+    """
+    chunks = queue.Queue()
+    threading.Thread(target=_reader, args=(source, chunks), daemon=True).start()
+    last_report = time.monotonic()
+    while True:
+        item = chunks.get()
+        if item is None:
+            break
+        for block in converter.feed(*item):
+            sink(block)
+        if report_every and time.monotonic() - last_report > report_every:
+            last_report = time.monotonic()
+            stats = converter.stats()
+            if stats["blocks"]:  # nothing to report until the first block is out
+                print(f"{stats['audio_seconds']:.1f}s converted, latency p90 {stats['latency_p90']:.3f}s, "
+                      f"{stats['underruns']} underruns", file=sys.stderr)
+    for block in converter.flush():
+        sink(block)
+    return converter.stats()
@@ -0,0 +1,122 @@
+"""
+    On-disk index of the speakers found under models/.
+
+    Every model folder is scanned once and its speakers are cached in a JSON
+    manifest together with the folder's mtime. Later refreshes only rescan
+    folders whose mtime changed (files added, removed or renamed) and drop
+    folders that disappeared. Lookups by speaker name are a dict access.
+"""
+
+import json
+import os
+
+INDEX_FILENAME = ".speaker_index.json"
+INDEX_VERSION = 1
+
+
+def scan_model_folder(models_dir, folder):
+    """Speakers of one model folder, in the format get_speakers() returns."""
+    names = sorted(e.name for e in os.scandir(os.path.join(models_dir, folder)) if e.is_file())
+
+    g = [n for n in names if n.startswith("G_") and n.endswith(".pth")]
+    if not len(g):
+        print(f"Skipping {folder}, no G_*.pth")
+        return []
+    cur_speaker = {"model_path": os.path.join(models_dir, folder, g[0]), "model_folder": folder}
+
+    clst = [n for n in names if n.endswith(".pt")]
+    if not len(clst):
+        print(f"Note: No clustering model found for {folder}")
+        cur_speaker["cluster_path"] = ""
+    else:
+        cur_speaker["cluster_path"] = os.path.join(models_dir, folder, clst[0])
+
+    cfg = [n for n in names if n.endswith(".json")]
+    if not len(cfg):
+        print(f"Skipping {folder}, no config json")
+        return []
+    cur_speaker["cfg_path"] = os.path.join(models_dir, folder, cfg[0])
+    try:
+        with open(cur_speaker["cfg_path"]) as f:
+            spk = json.load(f)["spk"]
+    except (ValueError, KeyError):
+        print(f"Malformed config json in {folder}")
+        return []
+
+    speakers = []
+    for name, i in spk.items():
+        if not name.startswith('.'):
+            speakers.append(dict(cur_speaker, name=name, id=i))
+    return speakers
+
+
+class SpeakerIndex:
+    def __init__(self, models_dir="models", index_path=None, refresh=True):
+        self.models_dir = models_dir
+        self.index_path = index_path or os.path.join(models_dir, INDEX_FILENAME)
+        self.folders = {}  # folder -> {"mtime": ns, "speakers": [...]}
+        self.by_name = {}
+        self._load()
+        if refresh:
+            self.refresh()
+
+    def _load(self):
+        try:
+            with open(self.index_path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == INDEX_VERSION and data.get("models_dir") == self.models_dir:
+            self.folders = data.get("folders", {})
+            self._rebuild_lookup()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": INDEX_VERSION, "models_dir": self.models_dir,
+                       "folders": self.folders}, f)
+        os.replace(tmp_path, self.index_path)
+
+    def _rebuild_lookup(self):
+        self.by_name = {}
+        for entry in self.folders.values():
+            for speaker in entry["speakers"]:
+                self.by_name.setdefault(speaker["name"], speaker)
+
+    def refresh(self):
+        """Rescan changed folders only; returns the names of rescanned folders."""
+        if not os.path.isdir(self.models_dir):
+            current = {}
+        else:
+            current = {e.name: e.stat().st_mtime_ns for e in os.scandir(self.models_dir) if e.is_dir()}
+
+        changed = [folder for folder, mtime in current.items()
+                   if self.folders.get(folder, {}).get("mtime") != mtime]
+        removed = [folder for folder in self.folders if folder not in current]
+        for folder in changed:
+            self.folders[folder] = {"mtime": current[folder],
+                                    "speakers": scan_model_folder(self.models_dir, folder)}
+        for folder in removed:
+            del self.folders[folder]
+
+        if changed or removed:
+            self._rebuild_lookup()
+            try:
+                self._save()
+            except OSError as e:
+                print(f"Could not write speaker index {self.index_path}: {e}")
+        return changed
+
+    def speakers(self):
+        speakers = [s for entry in self.folders.values() for s in entry["speakers"]]
+        return sorted(speakers, key=lambda x: x["name"].lower())
+
+    def get(self, name):
+        return self.by_name[name]
+
+    def __contains__(self, name):
+        return name in self.by_name
+
+    def __len__(self):
+        return len(self.by_name)
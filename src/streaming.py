@@ -0,0 +1,79 @@
+"""
+    Windowed conversion of long inputs with bounded memory.
+
+    The input is read in fixed windows that overlap by a short margin. Each
+    window is sliced and converted on its own, the overlapping region is
+    crossfaded with the tail of the previous window, and finished blocks are
+    appended to the output file straight away. Memory depends on the window
+    length only, not on the length of the track.
+"""
+
+import time
+import numpy as np
+import soundfile
+
+from src import conversion
+
+WINDOW_SECONDS = 30.0
+OVERLAP_SECONDS = 1.0
+
+
+def read_window(src, start, frames):
+    src.seek(start)
+    block = src.read(frames, dtype="float32", always_2d=True)
+    return block.mean(axis=1) if block.shape[1] > 1 else block[:, 0]
+
+
+def crossfade(tail, head):
+    """Blend the end of the previous window into the start of the next one, in place."""
+    n = min(len(tail), len(head))
+    fade = np.linspace(0.0, 1.0, n, dtype=np.float32)
+    head[:n] = tail[:n] * (1.0 - fade) + head[:n] * fade
+    return head
+
+
+def stream_convert(svc_model, speaker, in_path, out_path, window=WINDOW_SECONDS,
+                   overlap=OVERLAP_SECONDS, slice_db=-40, out_format=None, **kwargs):
+    """Convert in_path to out_path window by window.
+
+    Extra keyword arguments are passed to conversion.convert_chunks.
+    Yields (seconds_written, seconds_total) after every block written.
+    """
+    target_sample = svc_model.target_sample
+    with soundfile.SoundFile(in_path) as src:
+        sr = src.samplerate
+        total = src.frames
+        win = int(window * sr)
+        ov = int(overlap * sr)
+        ov_out = conversion.output_length(ov, sr, target_sample)
+
+        with soundfile.SoundFile(out_path, "w", samplerate=target_sample,
+                                 channels=1, format=out_format) as dst:
+            tail = None
+            written = 0
+            pos = 0
+            while pos < total:
+                last = pos + win + ov >= total
+                audio = read_window(src, pos, total - pos if last else win + ov)
+                with conversion.convert_array(svc_model, speaker, audio, sr,
+                                              slice_db=slice_db, **kwargs) as out:
+                    block = np.array(out.audio)
+                if tail is not None:
+                    crossfade(tail, block)
+                if not last and ov_out:
+                    tail = block[-ov_out:].copy()
+                    block = block[:-ov_out]
+                dst.write(block)
+                dst.flush()
+                written += len(block)
+                pos += win
+                yield written / target_sample, total / sr
+
+
+def stream_convert_file(svc_model, speaker, in_path, out_path, **kwargs):
+    """Run stream_convert to completion, printing progress."""
+    start = time.time()
+    for done, total in stream_convert(svc_model, speaker, in_path, out_path, **kwargs):
+        print(f"Streaming {in_path}: {done:.1f}s / {total:.1f}s written "
+              f"({time.time() - start:.1f}s elapsed)")
+    return out_path
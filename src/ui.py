@@ -1,87 +1,89 @@
-import numpy as np
-import soundfile
-from inference.infer_tool import Svc
-from inference import slicer
-from inference import infer_tool
-import torch
 import os
-import glob
-import json
-import copy
-import logging
-import io
-from ipywidgets import widgets
 from pathlib import Path
-from IPython.display import Audio, display
 
-from src.download_utils import Downloader
-
-os.chdir('/content/so-vits-svc')
+from src.model_pool import default_pool
+from src.output_writer import OUTPUT_FORMATS
+from src.speaker_index import SpeakerIndex
 
+SVC_ROOT = '/content/so-vits-svc'
+MODELS_DIR = "models"
+INPUT_DIRS = ['/content']
+MODEL_POOL_CAPACITY = 3
+PROFILE_PATH = "profile.jsonl"
 
-vul_models = Downloader("therealvul/so-vits-svc-4.0",
-                        "models").hf_models  # HFModels()
+vul_models = None
+model_pool = None
 
 
 def button_eventhandler(but):
     vul_models.download_model(but.description, f"models/{but.description}")
 
 
-for model in vul_models.list_models():
-    btn = widgets.Button(description=model)
-    btn.on_click(button_eventhandler)
-    display(btn)
+def show_model_buttons():
+    from ipywidgets import widgets
+    from IPython.display import display
+
+    for model in vul_models.list_models():
+        btn = widgets.Button(description=model)
+        btn.on_click(button_eventhandler)
+        display(btn)
 
-MODELS_DIR = "models"
+
+def init(svc_root=SVC_ROOT, model_buttons=True):
+    """Switch to the so-vits-svc checkout and set up the model list and pool (not done at import)."""
+    global vul_models, model_pool
+    from src.download_utils import Downloader
+    from src.model_store import ModelStore
+
+    os.chdir(svc_root)
+    vul_models = Downloader("therealvul/so-vits-svc-4.0",
+                            "models", store=ModelStore()).hf_models  # HFModels()
+    model_pool = default_pool(capacity=MODEL_POOL_CAPACITY)
+    if model_buttons:
+        show_model_buttons()
 
 
 class InferenceApp:
 
-    def __init__(self):
+    def __init__(self, scan_drive=True):
+        from src.audio_cache import AudioCache
+        from src.feature_cache import FeatureCache
+        from src.input_discovery import (DRIVE_DIR, EXCLUDE_DIRS, RECORD_FILENAME,
+                                         ConversionRecord, InputScanner)
+
+        if model_pool is None:
+            init(model_buttons=False)
+        self.slice_db = -40
+        # inputs present at start-up are not converted or cleaned up
+        # inputs are found anywhere under /content, the mounted Drive included;
+        # InferenceApp(scan_drive=False) skips a large Drive
+        exclude = EXCLUDE_DIRS if scan_drive else EXCLUDE_DIRS | {DRIVE_DIR}
+        if not scan_drive:
+            print(f"Not looking for inputs in /content/{DRIVE_DIR}")
+        self.scanner = InputScanner(INPUT_DIRS, exclude=exclude)
+        self.existing_files = self.scanner.scan()
+        self.record = ConversionRecord(os.path.join('/content', RECORD_FILENAME))
+        # re-runs with another transpose/speaker reuse the extracted features
+        self.feature_cache = FeatureCache()
+        # decoded inputs at the model rate, instead of WAVs next to the inputs
+        self.audio_cache = AudioCache()
         self.speakers = self.get_speakers()
         self.speaker_list = [x["name"] for x in self.speakers]
         self.create_widgets()
 
     def get_speakers(self):
-        speakers = []
-        for _, dirs, _ in os.walk(MODELS_DIR):
-            for folder in dirs:
-                # Look for G_****.pth
-                g = glob.glob(os.path.join(MODELS_DIR, folder, 'G_*.pth'))
-                if not len(g):
-                    print(f"Skipping {folder}, no G_*.pth")
-                    continue
-                cur_speaker = {"model_path": g[0], "model_folder": folder}
-                # Look for *.pt (clustering model)
-                clst = glob.glob(os.path.join(MODELS_DIR, folder, '*.pt'))
-                if not len(clst):
-                    print(f"Note: No clustering model found for {folder}")
-                    cur_speaker["cluster_path"] = ""
-                else:
-                    cur_speaker["cluster_path"] = clst[0]
-
-                # Look for config.json
-                cfg = glob.glob(os.path.join(MODELS_DIR, folder, '*.json'))
-                if not len(cfg):
-                    print(f"Skipping {folder}, no config json")
-                    continue
-                cur_speaker["cfg_path"] = cfg[0]
-                with open(cur_speaker["cfg_path"]) as f:
-                    try:
-                        cfg_json = json.loads(f.read())
-                    except Exception as e:
-                        print(f"Malformed config json in {folder}")
-                    for name, i in cfg_json["spk"].items():
-                        cur_speaker["name"] = name
-                        cur_speaker["id"] = i
-                        if not name.startswith('.'):
-                            speakers.append(copy.copy(cur_speaker))
-
-        return sorted(speakers, key=lambda x: x["name"].lower())
+        self.speaker_index = SpeakerIndex(MODELS_DIR)
+        return self.speaker_index.speakers()
 
     def create_widgets(self):
+        from ipywidgets import widgets
+        from IPython.display import display
+
         self.speaker_box = widgets.Dropdown(options=self.speaker_list)
         display(self.speaker_box)
+        self.fanout_box = widgets.SelectMultiple(
+            options=self.speaker_list, description='Also render as')
+        display(self.fanout_box)
 
         self.trans_tx = widgets.IntText(value=0, description='Transpose')
         self.cluster_ratio_tx = widgets.FloatText(
@@ -90,11 +92,23 @@ class InferenceApp:
             value=0.4, description='Noise Scale')
         self.auto_pitch_ck = widgets.Checkbox(
             value=False, description='Auto pitch f0 (do not use for singing)')
+        self.batch_size_tx = widgets.IntText(
+            value=1, description='Batch size')
+        self.streaming_ck = widgets.Checkbox(
+            value=False, description='Streaming (long inputs, bounded memory)')
+        self.profile_ck = widgets.Checkbox(
+            value=False, description=f'Profile stages (JSON lines in {PROFILE_PATH})')
+        self.format_box = widgets.SelectMultiple(
+            options=list(OUTPUT_FORMATS), value=('wav',), description='Output formats')
 
         display(self.trans_tx)
         display(self.cluster_ratio_tx)
         display(self.noise_scale_tx)
         display(self.auto_pitch_ck)
+        display(self.batch_size_tx)
+        display(self.streaming_ck)
+        display(self.profile_ck)
+        display(self.format_box)
 
         self.convert_btn = widgets.Button(description="Convert")
         self.convert_btn.on_click(self.convert_cb)
@@ -111,67 +125,165 @@ class InferenceApp:
         self.clean()
 
     def convert(self):
+        from IPython.display import Audio, display
+        from src.audio_cache import prefetch, prepare_input
+        from src.output_writer import OutputWriter
+        from src.profiling import NULL_PROFILER, Profiler
+
         trans = int(self.trans_tx.value)
-        speaker = next(
-            x for x in self.speakers if x["name"] == self.speaker_box.value)
-        spkpth2 = os.path.join(os.getcwd(), speaker["model_path"])
-
-        svc_model = Svc(speaker["model_path"], speaker["cfg_path"],
-                        cluster_model_path=speaker["cluster_path"])
-
-        input_filepaths = [f for f in glob.glob('/content/**/*.*', recursive=True) if f not in self.existing_files and any(f.endswith(ex) for ex in ['.wav', '.flac', '.mp3', '.ogg', '.opus'])]
-
-        for name in input_filepaths:
-            print(f"Converting {os.path.split(name)[-1]}")
-            infer_tool.format_wav(name)
-
-            wav_path = str(Path(name).with_suffix('.wav'))
-            wav_name = Path(name).stem
-            chunks = slicer.cut(wav_path, db_thresh=self.slice_db)
-            audio_data, audio_sr = slicer.chunks2audio(wav_path, chunks)
-
-            audio = []
-            for (slice_tag, data) in audio_data:
-                print(f'#=====segment start, 'f'{round(len(data) / audio_sr, 3)}s======')
-
-                length = int(
-                    np.ceil(len(data) / audio_sr * svc_model.target_sample))
-
-                if slice_tag:
-                    print('jump empty segment')
-                    _audio = np.zeros(length)
-                else:
-                    pad_len = int(audio_sr * 0.5)
-                    data = np.concatenate(
-                        [np.zeros([pad_len]), data, np.zeros([pad_len])])
-                    raw_path = io.BytesIO()
-                    soundfile.write(raw_path, data, audio_sr, format="wav")
-                    raw_path.seek(0)
-                    _cluster_ratio = 0.0
-                    if speaker["cluster_path"] != "":
-                        _cluster_ratio = float(self.cluster_ratio_tx.value)
-                    out_audio, out_sr = svc_model.infer(
-                        speaker["name"], trans, raw_path,
-                        cluster_infer_ratio=_cluster_ratio,
-                        auto_predict_f0=bool(self.auto_pitch_ck.value),
-                        noice_scale=float(self.noise_scale_tx.value))
-                    _audio = out_audio.cpu().numpy()
-                    pad_len = int(svc_model.target_sample * 0.5)
-                    _audio = _audio[pad_len:-pad_len]
-                audio.extend(list(infer_tool.pad_array(_audio, length)))
-
-            res_path = os.path.join('/content/',
-                                    f'{wav_name}_{trans}_key_'
-                                    f'{speaker["name"]}.{self.wav_format}')
-            soundfile.write(res_path, audio,
-                            svc_model.target_sample, format=self.wav_format)
-            display(Audio(res_path, autoplay=True))  # display audio file
+        speaker = self.speaker_index.get(self.speaker_box.value)
+
+        svc_model = model_pool.get_speaker(speaker)
+        print(f"Model pool: {model_pool.stats()}")
+
+        _cluster_ratio = 0.0
+        if speaker["cluster_path"] != "":
+            _cluster_ratio = float(self.cluster_ratio_tx.value)
+        params = dict(tran=trans,
+                      cluster_infer_ratio=_cluster_ratio,
+                      auto_predict_f0=bool(self.auto_pitch_ck.value),
+                      noice_scale=float(self.noise_scale_tx.value),
+                      batch_size=int(self.batch_size_tx.value),
+                      feature_cache=self.feature_cache)
+        profiler = Profiler(PROFILE_PATH) if self.profile_ck.value else NULL_PROFILER
+        params["profiler"] = profiler
+
+        # extra voices share the decoding, slicing and feature extraction
+        targets = [speaker] + [self.speaker_index.get(n) for n in self.fanout_box.value
+                               if n != speaker["name"]]
+        formats = list(self.format_box.value) or ['wav']
+        run_params = dict(params, slice_db=self.slice_db, formats=",".join(formats),
+                          streaming=bool(self.streaming_ck.value),
+                          targets=",".join(t["name"] for t in targets))
+
+        input_filepaths = self.record.pending(self.scanner.scan() - self.existing_files,
+                                              speaker, run_params)
+        if not input_filepaths:
+            print("No new or changed input files")
+
+        # the next inputs are decoded and resampled while this one converts
+        load_audio = len(targets) > 1 or not self.streaming_ck.value
+
+        def load(name):
+            return prepare_input(name, svc_model.target_sample, self.audio_cache, load_audio)
+
+        # outputs are encoded and written in the background while the next
+        # input converts; finished ones are shown (and recorded) in order
+        written = []  # (input, [future of the paths written per target])
+
+        def show_written(wait):
+            while written and (wait or all(f.done() for f in written[0][1])):
+                name, futures = written.pop(0)
+                res_paths = []
+                for future in futures:
+                    try:
+                        res_paths.append(future.result())
+                    except Exception as e:
+                        print(f"Writing output for {os.path.split(name)[-1]} failed: {e}")
+                if not res_paths:
+                    continue
+                self.record.mark_done(name, speaker, run_params, res_paths[0][0],
+                                      derived=[p for paths in res_paths for p in paths][1:])
+                for paths in res_paths:
+                    display(Audio(paths[0], autoplay=True))  # display audio file
+
+        try:
+            with OutputWriter() as writer:
+                for name, pending in prefetch(load, input_filepaths):
+                    print(f"Converting {os.path.split(name)[-1]}")
+                    with profiler.file(name) as record:
+                        with profiler.stage("decode"):
+                            prepared = pending.result()
+                        try:
+                            written.append((name, self.convert_one(prepared, svc_model, targets, trans,
+                                                                   params, profiler, record, writer,
+                                                                   formats)))
+                        finally:
+                            prepared["release"]()  # the cached decode may be evicted now
+                    show_written(wait=False)
+        finally:
+            show_written(wait=True)
+            self.record.flush()
+        print(f"Audio cache: {self.audio_cache.stats()}")
+        print(f"Output writer: {writer.stats()}")
+
+    def result_path(self, name, trans, speaker, fmt='wav'):
+        return os.path.join('/content/',
+                            f'{Path(name).stem}_{trans}_key_'
+                            f'{speaker["name"]}.{fmt}')
+
+    def convert_one(self, prepared, svc_model, targets, trans, params, profiler, record,
+                    writer, formats):
+        """Convert one input; returns a future of the written paths per target."""
+        import soundfile
+        from src import conversion
+        from src import streaming
+
+        name = prepared["input"]
+        audio_sr = prepared["sr"]
+        speaker = targets[0]
+        res_paths = [self.result_path(name, trans, speaker, fmt) for fmt in formats]
+
+        if len(targets) > 1:
+            from src.fanout import fan_out
+
+            futures = {}
+
+            def write(target, audio, target_sample):
+                # the writer keeps the array alive; on POSIX that also holds
+                # a memory-mapped track after fan_out removes its file
+                futures[target["name"]] = writer.submit(
+                    audio, target_sample,
+                    [self.result_path(name, trans, target, fmt) for fmt in formats])
+
+            record["audio_seconds"] = len(prepared["audio"]) / audio_sr
+            fan_params = dict(params, cluster_infer_ratio=float(self.cluster_ratio_tx.value))
+            results = fan_out(prepared["audio"], audio_sr, targets, model_pool, write,
+                              slice_db=self.slice_db, **fan_params)
+            for result in results:
+                if "error" in result:
+                    print(f"{result['speaker']}: {result['error']}")
+            return [futures[t["name"]] for t in targets if t["name"] in futures]
+
+        if self.streaming_ck.value:
+            record["audio_seconds"] = soundfile.info(prepared["path"]).duration
+            # windows go to a temp file of the first format, renamed into place
+            # when complete; the others are re-encoded from it in the background
+            tmp_path = f"{res_paths[0]}.{os.getpid()}.tmp"
+            try:
+                streaming.stream_convert_file(
+                    svc_model, speaker["name"], prepared["path"], tmp_path,
+                    slice_db=self.slice_db, out_format=OUTPUT_FORMATS[formats[0]], **params)
+                os.replace(tmp_path, res_paths[0])
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            return [writer.submit(res_paths[0], svc_model.target_sample, res_paths)]
+        else:
+            record["audio_seconds"] = len(prepared["audio"]) / audio_sr
+            with profiler.stage("slice"):
+                audio_data = conversion.slice_audio(
+                    prepared["audio"], audio_sr, db_thresh=self.slice_db)
+            assembler = conversion.AudioAssembler.for_chunks(
+                audio_data, audio_sr, svc_model.target_sample)
+            try:
+                conversion.convert_chunks(
+                    svc_model, speaker["name"], audio_data, audio_sr,
+                    out=assembler, **params)
+            except BaseException:
+                assembler.close()
+                raise
+            # only waits if the writer is behind
+            with profiler.stage("write"):
+                return [writer.submit(assembler.audio, svc_model.target_sample, res_paths,
+                                      release=assembler.close)]
 
     def clean(self):
-        input_filepaths = [f for f in glob.glob('/content/**/*.*', recursive=True) if f not in self.existing_files and any(f.endswith(ex) for ex in ['.wav', '.flac', '.mp3', '.ogg', '.opus'])]
-        for f in input_filepaths:
+        for f in self.scanner.scan() - self.existing_files:
             os.remove(f)
 
 
 if __name__ == '__main__':
+    init()
     inference_app = InferenceApp()
@@ -1,11 +1,7 @@
-import os
-import shutil
-import huggingface_hub
 import json
-import torch
-import numpy as np
 
 def check_gpu():
+    import torch
     if torch.cuda.is_available():
         print("GPU is available")
     else:
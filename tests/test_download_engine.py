@@ -0,0 +1,102 @@
+import hashlib
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.download_engine import DownloadJob, IntegrityError, fetch
+
+DATA = bytes(range(256)) * 1000
+SHA256 = hashlib.sha256(DATA).hexdigest()
+
+
+class Handler(BaseHTTPRequestHandler):
+    honor_range = True
+    requests = []
+
+    def do_GET(self):
+        self.requests.append(self.headers.get("Range"))
+        start = 0
+        if self.honor_range and self.headers.get("Range"):
+            start = int(self.headers["Range"].split("=")[1].rstrip("-"))
+            if start >= len(DATA):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(DATA)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(DATA) - 1}/{len(DATA)}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(DATA) - start))
+        self.end_headers()
+        self.wfile.write(DATA[start:])
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    Handler.honor_range = True
+    Handler.requests = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}/model.pth"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def write_part(path, data):
+    with open(str(path) + ".part", "wb") as f:
+        f.write(data)
+
+
+def test_download(server, tmp_path):
+    path = tmp_path / "model.pth"
+    assert fetch(DownloadJob(server, str(path), sha256=SHA256)) == "downloaded"
+    assert path.read_bytes() == DATA
+    assert not os.path.exists(str(path) + ".part")
+    assert fetch(DownloadJob(server, str(path), sha256=SHA256)) == "skipped"
+
+
+def test_resume(server, tmp_path):
+    path = tmp_path / "model.pth"
+    write_part(path, DATA[:1000])
+    assert fetch(DownloadJob(server, str(path), sha256=SHA256)) == "resumed"
+    assert Handler.requests == ["bytes=1000-"]
+    assert path.read_bytes() == DATA
+
+
+def test_server_ignores_range(server, tmp_path):
+    Handler.honor_range = False
+    path = tmp_path / "model.pth"
+    write_part(path, b"x" * 1000)
+    assert fetch(DownloadJob(server, str(path), sha256=SHA256)) == "downloaded"
+    assert path.read_bytes() == DATA
+
+
+def test_sha256_mismatch(server, tmp_path):
+    path = tmp_path / "model.pth"
+    with pytest.raises(IntegrityError):
+        fetch(DownloadJob(server, str(path), sha256="0" * 64))
+    assert not path.exists()
+    assert not os.path.exists(str(path) + ".part")
+
+
+def test_complete_part(server, tmp_path):
+    path = tmp_path / "config.json"
+    write_part(path, DATA)
+    assert fetch(DownloadJob(server, str(path))) == "resumed"
+    assert path.read_bytes() == DATA
+
+
+def test_oversized_part_without_sha256(server, tmp_path):
+    path = tmp_path / "config.json"
+    write_part(path, DATA + b"stale")
+    assert fetch(DownloadJob(server, str(path))) == "downloaded"
+    assert Handler.requests == [f"bytes={len(DATA) + 5}-", None]
+    assert path.read_bytes() == DATA
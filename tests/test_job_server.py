@@ -0,0 +1,220 @@
+import asyncio
+import base64
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from src.job_server import JobScheduler, JobServer, Worker
+
+SPEAKERS = {name: {"name": name, "model_path": f"{name}.pth", "cfg_path": f"{name}.json",
+                   "cluster_path": ""} for name in ("a", "b")}
+
+
+def dummy_runner(speaker, in_path, out_path, params, progress):
+    """Stands in for the Svc pipeline: copies the input and reports progress."""
+    with open(in_path, "rb") as f:
+        data = f.read()
+    progress(1, 2)
+    time.sleep(params.get("sleep", 0))
+    with open(out_path, "wb") as f:
+        f.write(speaker["name"].encode() + b":" + data)
+    progress(2, 2)
+    return 1.5
+
+
+def failing_runner(speaker, in_path, out_path, params, progress):
+    raise RuntimeError("model exploded")
+
+
+def scheduler_with_workers(loaded):
+    scheduler = JobScheduler(SPEAKERS, workers=len(loaded), runner=dummy_runner)
+    for i, names in enumerate(loaded):
+        worker = Worker(i, None)
+        for name in names:
+            worker.touch(name)
+        scheduler.workers.append(worker)
+    return scheduler
+
+
+def test_prefers_loaded_speaker_with_most_jobs():
+    scheduler = scheduler_with_workers([["a", "b"]])
+    for name in ("b", "a", "a"):
+        scheduler.submit(name, "in.wav")
+    assert scheduler.next_job(scheduler.workers[0]).speaker["name"] == "a"
+
+
+def test_leaves_speakers_loaded_elsewhere():
+    scheduler = scheduler_with_workers([[], ["a"]])
+    for name in ("a", "b"):
+        scheduler.submit(name, "in.wav")
+    assert scheduler.next_job(scheduler.workers[0]).speaker["name"] == "b"
+    assert scheduler.next_job(scheduler.workers[1]).speaker["name"] == "a"
+
+
+def test_max_wait_takes_oldest():
+    scheduler = scheduler_with_workers([["b"]])
+    old = scheduler.submit("a", "in.wav")
+    scheduler.submit("b", "in.wav")
+    old.submitted -= scheduler.max_wait + 1
+    assert scheduler.next_job(scheduler.workers[0]) is old
+
+
+def test_groups_jobs_by_speaker(tmp_path):
+    in_path = tmp_path / "in.wav"
+    in_path.write_bytes(b"audio")
+
+    async def run():
+        scheduler = JobScheduler(SPEAKERS, workers=1, runner=dummy_runner,
+                                 output_dir=str(tmp_path))
+        jobs = [scheduler.submit(name, str(in_path)) for name in ("a", "b", "a", "b")]
+        await scheduler.start()
+        try:
+            while any(job.status not in ("done", "failed") for job in jobs):
+                await asyncio.sleep(0.05)
+        finally:
+            await scheduler.stop()
+        return scheduler, jobs
+
+    scheduler, jobs = asyncio.run(run())
+    assert [job.status for job in jobs] == ["done"] * 4
+    order = [job.speaker["name"] for job in sorted(jobs, key=lambda job: job.started)]
+    assert order == ["a", "a", "b", "b"]
+    assert scheduler.metrics()["per_speaker"]["a"]["jobs"] == 2
+
+
+@pytest.fixture
+def server(tmp_path):
+    servers = []
+
+    def start(runner=dummy_runner, **kwargs):
+        scheduler = JobScheduler(SPEAKERS, workers=1, runner=runner, output_dir=str(tmp_path),
+                                 **kwargs)
+        job_server = JobServer(scheduler, port=0)
+        loop = asyncio.new_event_loop()
+        task = loop.create_task(job_server.serve_forever())
+
+        def serve():
+            try:
+                loop.run_until_complete(task)
+            except asyncio.CancelledError:
+                pass
+
+        thread = threading.Thread(target=serve, daemon=True)
+        thread.start()
+        while job_server.port == 0:
+            time.sleep(0.01)
+        servers.append((loop, task, thread))
+        return f"http://127.0.0.1:{job_server.port}"
+
+    yield start
+    for loop, task, thread in servers:
+        loop.call_soon_threadsafe(task.cancel)
+        thread.join(10)
+        loop.close()
+
+
+def request(url, body=None):
+    data = json.dumps(body).encode() if body is not None else None
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, data=data), timeout=30) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def wait_for(url, job_id):
+    for _ in range(600):
+        status, body = request(f"{url}/jobs/{job_id}")
+        job = json.loads(body)
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.05)
+    raise TimeoutError(job_id)
+
+
+def test_submit_status_result(server, tmp_path):
+    url = server()
+    in_path = tmp_path / "song.wav"
+    in_path.write_bytes(b"audio")
+    status, body = request(f"{url}/jobs", {"speaker": "a", "input": str(in_path)})
+    assert status == 202
+    job = json.loads(body)
+    assert job["speaker"] == "a"
+    assert wait_for(url, job["id"])["status"] == "done"
+    assert request(f"{url}/jobs/{job['id']}/result") == (200, b"a:audio")
+
+
+def test_upload_is_deleted(server, tmp_path):
+    url = server()
+    status, body = request(f"{url}/jobs", {"speaker": "b", "audio": base64.b64encode(b"upload").decode()})
+    assert status == 202
+    job_id = json.loads(body)["id"]
+    assert wait_for(url, job_id)["status"] == "done"
+    assert request(f"{url}/jobs/{job_id}/result") == (200, b"b:upload")
+    assert sorted(os.listdir(tmp_path)) == [f"{job_id}.wav"]
+
+
+def test_bad_requests(server, tmp_path):
+    url = server()
+    assert request(f"{url}/jobs", {"speaker": "a", "input": str(tmp_path / "missing.wav")})[0] == 400
+    upload = {"speaker": "nobody", "audio": base64.b64encode(b"x").decode()}
+    assert request(f"{url}/jobs", upload)[0] == 400
+    upload = {"speaker": "a", "audio": base64.b64encode(b"x").decode(), "input_format": "wav/../x"}
+    assert request(f"{url}/jobs", upload)[0] == 400
+    upload = {"speaker": "a", "audio": base64.b64encode(b"x").decode(), "format": "../x"}
+    assert request(f"{url}/jobs", upload)[0] == 400
+    assert os.listdir(tmp_path) == []
+    assert request(f"{url}/jobs/42")[0] == 404
+
+
+def test_failed_job(server, tmp_path):
+    url = server(failing_runner)
+    status, body = request(f"{url}/jobs", {"speaker": "a", "audio": base64.b64encode(b"x").decode()})
+    job = wait_for(url, json.loads(body)["id"])
+    assert job["status"] == "failed"
+    assert "model exploded" in job["error"]
+    assert request(f"{url}/jobs/{job['id']}/result")[0] == 409
+    assert os.listdir(tmp_path) == []
+
+
+def test_events_and_metrics(server, tmp_path):
+    url = server()
+    in_path = tmp_path / "song.wav"
+    in_path.write_bytes(b"audio")
+    status, body = request(f"{url}/jobs", {"speaker": "a", "input": str(in_path),
+                                            "params": {"sleep": 0.5}})
+    job_id = json.loads(body)["id"]
+    status, body = request(f"{url}/jobs/{job_id}/events")
+    events = [json.loads(line) for line in body.splitlines()]
+    assert status == 200
+    assert events[0]["status"] == "queued"
+    assert "running" in [event["status"] for event in events]
+    assert events[-1]["status"] == "done"
+
+    status, body = request(f"{url}/metrics")
+    metrics = json.loads(body)
+    assert metrics["completed"] == 1
+    assert metrics["queue_depth"] == 0
+    assert metrics["per_speaker"]["a"]["jobs"] == 1
+    assert metrics["per_speaker"]["a"]["audio_seconds"] == 1.5
+    assert metrics["latency"]["p50"] is not None
+    assert metrics["workers"][0]["loaded"] == ["a"]
+
+
+def test_finished_jobs_are_pruned(server, tmp_path):
+    url = server(max_finished=1)
+    in_path = tmp_path / "song.wav"
+    in_path.write_bytes(b"audio")
+    first = json.loads(request(f"{url}/jobs", {"speaker": "a", "input": str(in_path)})[1])["id"]
+    wait_for(url, first)
+    assert os.path.exists(tmp_path / f"{first}.wav")
+    second = json.loads(request(f"{url}/jobs", {"speaker": "a", "input": str(in_path)})[1])["id"]
+    wait_for(url, second)
+    assert request(f"{url}/jobs/{first}")[0] == 404
+    assert not os.path.exists(tmp_path / f"{first}.wav")
+    assert request(f"{url}/jobs/{second}/result") == (200, b"a:audio")
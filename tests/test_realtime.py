@@ -0,0 +1,66 @@
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import soundfile
+
+from src.realtime import RealtimeConverter, file_source, paced, run
+
+SR = 16000
+
+
+def write_tone(path, seconds):
+    t = np.arange(int(seconds * SR)) / SR
+    soundfile.write(str(path), (0.5 * np.sin(2 * np.pi * 220 * t)).astype(np.float32), SR)
+
+
+def stub_converter(delay=0.0):
+    def convert(window):
+        time.sleep(delay)
+        return window
+    return convert
+
+
+def realtime(path, delay, **kwargs):
+    converter = RealtimeConverter(SimpleNamespace(target_sample=SR), "stub", SR,
+                                  convert=stub_converter(delay), **kwargs)
+    out = []
+    start = time.monotonic()
+    stats = run(converter, paced(file_source(str(path)), SR), out.append)
+    return stats, np.concatenate(out), time.monotonic() - start
+
+
+def test_realtime_within_budget(tmp_path):
+    write_tone(tmp_path / "in.wav", 2.0)
+    stats, out, wall = realtime(tmp_path / "in.wav", delay=0.01)
+    assert wall >= 1.9  # paced at real-time speed
+    assert stats["blocks"] == 4
+    assert stats["audio_seconds"] == 2.0
+    assert len(out) == 2 * SR
+    assert stats["underruns"] == 0
+    assert stats["late_seconds"] == 0.0
+    # a block is out once its last sample and the lookahead have arrived
+    assert 0.5 <= stats["latency_p50"] < stats["latency_budget"]
+    assert stats["latency_max"] < stats["latency_budget"]
+
+
+def test_slow_converter_underruns(tmp_path):
+    write_tone(tmp_path / "in.wav", 2.0)
+    stats, out, wall = realtime(tmp_path / "in.wav", delay=0.8)
+    assert stats["blocks"] == 4
+    assert stats["underruns"] > 0
+    assert stats["late_seconds"] > 0
+    assert stats["latency_max"] > stats["latency_budget"]
+    assert stats["rtf"] > 1
+
+
+def test_report_before_first_block():
+    def late_source():
+        time.sleep(0.05)  # e.g. a socket client that connects after report_every
+        yield np.zeros(SR // 10, dtype=np.float32)
+
+    converter = RealtimeConverter(SimpleNamespace(target_sample=SR), "stub", SR,
+                                  convert=stub_converter())
+    stats = run(converter, late_source(), lambda block: None, report_every=0.01)
+    assert stats["blocks"] == 1
+    assert stats["silent_blocks"] == 1
@@ -1,31 +1,366 @@
 import typer
 import os
+import time
+from typing import List
 from rich.console import Console
 
+from src.batch_convert import collect_inputs, run_batch, summarize, use_svc_root
+
 app = typer.Typer()
+store_app = typer.Typer(help="Manage the content-addressed model store.")
+app.add_typer(store_app, name="store")
 console = Console()
 
-def validate_input_file(input_file: str) -> str:
-    if not os.path.exists(input_file) or not input_file.endswith(".wav"):
-        return ""
-    return input_file
+SVC_ROOT = "/content/so-vits-svc"
+
 
-def convert_voice(input_file: str) -> str:
-    return input_file.replace(".wav", "_converted.wav")
+def find_speaker(name: str) -> dict:
+    from src.speaker_index import SpeakerIndex
+    index = SpeakerIndex("models")
+    if name not in index:
+        raise typer.BadParameter(f"Unknown speaker {name}")
+    return index.get(name)
 
 @app.command()
 def convert(
+    inputs: List[str] = typer.Argument(..., help="Audio files, directories or glob patterns."),
+    speaker: str = typer.Option(..., help="Speaker name from the model config."),
+    output_dir: str = typer.Option("output", help="Directory for the converted files."),
+    transpose: int = typer.Option(0, help="Pitch shift in semitones."),
+    cluster_ratio: float = typer.Option(0.0, help="Clustering ratio (needs a cluster model)."),
+    cluster_nprobe: int = typer.Option(0, help="Approximate cluster lookup over this many cells (0 = exact)."),
+    noise_scale: float = typer.Option(0.4, help="Noise scale."),
+    auto_pitch: bool = typer.Option(False, help="Auto pitch f0 (do not use for singing)."),
+    slice_db: int = typer.Option(-40, help="Silence threshold in dB for the slicer."),
+    batch_size: int = typer.Option(1, help="Segments per generator forward pass."),
+    workers: int = typer.Option(1, help="Number of worker processes."),
+    threads: int = typer.Option(None, help="torch threads per worker (default: cores / workers)."),
+    quantize: bool = typer.Option(False, help="Dynamic int8 quantization of the content encoder's and generator's wide Linear layers on CPU."),
+    quantize_conv: bool = typer.Option(False, help="With --quantize, also quantize the generator's convolutions (lossy and often slower; compare with benchmarks/bench_cpu.py)."),
+    feature_cache: str = typer.Option(None, help="Directory for cached content features and f0."),
+    profile: str = typer.Option(None, help="Append per-stage timings as JSON lines to this file ('-' for stderr)."),
+    cprofile_dir: str = typer.Option(None, help="Also write a cProfile .prof per file to this directory."),
+    trace: str = typer.Option(None, help="Also append stages to this Chrome trace file."),
+    skip_converted: bool = typer.Option(True, help="Skip inputs already converted with the same settings."),
+    svc_root: str = typer.Option(SVC_ROOT, help="Path to the so-vits-svc checkout."),
+):
+    """Convert files, directories and globs in parallel worker processes."""
+    files = collect_inputs(inputs)
+    if not files:
+        console.print("[bold red]No input audio files found.[/bold red]")
+        raise typer.Exit(1)
+    output_dir = os.path.abspath(output_dir)
+    if feature_cache:
+        feature_cache = os.path.abspath(feature_cache)
+    profiler = None
+    if profile or cprofile_dir or trace:
+        from src.profiling import Profiler
+        profiler = Profiler(profile if profile in (None, "-") else os.path.abspath(profile),
+                            cprofile_dir=cprofile_dir and os.path.abspath(cprofile_dir),
+                            trace_path=trace and os.path.abspath(trace))
+
+    use_svc_root(svc_root)
+    spk = find_speaker(speaker)
+    params = dict(slice_db=slice_db, tran=transpose,
+                  cluster_infer_ratio=cluster_ratio if spk["cluster_path"] else 0.0,
+                  auto_predict_f0=auto_pitch, noice_scale=noise_scale,
+                  batch_size=batch_size)
+    if cluster_nprobe and params["cluster_infer_ratio"]:
+        params["cluster_nprobe"] = cluster_nprobe
+    if feature_cache:
+        from src.feature_cache import FeatureCache
+        params["feature_cache"] = FeatureCache(feature_cache)
+    if profiler is not None:
+        params["profiler"] = profiler
+
+    from src.input_discovery import RECORD_FILENAME, ConversionRecord
+    record = ConversionRecord(os.path.join(output_dir, RECORD_FILENAME))
+    if skip_converted:
+        pending = record.pending(files, spk, params)
+        if len(pending) < len(files):
+            console.print(f"Skipping {len(files) - len(pending)} files already converted with these settings")
+        files = pending
+        if not files:
+            return
+
+    console.print(f"[bold green]Converting {len(files)} files with {workers} workers...[/bold green]")
+    start = time.perf_counter()
+    results = []
+    from src.cpu_inference import CpuProfile
+    cpu_profile = CpuProfile(workers=workers, threads=threads, quantize=quantize,
+                             quantize_conv=quantize_conv)
+    try:
+        for result in run_batch(files, spk, output_dir, params, workers=workers, svc_root=svc_root,
+                                cpu_profile=cpu_profile):
+            results.append(result)
+            if "error" in result:
+                console.print(f"[bold red]{result['input']}: {result['error']}[/bold red]")
+            else:
+                record.mark_done(result["input"], spk, params, result["output"])
+                console.print(f"{result['output']}: {result['audio_seconds']:.1f}s audio "
+                              f"in {result['seconds']:.1f}s")
+    finally:
+        record.flush()
+
+    summary = summarize(results, time.perf_counter() - start, workers)
+    console.print(f"[bold green]Converted {summary['files'] - summary['failed']}/{summary['files']} files, "
+                  f"{summary['audio_seconds']:.1f}s audio in {summary['wall_seconds']:.1f}s "
+                  f"({summary['x_realtime']:.2f}x real time, "
+                  f"{summary['files_per_minute']:.1f} files/min)[/bold green]")
+    if summary["failed"]:
+        raise typer.Exit(1)
+
+@app.command()
+def stream(
     input_file: str = typer.Argument(..., help="Path to the input audio file."),
+    output_file: str = typer.Argument(..., help="Path of the converted audio file."),
+    speaker: str = typer.Option(..., help="Speaker name from the model config."),
+    transpose: int = typer.Option(0, help="Pitch shift in semitones."),
+    cluster_ratio: float = typer.Option(0.0, help="Clustering ratio (needs a cluster model)."),
+    noise_scale: float = typer.Option(0.4, help="Noise scale."),
+    auto_pitch: bool = typer.Option(False, help="Auto pitch f0 (do not use for singing)."),
+    slice_db: int = typer.Option(-40, help="Silence threshold in dB for the slicer."),
+    window: float = typer.Option(30.0, help="Window length in seconds."),
+    overlap: float = typer.Option(1.0, help="Crossfaded overlap between windows in seconds."),
+    svc_root: str = typer.Option(SVC_ROOT, help="Path to the so-vits-svc checkout."),
 ):
-    input_file = validate_input_file(input_file)
-    if not input_file:
+    """Convert a long file window by window with bounded memory."""
+    input_file = os.path.abspath(input_file)
+    output_file = os.path.abspath(output_file)
+    if not os.path.exists(input_file):
         console.print("[bold red]Invalid input file. Please provide a valid audio file.[/bold red]")
-        return
+        raise typer.Exit(1)
+
+    use_svc_root(svc_root)
+    from src.model_pool import default_pool
+    from src import streaming
 
-    console.print(f"[bold green]Converting {input_file}...[/bold green]")
-    # output_file = convert_voice(input_file)
-    # TODO
+    spk = find_speaker(speaker)
+    svc_model = default_pool().get_speaker(spk)
+    console.print(f"[bold green]Streaming {input_file}...[/bold green]")
+    streaming.stream_convert_file(
+        svc_model, spk["name"], input_file, output_file,
+        window=window, overlap=overlap, slice_db=slice_db, tran=transpose,
+        cluster_infer_ratio=cluster_ratio if spk["cluster_path"] else 0.0,
+        auto_predict_f0=auto_pitch, noice_scale=noise_scale)
     console.print(f"[bold green]Conversion complete. Output: {output_file}[/bold green]")
 
+@app.command()
+def realtime(
+    source: str = typer.Argument(..., help="'-' for raw PCM on stdin, 'tcp://host:port' to listen for raw PCM, or a WAV file (followed while it grows)."),
+    output: str = typer.Argument(..., help="Output WAV file, or '-' for raw s16le PCM on stdout."),
+    speaker: str = typer.Option(..., help="Speaker name from the model config."),
+    transpose: int = typer.Option(0, help="Pitch shift in semitones."),
+    cluster_ratio: float = typer.Option(0.0, help="Clustering ratio (needs a cluster model)."),
+    noise_scale: float = typer.Option(0.4, help="Noise scale."),
+    auto_pitch: bool = typer.Option(False, help="Auto pitch f0 (do not use for singing)."),
+    sample_rate: int = typer.Option(44100, help="Sample rate of raw PCM input."),
+    channels: int = typer.Option(1, help="Channels of raw PCM input."),
+    pcm_format: str = typer.Option("s16le", help="Raw PCM sample format: s16le or f32le."),
+    block: float = typer.Option(0.5, help="Block length in seconds."),
+    context: float = typer.Option(1.0, help="Audio before each block given to the model, in seconds."),
+    lookahead: float = typer.Option(0.05, help="Audio after each block, crossfaded into the next one, in seconds."),
+    latency_budget: float = typer.Option(1.0, help="Seconds from input to playback; later blocks count as underruns."),
+    silence_db: int = typer.Option(-40, help="Blocks quieter than this are not converted."),
+    pace: bool = typer.Option(False, help="Feed a finished WAV file at real-time speed (testing without a device)."),
+    svc_root: str = typer.Option(SVC_ROOT, help="Path to the so-vits-svc checkout."),
+):
+    """Convert a live PCM stream in small blocks, reporting latency and underruns."""
+    import sys
+    import numpy as np
+    from src import realtime as rt
+
+    err = Console(stderr=True)
+    pcm = dict(channels=channels, pcm_format=pcm_format)
+    if source == "-":
+        stream, sr = rt.pcm_source(sys.stdin.buffer, **pcm), sample_rate
+    elif source.startswith("tcp://"):
+        host, _, port = source[len("tcp://"):].rpartition(":")
+        stream, sr = rt.socket_source(host or "127.0.0.1", int(port), **pcm), sample_rate
+    else:
+        source = os.path.abspath(source)
+        with open(source, "rb") as f:
+            sr = rt.wav_layout(f)[0]
+        stream = rt.paced(rt.file_source(source), sr) if pace else rt.growing_wav_source(source)
+    if output != "-":
+        output = os.path.abspath(output)
+
+    use_svc_root(svc_root)
+    from src.model_pool import default_pool
+
+    spk = find_speaker(speaker)
+    svc_model = default_pool().get_speaker(spk)
+    converter = rt.RealtimeConverter(
+        svc_model, spk["name"], sr, block_seconds=block, context_seconds=context,
+        lookahead_seconds=lookahead, latency_budget=latency_budget, silence_db=silence_db,
+        tran=transpose, cluster_infer_ratio=cluster_ratio if spk["cluster_path"] else 0.0,
+        auto_predict_f0=auto_pitch, noice_scale=noise_scale)
+
+    if output == "-":
+        def sink(block):
+            sys.stdout.buffer.write((np.clip(block, -1, 1) * 32767).astype("<i2").tobytes())
+            sys.stdout.buffer.flush()
+        stats = rt.run(converter, stream, sink)
+    else:
+        import soundfile
+        with soundfile.SoundFile(output, "w", samplerate=svc_model.target_sample, channels=1) as dst:
+            def sink(block):
+                dst.write(block)
+                dst.flush()
+            stats = rt.run(converter, stream, sink)
+
+    err.print(f"[bold green]{stats['audio_seconds']:.1f}s converted in {stats['blocks']} blocks "
+              f"({stats['silent_blocks']} silent), latency p50 {stats['latency_p50'] or 0:.3f}s "
+              f"p99 {stats['latency_p99'] or 0:.3f}s max {stats['latency_max'] or 0:.3f}s, "
+              f"{stats['underruns']} underruns, rtf {stats['rtf'] or 0:.2f}[/bold green]")
+
+@app.command()
+def fanout(
+    input_file: str = typer.Argument(..., help="Path to the input audio file."),
+    speakers: List[str] = typer.Option(..., "--speaker", help="Target speaker, optionally with its own transpose ('Drake:-2'); repeat for every voice."),
+    output_dir: str = typer.Option("output", help="Directory for the converted files."),
+    transpose: int = typer.Option(0, help="Pitch shift in semitones for targets without their own."),
+    cluster_ratio: float = typer.Option(0.0, help="Clustering ratio (needs a cluster model)."),
+    noise_scale: float = typer.Option(0.4, help="Noise scale."),
+    auto_pitch: bool = typer.Option(False, help="Auto pitch f0 (do not use for singing)."),
+    slice_db: int = typer.Option(-40, help="Silence threshold in dB for the slicer."),
+    batch_size: int = typer.Option(1, help="Segments per generator forward pass."),
+    max_models: int = typer.Option(2, help="Models kept loaded at once; targets run this many at a time."),
+    parallel: int = typer.Option(None, help="Targets converted at a time (default: as many as max-models)."),
+    feature_cache: str = typer.Option(None, help="Directory for cached content features and f0."),
+    svc_root: str = typer.Option(SVC_ROOT, help="Path to the so-vits-svc checkout."),
+):
+    """Convert one input into several voices, extracting its features only once."""
+    input_file = os.path.abspath(input_file)
+    output_dir = os.path.abspath(output_dir)
+    if not os.path.exists(input_file):
+        console.print("[bold red]Invalid input file. Please provide a valid audio file.[/bold red]")
+        raise typer.Exit(1)
+    if feature_cache:
+        from src.feature_cache import FeatureCache
+        feature_cache = FeatureCache(os.path.abspath(feature_cache))
+
+    use_svc_root(svc_root)
+    from src.fanout import fan_out_file, parse_target
+    from src.model_pool import default_pool
+
+    targets = []
+    for text in speakers:
+        name, tran = parse_target(text)
+        targets.append(dict(find_speaker(name), tran=transpose if tran is None else tran))
+
+    console.print(f"[bold green]Rendering {input_file} in {len(targets)} voices...[/bold green]")
+    start = time.perf_counter()
+    results = fan_out_file(input_file, targets, output_dir, default_pool(capacity=max_models),
+                           slice_db=slice_db, tran=transpose, cluster_infer_ratio=cluster_ratio,
+                           auto_predict_f0=auto_pitch, noice_scale=noise_scale,
+                           batch_size=batch_size, feature_cache=feature_cache, workers=parallel)
+    for result in results:
+        if "error" in result:
+            console.print(f"[bold red]{result['speaker']}: {result['error']}[/bold red]")
+        else:
+            console.print(f"{result['output']}: {result['seconds']:.1f}s")
+    console.print(f"[bold green]Done in {time.perf_counter() - start:.1f}s[/bold green]")
+    if any("error" in r for r in results):
+        raise typer.Exit(1)
+
+@app.command()
+def prepare(
+    folders: List[str] = typer.Argument(None, help="Model folders (all folders under models/ by default)."),
+    dtype: str = typer.Option("fp32", help="Weight storage: fp32 (shared between processes on CPU), fp16 or bf16."),
+    fold: bool = typer.Option(True, help="Fold weight norm into plain weights (faster CPU inference)."),
+    svc_root: str = typer.Option(SVC_ROOT, help="Path to the so-vits-svc checkout."),
+):
+    """Write inference-only, memory-mappable generator checkpoints next to the downloaded ones."""
+    from src.checkpoints import SLIM_SUFFIXES, prepare_model
+
+    if dtype not in SLIM_SUFFIXES:
+        raise typer.BadParameter(f"dtype must be one of {', '.join(SLIM_SUFFIXES)}")
+    # folders that exist from here are taken as given, others are looked up in the checkout
+    folders = [os.path.abspath(f) if os.path.isdir(f) else f for f in folders or []]
+    use_svc_root(svc_root)
+    if not folders:
+        folders = sorted(e.path for e in os.scandir("models") if e.is_dir())
+    for folder in folders:
+        generators = sorted(n for n in os.listdir(folder) if n.startswith("G_") and n.endswith(".pth"))
+        if not generators:
+            console.print(f"[yellow]Skipping {folder}, no G_*.pth[/yellow]")
+            continue
+        start = time.perf_counter()
+        path, before, after = prepare_model(os.path.join(folder, generators[0]), dtype, fold)
+        console.print(f"{path}: {before / 2**20:.1f} MiB -> {after / 2**20:.1f} MiB "
+                      f"in {time.perf_counter() - start:.1f}s")
+
+@app.command()
+def serve(
+    host: str = typer.Option("127.0.0.1", help="Address to listen on."),
+    port: int = typer.Option(8765, help="Port to listen on."),
+    workers: int = typer.Option(1, help="Number of worker processes, each with its own models."),
+    threads: int = typer.Option(None, help="torch threads per worker (default: cores / workers)."),
+    quantize: bool = typer.Option(False, help="Dynamic int8 quantization of the content encoder's and generator's wide Linear layers on CPU."),
+    quantize_conv: bool = typer.Option(False, help="With --quantize, also quantize the generator's convolutions (lossy and often slower; compare with benchmarks/bench_cpu.py)."),
+    max_wait: float = typer.Option(30.0, help="Seconds a job may wait before it jumps the speaker grouping."),
+    output_dir: str = typer.Option(None, help="Directory for job outputs (a temp dir by default)."),
+    svc_root: str = typer.Option(SVC_ROOT, help="Path to the so-vits-svc checkout."),
+):
+    """Run a local HTTP job server that queues conversions and groups them by speaker."""
+    import asyncio
+    from src.job_server import JobScheduler, JobServer
+    from src.speaker_index import SpeakerIndex
+
+    if output_dir:
+        output_dir = os.path.abspath(output_dir)
+        os.makedirs(output_dir, exist_ok=True)
+    use_svc_root(svc_root)
+    from src.cpu_inference import CpuProfile
+    scheduler = JobScheduler(SpeakerIndex("models"), workers=workers, svc_root=svc_root,
+                             cpu_profile=CpuProfile(workers=workers, threads=threads, quantize=quantize,
+                                                    quantize_conv=quantize_conv),
+                             output_dir=output_dir, max_wait=max_wait)
+    try:
+        asyncio.run(JobServer(scheduler, host, port).serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+@store_app.command("du")
+def store_du(
+    root: str = typer.Option("model_store", help="Model store directory."),
+):
+    """Show how much space the store takes and saves."""
+    from src.model_store import ModelStore
+    report = ModelStore(root).du()
+    for sha256, blob in sorted(report["by_blob"].items(), key=lambda x: -x[1]["bytes"]):
+        console.print(f"{blob['bytes'] / 2**20:10.1f} MiB  {len(blob['targets']):3d} links  {sha256[:16]}")
+    console.print(f"[bold]{report['blobs']} blobs, {report['stored_bytes'] / 2**20:.1f} MiB stored, "
+                  f"{report['linked_bytes'] / 2**20:.1f} MiB linked, "
+                  f"{report['saved_bytes'] / 2**20:.1f} MiB saved, "
+                  f"{len(report['unreferenced'])} unreferenced[/bold]")
+
+@store_app.command("gc")
+def store_gc(
+    root: str = typer.Option("model_store", help="Model store directory."),
+    dry_run: bool = typer.Option(False, help="Only report what would be deleted."),
+):
+    """Delete blobs no model folder links to any more."""
+    from src.model_store import ModelStore
+    removed, freed = ModelStore(root).gc(dry_run=dry_run)
+    verb = "Would free" if dry_run else "Freed"
+    console.print(f"[bold green]{verb} {freed / 2**20:.1f} MiB in {len(removed)} blobs[/bold green]")
+
+@store_app.command("adopt")
+def store_adopt(
+    paths: List[str] = typer.Argument(..., help="Checkpoint files or model folders to move into the store."),
+    root: str = typer.Option("model_store", help="Model store directory."),
+):
+    """Move existing checkpoints into the store, leaving links behind."""
+    from src.model_store import ModelStore
+    store = ModelStore(root)
+    for path in paths:
+        files = [os.path.join(path, n) for n in os.listdir(path)] if os.path.isdir(path) else [path]
+        for f in files:
+            if f.endswith((".pth", ".pt")) and not os.path.islink(f):
+                store.adopt(f)
+                console.print(f"Adopted {f}")
+
 if __name__ == "__main__":
     app()